@@ -0,0 +1,276 @@
+import os
+import json
+import queue
+import itertools
+import threading
+import time
+from datetime import datetime
+
+
+class AuditLogger:
+    """
+    Writes prediction audit records to MongoDB off the request path.
+
+    log() only appends to a bounded in-memory queue (records are dropped and
+    counted when it is full). A background thread drains the queue with
+    insert_many once flush_size records are waiting or flush_interval seconds
+    have passed. If Mongo is unavailable the batch is appended to a local
+    JSON-lines spill file, which is replayed (streamed, flush_size records at
+    a time) after the next successful flush. When insert_many fails part way
+    (BulkWriteError), only the records it reports as failed are spilled, so
+    replay never duplicates the ones already written. Spill lines that do not
+    decode (e.g. cut short when the process was killed mid-append) are moved
+    to <spill_path>.bad and counted as corrupt instead of stopping the replay.
+
+    Pass connect (a callable returning the collection) instead of collection
+    to defer the driver import and connection to the writer thread. A failed
+    connect is retried with exponential backoff (connect_retry seconds, up to
+    connect_retry_max); batches written meanwhile go to the spill file.
+    """
+
+    def __init__(self, collection=None, max_queue=10000, flush_size=200, flush_interval=1.0, spill_path=None,
+                 connect=None, connect_retry=1.0, connect_retry_max=60.0):
+        self.collection = collection
+        self._connect = connect
+        self.connect_retry = float(connect_retry)
+        self.connect_retry_max = float(connect_retry_max)
+        self._connect_delay = self.connect_retry
+        self._next_connect = 0.0
+        self.flush_size = max(1, int(flush_size))
+        self.flush_interval = float(flush_interval)
+        self.spill_path = spill_path
+
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.counters = {"enqueued": 0, "flushed": 0, "dropped": 0, "spilled": 0, "replayed": 0, "failed_flushes": 0,
+                         "corrupt": 0}
+
+    @property
+    def enabled(self):
+        return self.collection is not None or self._connect is not None
+
+    def disable(self):
+        self.collection = None
+        self._connect = None
+
+    def _resolve_collection(self):
+        # Caller holds self._lock; _connect is kept until it succeeds, so enabled never flips off
+        if self.collection is not None or self._connect is None or time.monotonic() < self._next_connect:
+            return
+        try:
+            self.collection = self._connect()
+        except Exception as e:
+            print(f"Audit log could not connect ({e}), retrying in {self._connect_delay:g}s; spilling meanwhile")
+            self._next_connect = time.monotonic() + self._connect_delay
+            self._connect_delay = min(self._connect_delay * 2, self.connect_retry_max)
+            return
+        self._connect = None
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def _count(self, key, n=1):
+        with self._counter_lock:
+            self.counters[key] += n
+
+    def log(self, record):
+        if not self.enabled:
+            return
+        try:
+            self._queue.put_nowait(record)
+            self._count("enqueued")
+        except queue.Full:
+            self._count("dropped")
+
+    def log_many(self, records):
+        for record in records:
+            self.log(record)
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        with self._lock:
+            self._resolve_collection()
+        while self.enabled and not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            # Flush when flush_size records are waiting or the interval has passed
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            with self._lock:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    # Never let one batch end the writer thread
+                    print(f"Audit log dropped {len(batch)} records: {e}")
+                    self._count("dropped", len(batch))
+
+    def flush(self):
+        """Writes everything queued so far; safe to call from any thread."""
+        with self._lock:
+            self._resolve_collection()
+            while self.enabled:
+                batch = self._drain(self.flush_size)
+                if not batch:
+                    return
+                self._write(batch)
+
+    def _spill(self, records):
+        if not records:
+            return
+        if self._append_spill(records):
+            self._count("spilled", len(records))
+        else:
+            self._count("dropped", len(records))
+
+    def _insert(self, batch):
+        """insert_many(batch); returns the records that were not written (all of them if it failed outright)."""
+        try:
+            self.collection.insert_many(batch, ordered=False)
+            return []
+        except Exception as e:
+            failed = _failed_records(e, batch)
+            print(f"Audit log write failed ({len(failed)} of {len(batch)} records): {e}")
+            self._count("failed_flushes")
+            return failed
+
+    def _write(self, batch):
+        self._resolve_collection()
+        if self.collection is None:
+            # Not connected (yet): keep the records for the replay
+            self._spill(batch)
+            return
+        failed = self._insert(batch)
+        self._count("flushed", len(batch) - len(failed))
+        if failed:
+            self._spill(failed)
+            return
+        try:
+            self._replay_spill()
+        except Exception as e:
+            # The batch itself is written; the spill file is kept for the next flush
+            print(f"Audit log replay failed: {e}")
+
+    def _append_spill(self, records):
+        if not self.spill_path:
+            return False
+        try:
+            # A line cut short by a crash must not swallow the next record
+            torn = False
+            if os.path.exists(self.spill_path) and os.path.getsize(self.spill_path) > 0:
+                with open(self.spill_path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b"\n"
+            with open(self.spill_path, "a") as f:
+                if torn:
+                    f.write("\n")
+                for record in records:
+                    # insert_many may have assigned an ObjectId before failing
+                    record.pop("_id", None)
+                    f.write(json.dumps(record, default=_json_default) + "\n")
+            return True
+        except Exception as e:
+            print(f"Audit log spill failed: {e}")
+            return False
+
+    def _replay_spill(self):
+        if not self.spill_path:
+            return
+        replay_path = f"{self.spill_path}.replay"
+        # A replay file left by an interrupted replay is finished first
+        if not os.path.exists(replay_path):
+            if not os.path.exists(self.spill_path):
+                return
+            os.replace(self.spill_path, replay_path)
+        # Streamed flush_size records at a time; spilled records were counted
+        # when first spilled, so putting them back is not counted again
+        with open(replay_path, "r") as f:
+            records = self._read_spill(f)
+            while True:
+                chunk = list(itertools.islice(records, self.flush_size))
+                if not chunk:
+                    break
+                failed = self._insert(chunk)
+                self._count("replayed", len(chunk) - len(failed))
+                if len(failed) == len(chunk):
+                    # Mongo went away again: put the rest back for the next successful flush
+                    remaining = itertools.chain(failed, records)
+                    if not self._append_spill(remaining):
+                        self._count("dropped", sum(1 for _ in remaining))
+                    break
+                if failed and not self._append_spill(failed):
+                    self._count("dropped", len(failed))
+        os.remove(replay_path)
+
+    def _read_spill(self, lines):
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                yield _restore_record(json.loads(line))
+            except (ValueError, AttributeError) as e:
+                print(f"Audit log skipped a corrupt spill line: {e}")
+                self._count("corrupt")
+                try:
+                    with open(f"{self.spill_path}.bad", "a") as bad:
+                        bad.write(line if line.endswith("\n") else line + "\n")
+                except OSError:
+                    pass
+
+    def close(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.enabled:
+            self.flush()
+
+    def stats(self):
+        with self._counter_lock:
+            return {"queued": self._queue.qsize(), **self.counters}
+
+
+def _failed_records(error, batch):
+    # pymongo's BulkWriteError lists the failed documents by index; with
+    # ordered=False every other document was inserted. Duplicate keys (11000)
+    # are already stored. Any other error may have written nothing.
+    details = getattr(error, "details", None)
+    if not isinstance(details, dict) or "writeErrors" not in details:
+        return batch
+    failed = {err["index"] for err in details["writeErrors"] if err.get("code") != 11000}
+    return [record for i, record in enumerate(batch) if i in failed]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return str(value)
+
+
+def _restore_record(record):
+    for key, value in record.items():
+        if isinstance(value, dict) and set(value) == {"$date"}:
+            record[key] = datetime.fromisoformat(value["$date"])
+    return record
@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import pandas as pd
+
+# Throughput benchmark: per-request handlers vs. /batch/* handlers
+# Usage: python bench_batch_predict.py [rows]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import ml_api
+from ml_api import CropRequest, YieldRequest, FertilizerRequest
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+# Keep Mongo out of the measurement
+ml_api.audit_log.disable()
+# The prediction cache would answer repeated single requests (only /predict-*
+# uses it), so both sides run every row through the model
+ml_api.prediction_cache.max_entries = 0
+
+
+def load_samples(n):
+    soil = pd.read_csv(os.path.join(BASE_DIR, "datasets/Crop_recommendation.csv"))
+    # Distinct rows unless more are asked for than the dataset has
+    soil = soil.sample(n, replace=n > len(soil), random_state=42)
+    seasons = list(ml_api.get_season_le().classes_)
+
+    crop = [CropRequest(
+        Nitrogen=r.N, Phosphorus=r.P, Potassium=r.K,
+        Temperature=r.temperature, Humidity=r.humidity, pH=r.ph, Rainfall=r.rainfall,
+        Season=seasons[i % len(seasons)]
+    ) for i, r in enumerate(soil.itertuples())]
+
+    yield_ = [YieldRequest(
+        soil_moisture=30, pH=r.ph, temperature=r.temperature,
+        rainfall=r.rainfall, humidity=r.humidity, total_days=120
+    ) for r in soil.itertuples()]
+
+    fertilizer = [FertilizerRequest(
+        Nitrogen=r.N, Phosphorus=r.P, Potassium=r.K, soil_type="Black", crop_type="Sugarcane"
+    ) for r in soil.itertuples()]
+
+    return crop, yield_, fertilizer
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def report(name, single_s, batch_s, n):
+    print(f"{name:<12} single: {n / single_s:>9.1f} rows/s   batch: {n / batch_s:>9.1f} rows/s   speedup: {single_s / batch_s:.1f}x")
+
+
+if __name__ == "__main__":
+    crop, yield_, fertilizer = load_samples(ROWS)
+
+    # Warm up lazy loaders so model load time is not counted
+    ml_api.predict_crop(crop[0])
+    ml_api.predict_yield(yield_[0])
+    ml_api.predict_fertilizer(fertilizer[0])
+
+    print(f"Benchmarking {ROWS} rows per model (prediction cache disabled)...")
+    report("crop",
+           timed(lambda: [ml_api.predict_crop(d) for d in crop]),
+           timed(lambda: ml_api.batch_predict_crop(crop)), ROWS)
+    report("yield",
+           timed(lambda: [ml_api.predict_yield(d) for d in yield_]),
+           timed(lambda: ml_api.batch_predict_yield(yield_)), ROWS)
+    report("fertilizer",
+           timed(lambda: [ml_api.predict_fertilizer(d) for d in fertilizer]),
+           timed(lambda: ml_api.batch_predict_fertilizer(fertilizer)), ROWS)
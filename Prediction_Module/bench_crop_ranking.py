@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import numpy as np
+
+# Microbenchmark of the crop ranking stage alone (location masks, top-k,
+# boosting, result dicts), given precomputed probabilities: one _rank_crops
+# call per request vs one call for the whole batch.
+# Usage: python bench_crop_ranking.py [repeats]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import ml_api
+from ml_api import CropRequest
+
+REPEATS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+BATCH_SIZES = [1, 32, 1000]
+
+
+def sample_requests(n, class_count):
+    # Mix of located requests (hybrid ranking) and bare ones (plain top-k)
+    locations = list(ml_api.get_location_data().index) if ml_api.get_location_data() is not None else []
+    rng = np.random.RandomState(0)
+    requests = []
+    for i in range(n):
+        location = {}
+        if locations and i % 4:
+            state, district, season = locations[rng.randint(len(locations))]
+            location = dict(State=state.title(), District=district.title(), Season=season.title())
+        requests.append(CropRequest(Nitrogen=90, Phosphorus=42, Potassium=43, Temperature=21,
+                                    Humidity=82, pH=6.5, Rainfall=203, **location))
+    proba = rng.dirichlet(np.ones(class_count), size=n)
+    return requests, proba
+
+
+def latency_ms(fn):
+    fn()
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1000
+
+
+if __name__ == "__main__":
+    crop = ml_api.get_crop()
+    index = ml_api._location_index()
+    compat = ml_api._crop_compat(crop, index)
+    names = crop.class_names
+    print(f"{len(names)} crop classes, {len(index) if index is not None else 0} indexed locations, boosting: {ml_api.BOOSTING_MODE}")
+
+    requests_all, proba_all = sample_requests(max(BATCH_SIZES), len(names))
+    for n in BATCH_SIZES:
+        requests, proba = requests_all[:n], proba_all[:n]
+        per_row = latency_ms(lambda: [ml_api._rank_crops([r], names, p[np.newaxis], compat, index) for r, p in zip(requests, proba)])
+        batched = latency_ms(lambda: ml_api._rank_crops(requests, names, proba, compat, index))
+        print(f"  batch {n:>5}: per-request {per_row:8.2f} ms ({per_row * 1000 / n:6.1f} us/row)   "
+              f"batched {batched:8.2f} ms ({batched * 1000 / n:6.1f} us/row)   speedup {per_row / batched:5.1f}x")
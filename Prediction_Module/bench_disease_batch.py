@@ -0,0 +1,78 @@
+import io
+import os
+import sys
+import time
+import zipfile
+import numpy as np
+import requests
+
+# Throughput benchmark: /predict-disease per photo vs. one /batch/predict-disease call
+# Starts the API in-process (see bench_disease_event_loop.py).
+# Usage: python bench_disease_batch.py [images]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import ml_api
+from bench_disease_event_loop import URL, make_image, start_server
+
+IMAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 48
+
+
+def make_images(n):
+    # Phone-sized photos with different content so no two decode identically
+    return [make_image(size=1024, seed=i) for i in range(n)]
+
+
+def zip_images(images):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as archive:
+        for i, image in enumerate(images):
+            archive.writestr(f"leaf_{i}.jpg", image)
+    return buf.getvalue()
+
+
+def run_single(session, images):
+    for i, image in enumerate(images):
+        response = session.post(f"{URL}/predict-disease", files={"file": (f"leaf_{i}.jpg", image, "image/jpeg")})
+        response.raise_for_status()
+
+
+def run_batch(session, images):
+    files = [("files", (f"leaf_{i}.jpg", image, "image/jpeg")) for i, image in enumerate(images)]
+    response = session.post(f"{URL}/batch/predict-disease", files=files)
+    response.raise_for_status()
+    assert response.json()["errors"] == 0
+
+
+def run_zip(session, archive):
+    response = session.post(f"{URL}/batch/predict-disease", files=[("files", ("plot.zip", archive, "application/zip"))])
+    response.raise_for_status()
+    assert response.json()["errors"] == 0
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    images = make_images(IMAGES)
+    archive = zip_images(images)
+    server = start_server()
+    session = requests.Session()
+
+    # Warm-up pass so first-call overheads are not counted
+    run_single(session, images[:2])
+    run_batch(session, images[:2])
+
+    single_s = timed(run_single, session, images)
+    batch_s = timed(run_batch, session, images)
+    zip_s = timed(run_zip, session, archive)
+
+    print(f"{IMAGES} images, chunk size {ml_api.DISEASE_BATCH_CHUNK_SIZE}")
+    print(f"single: {IMAGES / single_s:7.1f} images/s")
+    print(f"batch:  {IMAGES / batch_s:7.1f} images/s   speedup {single_s / batch_s:.1f}x")
+    print(f"zip:    {IMAGES / zip_s:7.1f} images/s   speedup {single_s / zip_s:.1f}x")
+    server.should_exit = True
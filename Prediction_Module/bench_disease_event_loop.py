@@ -0,0 +1,91 @@
+import io
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+import uvicorn
+from PIL import Image
+
+# Load test: /health latency with and without concurrent /predict-disease uploads.
+# Starts the API in-process; a flat /health latency under load means image
+# decoding and inference are not blocking the event loop.
+# Usage: python bench_disease_event_loop.py [upload_threads] [seconds]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import ml_api
+
+UPLOAD_THREADS = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+DURATION = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+PORT = int(os.environ.get("BENCH_PORT", 8765))
+URL = f"http://127.0.0.1:{PORT}"
+PROBE_INTERVAL = 0.02
+
+# Keep Mongo out of the measurement
+ml_api.audit_log.disable()
+
+
+def make_image(size=1600, seed=0):
+    # Noise compresses badly, so decoding costs about as much as a large phone photo
+    rng = np.random.RandomState(seed)
+    buf = io.BytesIO()
+    Image.fromarray(rng.randint(0, 256, (size, size, 3), dtype=np.uint8)).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def start_server():
+    server = uvicorn.Server(uvicorn.Config(ml_api.app, host="127.0.0.1", port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    while requests.get(f"{URL}/ready").status_code != 200:
+        time.sleep(0.2)
+    return server
+
+
+def probe_health(seconds):
+    session = requests.Session()
+    latencies = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        session.get(f"{URL}/health")
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(PROBE_INTERVAL)
+    return np.array(latencies)
+
+
+def upload_loop(image, stop, counts, lock):
+    session = requests.Session()
+    while not stop.is_set():
+        status = session.post(f"{URL}/predict-disease", files={"file": ("leaf.jpg", image, "image/jpeg")}).status_code
+        with lock:
+            counts[status] = counts.get(status, 0) + 1
+
+
+def report(name, latencies):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"{name:<14} /health p50 {p50:7.2f} ms   p95 {p95:7.2f} ms   p99 {p99:7.2f} ms   max {latencies.max():7.2f} ms   (n={len(latencies)})")
+
+
+if __name__ == "__main__":
+    image = make_image()
+    server = start_server()
+
+    report("idle", probe_health(min(DURATION, 3.0)))
+
+    stop, lock, counts = threading.Event(), threading.Lock(), {}
+    with ThreadPoolExecutor(max_workers=UPLOAD_THREADS) as pool:
+        for _ in range(UPLOAD_THREADS):
+            pool.submit(upload_loop, image, stop, counts, lock)
+        loaded = probe_health(DURATION)
+        stop.set()
+    report(f"{UPLOAD_THREADS} uploaders", loaded)
+
+    ok = counts.get(200, 0)
+    print(f"uploads: {ok / DURATION:.1f} images/s, status counts {dict(sorted(counts.items()))}")
+    server.should_exit = True
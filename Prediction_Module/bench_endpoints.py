@@ -0,0 +1,361 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+from datetime import datetime
+
+import numpy as np
+import psutil
+
+# Endpoint load benchmark: serves ml_api.app in-process (uvicorn on a free
+# localhost port) with synthetic fixture models (bench_fixtures.py), a stub
+# Mongo collection and no TensorFlow, then drives every endpoint over HTTP
+# from N client threads. Reports throughput, p50/p95/p99 latency and process
+# RSS per endpoint; results can be saved as JSON and compared with a baseline.
+# Client and server share one process (and GIL), so numbers are for
+# comparing commits on the same host, not for capacity planning.
+#
+# Usage:
+#   python bench_endpoints.py [--requests 200] [--concurrency 8] [--batch-size 100]
+#                             [--endpoints crop,batch-crop,...] [--real-models]
+#                             [--output results.json] [--compare baseline.json] [--threshold 0.2]
+# Exits 1 when --compare finds a regression beyond --threshold.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import bench_fixtures
+
+# Compared against the baseline (metric: higher_is_better); p99 is reported
+# but too noisy at default request counts to gate on
+COMPARED_METRICS = {"throughput_rps": True, "p50_ms": False, "p95_ms": False, "peak_rss_mb": False}
+
+
+def _json_request(path, bodies):
+    def build(i):
+        return "POST", path, json.dumps(bodies[i % len(bodies)]).encode(), {"Content-Type": "application/json"}
+    return build
+
+
+def _multipart(fields):
+    boundary = "agrivista-bench-boundary"
+    parts = []
+    for name, filename, content in fields:
+        parts.append(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{filename}\"\r\n"
+                     f"Content-Type: image/jpeg\r\n\r\n".encode() + content + b"\r\n")
+    body = b"".join(parts) + f"--{boundary}--\r\n".encode()
+    return body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+def _upload_request(path, images, per_request):
+    def build(i):
+        files = [("files" if per_request > 1 else "file", f"leaf_{i}_{j}.jpg", images[(i + j) % len(images)])
+                 for j in range(per_request)]
+        body, headers = _multipart(files)
+        return "POST", path, body, headers
+    return build
+
+
+def _get_request(path):
+    def build(i):
+        return "GET", path, None, {}
+    return build
+
+
+def _batches(rows, batch_size):
+    # Distinct batches while the samples last, else one batch of repeated rows
+    if batch_size > len(rows):
+        return [(rows * (batch_size // len(rows) + 1))[:batch_size]]
+    return [rows[i:i + batch_size] for i in range(0, len(rows) - batch_size + 1, batch_size)]
+
+
+def build_scenarios(batch_size, disease_batch_size, disease=True, seed=0):
+    """{name: (rows per request, request builder)} for every endpoint."""
+    n = 512
+    crop = bench_fixtures.sample_payloads("crop", n, seed)
+    yield_ = bench_fixtures.sample_payloads("yield", n, seed)
+    fertilizer = bench_fixtures.sample_payloads("fertilizer", n, seed)
+    season = [{"state": "Maharashtra", "district": "Pune", "season": "Kharif"},
+              {"state": "Punjab", "district": "Ludhiana", "season": "Rabi"}]
+
+    scenarios = {
+        "crop": (1, _json_request("/predict-crop", crop)),
+        "batch-crop": (batch_size, _json_request("/batch/predict-crop", _batches(crop, batch_size))),
+        "yield": (1, _json_request("/predict-yield", yield_)),
+        "batch-yield": (batch_size, _json_request("/batch/predict-yield", _batches(yield_, batch_size))),
+        "fertilizer": (1, _json_request("/predict-fertilizer", fertilizer)),
+        "batch-fertilizer": (batch_size, _json_request("/batch/predict-fertilizer", _batches(fertilizer, batch_size))),
+        "season-commodity": (1, _json_request("/recommend-season-commodity", season)),
+        "locations": (1, _get_request("/locations")),
+        "seasons": (1, _get_request("/seasons")),
+        "health": (1, _get_request("/health")),
+    }
+    if disease:
+        images = bench_fixtures.sample_images(16, seed=seed)
+        scenarios["disease"] = (1, _upload_request("/predict-disease", images, 1))
+        scenarios["batch-disease"] = (disease_batch_size, _upload_request("/batch/predict-disease", images, disease_batch_size))
+    return scenarios
+
+
+class RSSSampler:
+    """Peak RSS of this process while the scenario runs (sampled every 50 ms)."""
+
+    def __init__(self, process):
+        self.process = process
+        self.peak = process.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(0.05):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+
+def drive(port, build, requests, concurrency, timeout=60):
+    """Sends requests from concurrency threads (one keep-alive connection each)."""
+    latencies = np.zeros(requests)
+    statuses = np.zeros(requests, dtype=int)
+    next_index = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        while True:
+            with lock:
+                i = next(next_index, None)
+            if i is None:
+                break
+            method, path, body, headers = build(i)
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                statuses[i] = response.status
+            except Exception:
+                statuses[i] = -1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+            latencies[i] = time.perf_counter() - start
+        conn.close()
+
+    threads = [threading.Thread(target=worker, name=f"bench-client-{t}") for t in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, latencies, statuses
+
+
+def summarize(elapsed, latencies, statuses, rows_per_request, rss_before, rss_peak):
+    ms = latencies * 1000
+    ok = (statuses >= 200) & (statuses < 300)
+    return {
+        "requests": len(latencies),
+        "errors": int((~ok).sum()),
+        "error_statuses": sorted({int(s) for s in statuses[~ok]}),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "rows_per_second": round(len(latencies) * rows_per_request / elapsed, 2),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "rss_before_mb": round(rss_before / 1024 / 1024, 1),
+        "peak_rss_mb": round(rss_peak / 1024 / 1024, 1),
+    }
+
+
+def _free_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # Inherited by accepted connections; uvicorn writes headers and body
+    # separately, which otherwise stalls on Nagle/delayed ACK (~40 ms each)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind(("127.0.0.1", 0))
+    return sock
+
+
+def start_server(use_fixtures, fixture_root):
+    """Imports ml_api (configured through its env vars), starts uvicorn in a thread; returns (ml_api, server, port)."""
+    if use_fixtures:
+        models_dir, dataset_path = bench_fixtures.build_fixtures(fixture_root)
+        os.environ["ML_MODELS_DIR"] = models_dir
+        os.environ["ML_DATASET_PATH"] = dataset_path
+    os.environ.setdefault("ML_MODEL_LOADING", "eager")
+    os.environ.setdefault("ML_MODEL_WATCH_INTERVAL", "0")
+    os.environ.setdefault("ML_AUDIT_SPILL_PATH", os.path.join(fixture_root, "audit_spill.jsonl"))
+
+    import uvicorn
+    import ml_api
+    from audit_log import AuditLogger
+
+    if use_fixtures and ml_api.DISEASE_ENABLED:
+        bench_fixtures.install_fixture_disease_model(ml_api)
+    # Stub Mongo: the audit writer runs as in production but never leaves the process
+    ml_api.audit_log = AuditLogger(
+        collection=bench_fixtures.StubCollection(),
+        max_queue=ml_api.AUDIT_QUEUE_SIZE, flush_size=ml_api.AUDIT_FLUSH_SIZE,
+        flush_interval=ml_api.AUDIT_FLUSH_INTERVAL, spill_path=ml_api.AUDIT_SPILL_PATH
+    )
+
+    sock = _free_socket()
+    port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(ml_api.app, log_level="warning", access_log=False))
+    threading.Thread(target=server.run, kwargs={"sockets": [sock]}, name="bench-server", daemon=True).start()
+
+    # Wait for the listener, then for warm-up to finish
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/ready")
+            response = conn.getresponse()
+            body = json.loads(response.read() or b"{}")
+            conn.close()
+            if response.status == 200:
+                if body.get("errors"):
+                    print(f"Warm-up errors: {body['errors']}")
+                return ml_api, server, port
+        except (ConnectionError, OSError):
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("ml_api did not become ready within 300s")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_suite(requests=200, concurrency=8, batch_size=100, disease_batch_size=8, endpoints=None,
+              use_fixtures=True, warmup_requests=10, seed=0):
+    fixture_root = tempfile.mkdtemp(prefix="agrivista-bench-")
+    ml_api, server, port = start_server(use_fixtures, fixture_root)
+    process = psutil.Process(os.getpid())
+
+    try:
+        disease = ml_api.DISEASE_ENABLED
+        if disease:
+            try:
+                import PIL  # noqa: F401
+            except ImportError:
+                print("Pillow not installed, skipping disease endpoints")
+                disease = False
+        scenarios = build_scenarios(batch_size, disease_batch_size, disease=disease, seed=seed)
+        unknown = set(endpoints or ()) - set(scenarios)
+        if unknown:
+            raise SystemExit(f"Unknown endpoint(s): {sorted(unknown)}. Known: {sorted(scenarios)}")
+
+        results = {}
+        for name, (rows, build) in scenarios.items():
+            if endpoints and name not in endpoints:
+                continue
+            drive(port, build, warmup_requests, min(concurrency, warmup_requests))
+            rss_before = process.memory_info().rss
+            with RSSSampler(process) as rss:
+                elapsed, latencies, statuses = drive(port, build, requests, concurrency)
+            results[name] = summarize(elapsed, latencies, statuses, rows, rss_before, rss.peak)
+            r = results[name]
+            print(f"{name:<17} {r['throughput_rps']:>9.1f} req/s {r['rows_per_second']:>10.1f} rows/s   "
+                  f"p50 {r['p50_ms']:>8.2f}  p95 {r['p95_ms']:>8.2f}  p99 {r['p99_ms']:>8.2f} ms   "
+                  f"peak RSS {r['peak_rss_mb']:>7.1f} MB   errors {r['errors']}")
+    finally:
+        server.should_exit = True
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "fixtures": use_fixtures,
+            "requests": requests,
+            "concurrency": concurrency,
+            "batch_size": batch_size,
+            "disease_batch_size": disease_batch_size,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Regressions (list of messages) of current vs baseline results beyond a relative threshold."""
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change < -threshold) if higher_is_better else (change > threshold):
+                regressions.append(f"{name}.{metric}: {old} -> {new} ({change:+.1%})")
+        if result["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}.errors: {base.get('errors', 0)} -> {result['errors']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load benchmark for the ml_api endpoints")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--batch-size", type=int, default=100, help="rows per /batch/* tabular request")
+    parser.add_argument("--disease-batch-size", type=int, default=8, help="images per /batch/predict-disease request")
+    parser.add_argument("--endpoints", help="comma-separated subset, e.g. crop,batch-crop,disease")
+    parser.add_argument("--real-models", action="store_true", help="serve models/ and datasets/ instead of fixtures")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression (default 0.2)")
+    args = parser.parse_args(argv)
+
+    report = run_suite(
+        requests=args.requests, concurrency=args.concurrency, batch_size=args.batch_size,
+        disease_batch_size=args.disease_batch_size,
+        endpoints=args.endpoints.split(",") if args.endpoints else None,
+        use_fixtures=not args.real_models,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        print(f"Compared with {args.compare} (commit {baseline.get('meta', {}).get('commit')}, threshold {args.threshold:.0%}):")
+        for message in regressions:
+            print(f"  REGRESSION {message}")
+        if regressions:
+            return 1
+        print("  no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+import os
+import io
+import json
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+
+from model_bundle import save_bundle
+
+# Synthetic stand-ins for the production artifacts, small enough to build in a
+# second or two: tiny RandomForests (pickles + bundles) with the real feature
+# layouts, a few thousand rows of crop production data, and a NumPy disease
+# "model". Used by bench_endpoints.py so benchmarks run without the trained
+# models, TensorFlow or MongoDB.
+# Usage: python bench_fixtures.py <output_dir>
+
+CROPS = ["rice", "maize", "chickpea", "kidneybeans", "pigeonpeas", "mungbean", "blackgram", "lentil",
+         "banana", "mango", "grapes", "watermelon", "apple", "orange", "papaya", "coconut", "cotton", "jute", "coffee"]
+SEASONS = ["Autumn", "Kharif", "Rabi", "Summer", "Whole Year", "Winter"]
+FERTILIZERS = ["Urea", "DAP", "MOP", "NPK 10-26-26", "NPK 12-32-16", "SSP", "Zinc Sulphate"]
+DISEASE_CLASSES = ["Apple___Apple_scab", "Apple___healthy", "Potato___Early_blight", "Potato___healthy",
+                   "Tomato___Late_blight", "Tomato___healthy"]
+STATES = {
+    "Maharashtra": ["Pune", "Nashik", "Nagpur", "Satara"],
+    "Punjab": ["Ludhiana", "Amritsar", "Patiala"],
+    "Karnataka": ["Mysore", "Belgaum", "Dharwad", "Hassan"],
+    "Uttar Pradesh": ["Agra", "Lucknow", "Meerut"],
+}
+# Production-dataset spellings of the model crops (see crop_mapping.py)
+PRODUCTION_CROPS = ["Rice", "Maize", "Gram", "Arhar/Tur", "Moong(Green Gram)", "Urad", "Masoor", "Banana",
+                    "Mango", "Grapes", "Cotton(lint)", "Jute", "Coconut ", "Wheat", "Sugarcane", "Onion"]
+
+N_ESTIMATORS = 12
+MAX_DEPTH = 8
+
+
+def _random_forest(kind, X, y, seed):
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+    cls = RandomForestClassifier if kind == "classifier" else RandomForestRegressor
+    return cls(n_estimators=N_ESTIMATORS, max_depth=MAX_DEPTH, random_state=seed).fit(X, y)
+
+
+def _dump(model_dir, name, obj):
+    with open(os.path.join(model_dir, name), "wb") as f:
+        pickle.dump(obj, f)
+
+
+def build_models(model_dir, rows=2000, seed=0):
+    """Writes crop, yield and fertilizer pickles and bundles plus disease_classes.json."""
+    from sklearn.preprocessing import LabelEncoder
+    os.makedirs(model_dir, exist_ok=True)
+    rng = np.random.RandomState(seed)
+
+    # Crop: N, P, K, temperature, humidity, ph, rainfall, season code
+    season_le = LabelEncoder().fit(SEASONS)
+    crop_le = LabelEncoder().fit(CROPS)
+    X = np.column_stack([
+        rng.uniform(0, 140, rows), rng.uniform(5, 145, rows), rng.uniform(5, 205, rows),
+        rng.uniform(8, 44, rows), rng.uniform(14, 100, rows), rng.uniform(3.5, 9.9, rows),
+        rng.uniform(20, 300, rows), rng.randint(len(SEASONS), size=rows),
+    ])
+    y = crop_le.transform(rng.choice(CROPS, rows))
+    crop = _random_forest("classifier", X, y, seed)
+    _dump(model_dir, "crop_model.pkl", crop)
+    _dump(model_dir, "crop_label_encoder.pkl", crop_le)
+    _dump(model_dir, "season_label_encoder.pkl", season_le)
+    save_bundle(os.path.join(model_dir, "crop"), "crop", crop,
+                ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall', 'season'],
+                {"crop_label": crop_le, "season": season_le}, metadata={"fixture": True})
+
+    # Yield: soil_moisture, pH, temperature, rainfall, humidity, NDVI, total_days
+    X = np.column_stack([
+        rng.uniform(10, 45, rows), rng.uniform(5, 8, rows), rng.uniform(15, 35, rows),
+        rng.uniform(50, 300, rows), rng.uniform(40, 90, rows), rng.uniform(0.3, 0.9, rows),
+        rng.randint(90, 150, rows),
+    ])
+    y = 2 + X[:, 0] * 0.05 + X[:, 5] * 3 + rng.normal(0, 0.3, rows)
+    yield_model = _random_forest("regressor", X, y, seed)
+    _dump(model_dir, "yield_model.pkl", yield_model)
+    save_bundle(os.path.join(model_dir, "yield"), "yield", yield_model,
+                ['soil_moisture', 'pH', 'temperature', 'rainfall', 'humidity', 'NDVI', 'total_days'],
+                metadata={"fixture": True})
+
+    # Fertilizer: N, P, K, temperature, ph, rainfall (served with zeros for the last three)
+    X = np.column_stack([rng.uniform(0, 140, rows), rng.uniform(5, 145, rows), rng.uniform(5, 205, rows),
+                         np.zeros(rows), np.zeros(rows), np.zeros(rows)])
+    y = rng.choice(FERTILIZERS, rows)
+    fertilizer = _random_forest("classifier", X, y, seed)
+    fertilizer_le = LabelEncoder().fit(FERTILIZERS)
+    _dump(model_dir, "fertilizer_model.pkl", fertilizer)
+    _dump(model_dir, "fertilizer_label_encoder.pkl", fertilizer_le)
+    save_bundle(os.path.join(model_dir, "fertilizer"), "fertilizer", fertilizer,
+                ['N', 'P', 'K', 'temperature', 'ph', 'rainfall'],
+                {"fertilizer_label": fertilizer.classes_}, metadata={"fixture": True})
+
+    with open(os.path.join(model_dir, "disease_classes.json"), "w") as f:
+        json.dump(DISEASE_CLASSES, f)
+
+
+def build_dataset(csv_path, rows=5000, seed=0):
+    """Writes a small Indian_crop_production_yield_dataset.csv lookalike."""
+    rng = np.random.RandomState(seed)
+    locations = [(state, district) for state, districts in STATES.items() for district in districts]
+    lines = ["State_Name,District_Name,Crop_Year,Season,Crop,Area,Production"]
+    for i in rng.randint(len(locations), size=rows):
+        state, district = locations[i]
+        lines.append(f"{state},{district},{rng.randint(1997, 2015)},{SEASONS[rng.randint(len(SEASONS))]},"
+                     f"{PRODUCTION_CROPS[rng.randint(len(PRODUCTION_CROPS))]},{rng.uniform(1, 5000):.1f},{rng.uniform(1, 9000):.1f}")
+    os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
+    with open(csv_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def build_fixtures(root, seed=0):
+    """Builds every fixture under root; returns (models_dir, dataset_path)."""
+    models_dir = os.path.join(root, "models")
+    dataset_path = os.path.join(root, "datasets", "Indian_crop_production_yield_dataset.csv")
+    build_models(models_dir, seed=seed)
+    build_dataset(dataset_path, seed=seed)
+    return models_dir, dataset_path
+
+
+class TinyDiseaseModel:
+    """Stand-in for the Keras/TFLite disease model: per-channel mean -> linear -> softmax."""
+
+    def __init__(self, n_classes, seed=0):
+        self.weights = np.random.RandomState(seed).normal(size=(3, n_classes)).astype(np.float32)
+
+    def __call__(self, X, training=False):
+        logits = np.asarray(X, dtype=np.float32).mean(axis=(1, 2)) @ self.weights
+        e = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+
+
+def install_fixture_disease_model(ml_api):
+    """Registers TinyDiseaseModel as ml_api's disease model (call before warm-up)."""
+    def load():
+        with open(ml_api._model_path("disease_classes.json"), "r") as f:
+            classes = json.load(f)
+        return SimpleNamespace(model=TinyDiseaseModel(len(classes)), classes=classes, backend="fixture", version=None)
+    ml_api.registry.register("disease", load, warm=ml_api._warm_disease,
+                             sources=[ml_api._model_path("disease_classes.json")])
+
+
+class StubCollection:
+    """Accepts audit log writes like a pymongo collection and only counts them."""
+
+    def __init__(self):
+        self.inserted = 0
+
+    def insert_many(self, documents, ordered=True):
+        self.inserted += len(documents)
+
+
+def sample_payloads(kind, n, seed=0, with_location=True):
+    """n request bodies (dicts) for the crop, yield or fertilizer endpoints."""
+    rng = np.random.RandomState(seed)
+    locations = [(s, d) for s, districts in STATES.items() for d in districts]
+    payloads = []
+    for i in range(n):
+        if kind == "crop":
+            body = dict(Nitrogen=round(rng.uniform(0, 140), 1), Phosphorus=round(rng.uniform(5, 145), 1),
+                        Potassium=round(rng.uniform(5, 205), 1), Temperature=round(rng.uniform(8, 44), 2),
+                        Humidity=round(rng.uniform(14, 100), 2), pH=round(rng.uniform(3.5, 9.9), 2),
+                        Rainfall=round(rng.uniform(20, 300), 1), Season=SEASONS[rng.randint(len(SEASONS))])
+            if with_location and i % 2:
+                body["State"], body["District"] = locations[rng.randint(len(locations))]
+        elif kind == "yield":
+            body = dict(soil_moisture=round(rng.uniform(10, 45), 1), pH=round(rng.uniform(5, 8), 2),
+                        temperature=round(rng.uniform(15, 35), 1), rainfall=round(rng.uniform(50, 300), 1),
+                        humidity=round(rng.uniform(40, 90), 1), total_days=int(rng.randint(90, 150)))
+        elif kind == "fertilizer":
+            body = dict(Nitrogen=round(rng.uniform(0, 140), 1), Phosphorus=round(rng.uniform(5, 145), 1),
+                        Potassium=round(rng.uniform(5, 205), 1), soil_type="Black", crop_type="Sugarcane")
+        else:
+            raise ValueError(f"Unknown payload kind: {kind}")
+        payloads.append(body)
+    return payloads
+
+
+def sample_images(n, size=256, seed=0):
+    """n random RGB JPEG images as bytes (requires Pillow)."""
+    from PIL import Image
+    rng = np.random.RandomState(seed)
+    images = []
+    for _ in range(n):
+        buf = io.BytesIO()
+        Image.fromarray(rng.randint(0, 256, (size, size, 3), dtype=np.uint8)).save(buf, format="JPEG")
+        images.append(buf.getvalue())
+    return images
+
+
+if __name__ == "__main__":
+    import sys
+    root = sys.argv[1] if len(sys.argv) > 1 else "bench_fixture_artifacts"
+    models_dir, dataset_path = build_fixtures(root)
+    print(f"Fixtures written: {models_dir}, {dataset_path}")
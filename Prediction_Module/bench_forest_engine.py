@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import pickle
+import numpy as np
+import pandas as pd
+
+# Latency benchmark: sklearn RandomForest vs forest_engine.FlatForest
+# Usage: python bench_forest_engine.py [repeats]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+from forest_engine import FlatForest
+
+REPEATS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+BATCH_SIZES = [1, 32, 1000]
+
+
+def sample_features(n):
+    soil = pd.read_csv(os.path.join(BASE_DIR, "datasets/Crop_recommendation.csv")).sample(n, replace=True, random_state=0)
+    base = soil[['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']].to_numpy(dtype=float)
+    rng = np.random.RandomState(0)
+    return {
+        # N, P, K, temperature, humidity, ph, rainfall, season
+        "crop_model": np.column_stack([base, rng.randint(0, 3, n)]),
+        # soil_moisture, ph, temperature, rainfall, humidity, NDVI, total_days
+        "yield_model": np.column_stack([rng.uniform(10, 45, n), base[:, 5], base[:, 3], base[:, 6], base[:, 4], np.full(n, 0.5), rng.randint(90, 150, n)]),
+        # N, P, K + 3 unused columns (see _fertilizer_feature_row)
+        "fertilizer_model": np.column_stack([base[:, :3], np.zeros((n, 3))]),
+    }
+
+
+def latency_ms(fn, X):
+    fn(X)
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(X)
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1000
+
+
+if __name__ == "__main__":
+    features = sample_features(max(BATCH_SIZES))
+    for name, X_all in features.items():
+        path = os.path.join(BASE_DIR, f"models/{name}.pkl")
+        if not os.path.exists(path):
+            print(f"Skipping {name}: {path} not found")
+            continue
+        with open(path, "rb") as f:
+            model = pickle.load(f)
+        flat = FlatForest.from_sklearn(model)
+        if name == "crop_model":
+            print(f"FlatForest backend: {flat.backend}")
+        is_classifier = hasattr(model, "classes_")
+        sk_fn = model.predict_proba if is_classifier else model.predict
+        flat_fn = flat.predict_proba if is_classifier else flat.predict
+
+        # Exactness check against a sequential forest (n_jobs=-1 sums trees in thread order)
+        model.set_params(n_jobs=1)
+        X_check = X_all[:1000]
+        exact = np.array_equal(sk_fn(X_check), flat_fn(X_check))
+        print(f"{name}: {len(model.estimators_)} trees, outputs identical to sklearn: {exact}")
+
+        model.set_params(n_jobs=-1)
+        for n in BATCH_SIZES:
+            X = X_all[:n]
+            sk = latency_ms(sk_fn, X)
+            fl = latency_ms(flat_fn, X)
+            print(f"  batch {n:>5}: sklearn {sk:8.2f} ms   flat {fl:8.2f} ms   speedup {sk / fl:5.1f}x")
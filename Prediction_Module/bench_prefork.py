@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+import http.client
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import psutil
+
+# Multi-worker serving benchmark: starts `python ml_api.py` with ML_WORKERS=N
+# (prefork, models shared copy-on-write; N=1 is the plain single uvicorn
+# process) for each N, drives it from separate client processes, and reports
+# total throughput, latency, and memory per worker: RSS (counts shared pages
+# in every process), USS (pages only that worker has) and PSS (shared pages
+# split between their users; PSS summed over all processes is the real total).
+# Defaults to the fixture models (bench_fixtures.py); --real-models serves
+# models/ and datasets/ for realistic memory numbers.
+# Usage: python bench_prefork.py [--workers 1,2,4] [--endpoint crop] [--requests 2000]
+#                                [--clients 4] [--concurrency 32] [--real-models] [--output results.json]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import bench_fixtures
+from bench_endpoints import build_scenarios, drive
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(port, path):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"{}")
+    finally:
+        conn.close()
+
+
+def start_server(workers, env, timeout=300):
+    port = _free_port()
+    env = {**os.environ, **env, "PORT": str(port), "ML_WORKERS": str(workers)}
+    proc = subprocess.Popen([sys.executable, "ml_api.py"], cwd=BASE_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"ml_api exited with status {proc.returncode}")
+        try:
+            # Ready, and (prefork) every worker forked
+            status, _ = _get(port, "/ready")
+            forked = len(psutil.Process(proc.pid).children()) if workers > 1 else workers
+            if status == 200 and forked >= workers:
+                return proc, port
+        except (ConnectionError, OSError):
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("ml_api did not become ready")
+
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def _client(args):
+    port, endpoint, requests, concurrency, batch_size = args
+    _, build = build_scenarios(batch_size, 1, disease=False)[endpoint]
+    elapsed, latencies, statuses = drive(port, build, requests, concurrency)
+    return latencies, statuses
+
+
+def memory(proc, workers):
+    """(parent, [worker]) memory_full_info in MB; with one worker the server process is the worker."""
+    server = psutil.Process(proc.pid)
+    def mb(p):
+        info = p.memory_full_info()
+        return {k: round(getattr(info, k) / 1024 / 1024, 1) for k in ("rss", "uss", "pss")}
+    if workers == 1:
+        return None, [mb(server)]
+    return mb(server), [mb(child) for child in server.children()]
+
+
+def run(workers, endpoint, requests, clients, concurrency, batch_size, env):
+    proc, port = start_server(workers, env)
+    try:
+        # Warm every worker's micro-batcher, caches and allocator before measuring
+        with ProcessPoolExecutor(clients) as pool:
+            list(pool.map(_client, [(port, endpoint, 50, max(1, concurrency // clients), batch_size)] * clients))
+            start = time.perf_counter()
+            parts = list(pool.map(_client, [(port, endpoint, requests // clients, max(1, concurrency // clients), batch_size)] * clients))
+            elapsed = time.perf_counter() - start
+        parent, worker_mem = memory(proc, workers)
+    finally:
+        stop_server(proc)
+
+    latencies = np.concatenate([p[0] for p in parts]) * 1000
+    statuses = np.concatenate([p[1] for p in parts])
+    total_pss = sum(w["pss"] for w in worker_mem) + (parent["pss"] if parent else 0)
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": int(((statuses < 200) | (statuses >= 300)).sum()),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "parent_mb": parent,
+        "worker_mb": worker_mem,
+        "avg_worker_rss_mb": round(np.mean([w["rss"] for w in worker_mem]), 1),
+        "avg_worker_uss_mb": round(np.mean([w["uss"] for w in worker_mem]), 1),
+        "total_pss_mb": round(total_pss, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prefork multi-worker serving benchmark")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--endpoint", default="crop", help="bench_endpoints scenario name (tabular ones)")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=min(4, os.cpu_count() or 1), help="client processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="connections across all clients")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--real-models", action="store_true")
+    parser.add_argument("--output")
+    args = parser.parse_args(argv)
+
+    # No audit writes, no model watching; disease off unless the real model is served
+    env = {"MONGO_URL": "mongodb://127.0.0.1:1/bench", "ML_MONGO_TIMEOUT_MS": "100",
+           "ML_MODEL_WATCH_INTERVAL": "0", "ML_AUDIT_SPILL_PATH": os.devnull}
+    if not args.real_models:
+        root = tempfile.mkdtemp(prefix="agrivista-prefork-")
+        models_dir, dataset_path = bench_fixtures.build_fixtures(root)
+        env.update(ML_MODELS_DIR=models_dir, ML_DATASET_PATH=dataset_path, ML_DISEASE_ENABLED="0")
+
+    print(f"{os.cpu_count()} CPUs, endpoint {args.endpoint}, {args.requests} requests, "
+          f"{args.clients} client processes x {args.concurrency // args.clients} connections")
+    results = []
+    for workers in [int(w) for w in args.workers.split(",")]:
+        r = run(workers, args.endpoint, args.requests, args.clients, args.concurrency, args.batch_size, env)
+        results.append(r)
+        parent = f"   parent PSS {r['parent_mb']['pss']:.1f} MB" if r["parent_mb"] else ""
+        print(f"workers {workers:>2}: {r['throughput_rps']:>8.1f} req/s   p50 {r['p50_ms']:>7.2f}  p95 {r['p95_ms']:>7.2f} ms   "
+              f"per worker RSS {r['avg_worker_rss_mb']:>6.1f} / USS {r['avg_worker_uss_mb']:>6.1f} MB   "
+              f"total PSS {r['total_pss_mb']:>7.1f} MB{parent}   errors {r['errors']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cpu_count": os.cpu_count(), "endpoint": args.endpoint, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
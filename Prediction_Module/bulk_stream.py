@@ -0,0 +1,81 @@
+import csv
+import json
+import codecs
+
+# Incremental parsing of bulk scoring uploads (NDJSON or CSV) for the
+# /stream/* endpoints: body chunks go in as they arrive, complete records
+# come out, and nothing beyond the current partial line is kept, so memory
+# does not grow with the size of the upload.
+#
+# CSV: the first non-blank line is the header; empty cells become None so
+# optional fields (State, District, Season, area) fall back to their
+# defaults. Quoted cells spanning several lines are not supported.
+#
+# A leading UTF-8 byte order mark (Excel and most government CSV exports
+# write one) is dropped, as pandas does for score.py, so it does not end up
+# in the first column name.
+
+
+class LineSplitter:
+    """Splits a byte stream into decoded text lines, whatever the chunk boundaries."""
+
+    def __init__(self, max_line_bytes=1 << 20, encoding="utf-8-sig"):
+        self.max_line_bytes = int(max_line_bytes)
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="strict")
+        self._partial = ""
+
+    def feed(self, chunk):
+        """Complete lines contained in chunk (plus the partial line kept from before)."""
+        text = self._partial + self._decoder.decode(chunk)
+        lines = text.split("\n")
+        self._partial = lines.pop()
+        if len(self._partial) > self.max_line_bytes:
+            raise ValueError(f"Line longer than {self.max_line_bytes} bytes")
+        return [line.rstrip("\r") for line in lines]
+
+    def close(self):
+        """The last line, when the stream does not end with a newline."""
+        text = self._partial + self._decoder.decode(b"", final=True)
+        self._partial = ""
+        return [text.rstrip("\r")] if text else []
+
+
+class RecordParser:
+    """Turns one text line into a record dict (None for blank/header lines); raises ValueError on bad rows."""
+
+    FORMATS = ("ndjson", "csv")
+
+    def __init__(self, fmt="ndjson"):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unsupported format: {fmt} (expected one of {', '.join(self.FORMATS)})")
+        self.fmt = fmt
+        self.header = None
+
+    def parse(self, line):
+        if not line.strip():
+            return None
+        if self.fmt == "ndjson":
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON: {e}")
+            if not isinstance(record, dict):
+                raise ValueError("Each line must be a JSON object")
+            return record
+
+        cells = next(csv.reader([line]))
+        if self.header is None:
+            self.header = [c.strip() for c in cells]
+            return None
+        if len(cells) != len(self.header):
+            raise ValueError(f"Expected {len(self.header)} columns, got {len(cells)}")
+        return {k: (v if v.strip() else None) for k, v in zip(self.header, cells)}
+
+
+def detect_format(fmt, content_type):
+    """Explicit ?format= wins; otherwise text/csv uploads are CSV and anything else NDJSON."""
+    if fmt:
+        return fmt.lower()
+    if content_type and content_type.split(";")[0].strip().lower() in ("text/csv", "application/csv"):
+        return "csv"
+    return "ndjson"
@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+
+from location_index import build_location_index
+
+# Columnar cache of datasets/Indian_crop_production_yield_dataset.csv, written
+# next to it as <name>.cache/:
+#   manifest.json    CSV checksum, cleaned category names per column and the
+#                    derived state/district/season lists served by the API
+#   codes.npy        (rows, 4) int32 category codes (-1 = missing), opened with mmap
+#   counts.npy       (n, 5) [state, district, season, crop, count] rows behind
+#                    the location index, most frequent crop first per location
+# The cache is rebuilt (with pandas) only when the CSV checksum changes, so a
+# normal start reads a few small files and never imports pandas.
+#
+# cache_dir puts the cache elsewhere (e.g. a tmp dir when datasets/ is on a
+# read-only image or volume). If the cache cannot be written at all, the
+# dataset is parsed into memory instead, as before the cache existed.
+CACHE_FORMAT = "agrivista-crop-dataset"
+CACHE_FORMAT_VERSION = 1
+COLUMNS = ['State_Name', 'District_Name', 'Season', 'Crop']
+
+
+def cache_path_for(csv_path, cache_dir=None):
+    path = os.path.splitext(csv_path)[0] + ".cache"
+    if cache_dir:
+        return os.path.join(cache_dir, os.path.basename(path))
+    return path
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CropDataset:
+    """Cleaned production table (category codes) plus the lookups derived from it."""
+
+    def __init__(self, path, manifest, codes, counts):
+        self.path = path
+        self.manifest = manifest
+        self.codes = codes
+        self.counts = counts
+
+    @property
+    def categories(self):
+        return self.manifest["categories"]
+
+    @property
+    def version(self):
+        return self.manifest["csv_sha256"][:12]
+
+    @property
+    def n_rows(self):
+        return len(self.codes)
+
+    @property
+    def seasons(self):
+        return self.manifest["seasons"]
+
+    @property
+    def states(self):
+        return self.manifest["states"]
+
+    @property
+    def locations(self):
+        return self.manifest["locations"]
+
+    def location_index(self):
+        cats = self.categories
+        return build_location_index(self.counts, cats['State_Name'], cats['District_Name'], cats['Season'], cats['Crop'])
+
+
+def _clean_codes(column):
+    # Lowercase/strip the categories, merging ones that collapse to the same name
+    # (e.g. 'Rice' and 'rice'); codes index the sorted cleaned names
+    cleaned = [str(x).strip().lower() for x in column.cat.categories]
+    names = sorted(set(cleaned))
+    position = {name: i for i, name in enumerate(names)}
+    remap = np.array([position[name] for name in cleaned] + [-1], dtype=np.int32)
+    # Missing values have code -1, which picks the trailing -1 in remap
+    return remap[column.cat.codes.to_numpy()], names
+
+
+def _display_names(names, codes):
+    # Title-cased names that occur in the table, skipping empty ones
+    present = np.unique(codes[codes >= 0])
+    return sorted(names[i].title() for i in present if names[i])
+
+
+def _parse(csv_path, csv_sha256=None):
+    """Parses the CSV into (manifest, codes, counts)."""
+    import pandas as pd
+
+    df = pd.read_csv(csv_path, usecols=COLUMNS, dtype={col: 'category' for col in COLUMNS})
+
+    codes = np.empty((len(df), len(COLUMNS)), dtype=np.int32)
+    categories = {}
+    for i, col in enumerate(COLUMNS):
+        codes[:, i], categories[col] = _clean_codes(df[col])
+    del df
+
+    state, district, season, crop = (codes[:, i] for i in range(len(COLUMNS)))
+    states, districts = categories['State_Name'], categories['District_Name']
+
+    # State -> districts present with that state
+    pairs = np.unique(codes[(state >= 0) & (district >= 0)][:, :2], axis=0)
+    locations = {}
+    for s in np.unique(pairs[:, 0]):
+        display_districts = sorted(districts[d].title() for d in pairs[pairs[:, 0] == s, 1] if districts[d])
+        locations[states[s].title()] = display_districts
+
+    # Crop counts per location; codes follow sorted names, so sorting by code
+    # breaks count ties by crop name
+    complete = codes[(codes >= 0).all(axis=1)]
+    rows, n = np.unique(complete, axis=0, return_counts=True)
+    counts = np.column_stack([rows, n]).astype(np.int32)
+    counts = counts[np.lexsort((counts[:, 3], -counts[:, 4], counts[:, 2], counts[:, 1], counts[:, 0]))]
+
+    stat = os.stat(csv_path)
+    manifest = {
+        "format": CACHE_FORMAT,
+        "format_version": CACHE_FORMAT_VERSION,
+        "csv_sha256": csv_sha256 or file_sha256(csv_path),
+        "csv_size": stat.st_size,
+        "csv_mtime_ns": stat.st_mtime_ns,
+        "rows": len(codes),
+        "columns": COLUMNS,
+        "categories": categories,
+        "seasons": _display_names(categories['Season'], season),
+        "states": _display_names(states, state),
+        "locations": locations,
+    }
+    return manifest, codes, counts
+
+
+def build_cache(csv_path, cache_path=None, csv_sha256=None):
+    """Parses the CSV once and writes the columnar cache; returns the manifest."""
+    cache_path = cache_path or cache_path_for(csv_path)
+    start = time.perf_counter()
+    manifest, codes, counts = _parse(csv_path, csv_sha256)
+
+    # Per-process temp names: several workers may rebuild at the same time
+    tmp_path = f"{cache_path}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    try:
+        np.save(os.path.join(tmp_path, "codes.npy"), codes, allow_pickle=False)
+        np.save(os.path.join(tmp_path, "counts.npy"), counts, allow_pickle=False)
+        _write_manifest(tmp_path, manifest)
+
+        old_path = f"{cache_path}.old{os.getpid()}"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(cache_path):
+            os.replace(cache_path, old_path)
+        os.replace(tmp_path, cache_path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    print(f"Built dataset cache {cache_path}: {len(codes)} rows, {len(counts)} location/crop pairs "
+          f"in {time.perf_counter() - start:.2f}s")
+    return manifest
+
+
+def _read_manifest(cache_path):
+    try:
+        with open(os.path.join(cache_path, "manifest.json"), "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != CACHE_FORMAT or manifest.get("format_version") != CACHE_FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def _write_manifest(cache_path, manifest):
+    tmp_file = os.path.join(cache_path, f"manifest.json.{os.getpid()}")
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file, os.path.join(cache_path, "manifest.json"))
+
+
+def load_crop_dataset(csv_path, cache_path=None, mmap=True, cache_dir=None):
+    """Opens the columnar cache for csv_path, rebuilding it first if the CSV changed."""
+    cache_path = cache_path or cache_path_for(csv_path, cache_dir)
+    manifest = _read_manifest(cache_path)
+    stat = os.stat(csv_path)
+    sha = None
+    try:
+        if manifest is None:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            manifest = build_cache(csv_path, cache_path)
+        elif (stat.st_size, stat.st_mtime_ns) != (manifest["csv_size"], manifest["csv_mtime_ns"]):
+            # Only hash the CSV when size/mtime changed; a touched but identical
+            # file (e.g. a fresh checkout) keeps the cache
+            sha = file_sha256(csv_path)
+            if sha != manifest["csv_sha256"]:
+                manifest = build_cache(csv_path, cache_path, csv_sha256=sha)
+            else:
+                manifest.update(csv_size=stat.st_size, csv_mtime_ns=stat.st_mtime_ns)
+                try:
+                    _write_manifest(cache_path, manifest)
+                except OSError:
+                    pass  # The cache is still valid; the CSV is hashed again next start
+    except OSError as e:
+        print(f"Dataset cache {cache_path} not writable ({e}); parsing {csv_path} in memory")
+        manifest, codes, counts = _parse(csv_path, csv_sha256=sha)
+        return CropDataset(None, manifest, codes, counts)
+
+    mmap_mode = "r" if mmap else None
+    codes = np.load(os.path.join(cache_path, "codes.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+    counts = np.load(os.path.join(cache_path, "counts.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+    return CropDataset(cache_path, manifest, codes, counts)
+
+
+if __name__ == "__main__":
+    # Preprocessing step: python crop_dataset.py [csv_path]
+    default_csv = os.path.join(os.path.dirname(os.path.abspath(__file__)), "datasets/Indian_crop_production_yield_dataset.csv")
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else default_csv
+    build_cache(csv_path)
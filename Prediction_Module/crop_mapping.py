@@ -0,0 +1,73 @@
+import numpy as np
+
+# MAPPING DICTIONARY (Model Name -> Dataset Name)
+# Soil model labels (Crop_recommendation.csv) use different names than the
+# production dataset for some crops; shared by ml_api and the training scripts.
+CROP_NAME_MAPPING = {
+    'chickpea': ['gram', 'bengal gram'],
+    'kidneybeans': ['rajmash kholar', 'rajma', 'beans & mutter(vegetable)'],
+    'mothbeans': ['moth'],
+    'mungbean': ['moong(green gram)'],
+    'blackgram': ['urad'],
+    'lentil': ['masoor'],
+    'pigeonpeas': ['arhar/tur', 'redgram'],
+    'cotton': ['cotton(lint)', 'kapas'],
+    'jute': ['jute & mesta'],
+    'pomegranate': ['pome granet', 'pomegranate'],
+    'watermelon': ['water melon'],
+    'muskmelon': ['musk melon'],
+    'apple': ['apple'],
+    'orange': ['citrus fruit', 'orange'],
+    'papaya': ['papaya'],
+    'coconut': ['coconut'],
+    'grapes': ['grapes'],
+    'banana': ['banana'],
+    'maize': ['maize'],
+    'rice': ['rice', 'paddy'],
+    'coffee': ['coffee'],
+    'tea': ['tea']
+}
+
+# Inverted mapping: production_name -> soil_name
+PROD_TO_SOIL_MAP = {}
+for soil_name, prod_names in CROP_NAME_MAPPING.items():
+    for pn in prod_names:
+        PROD_TO_SOIL_MAP[pn] = soil_name
+
+
+def normalize_crop_name(name):
+    return str(name).lower().strip()
+
+
+def dataset_names_for(model_crop):
+    """All production-dataset names that count as growing this model crop."""
+    name = normalize_crop_name(model_crop)
+    return frozenset([name, *CROP_NAME_MAPPING.get(name, [])])
+
+
+class CropCompatibility:
+    """
+    Resolves model crop classes against historical (production) crop names once.
+
+    class_names must be in the crop model's probability column order. After
+    build_masks(), masks[location_key] is a boolean array over those columns
+    marking crops grown at that location and season.
+    """
+
+    def __init__(self, class_names):
+        self.class_names = np.asarray(class_names)
+        self._names = [dataset_names_for(c) for c in self.class_names]
+        self.masks = {}
+        self.index = None
+
+    def mask(self, historical_crops):
+        """Boolean mask of model classes grown in historical_crops (normalized names)."""
+        return np.fromiter(
+            (not names.isdisjoint(historical_crops) for names in self._names),
+            dtype=bool, count=len(self._names)
+        )
+
+    def build_masks(self, location_index):
+        self.masks = {key: self.mask(entry.crops) for key, entry in location_index.items()}
+        self.index = location_index
+        return self
@@ -0,0 +1,107 @@
+import threading
+import numpy as np
+
+
+def preprocess_input(x):
+    """MobileNetV2 preprocessing (scale pixels to [-1, 1]) without importing TensorFlow."""
+    x = np.asarray(x, dtype=np.float32)
+    return x / 127.5 - 1.0
+
+
+def _load_interpreter_class():
+    # Prefer the standalone runtimes; full TensorFlow is only a last resort
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+# Batch sizes the interpreters are built for. A call is zero-padded up to the
+# next size (larger batches run in chunks of the largest one), so tensors are
+# allocated once per size instead of on every micro-batch whose size changed.
+BATCH_SIZES = (1, 2, 4, 8, 16, 32)
+
+
+class TFLiteDiseaseModel:
+    """
+    Runs an exported .tflite disease model behind the same call signature as
+    the Keras model (model(X, training=False) -> probabilities).
+
+    Keeps one interpreter per batch size in batch_sizes, created on first use
+    and never resized. Interpreters are not thread-safe, so calls on the same
+    one are serialized.
+    """
+
+    def __init__(self, path, num_threads=None, batch_sizes=BATCH_SIZES):
+        self._Interpreter = _load_interpreter_class()
+        self.path = path
+        self.num_threads = num_threads
+        self.batch_sizes = tuple(sorted({int(b) for b in batch_sizes}))
+        self._interpreters = {}  # batch size -> (interpreter, lock)
+        self._create_lock = threading.Lock()
+        interpreter, _ = self._interpreter(self.batch_sizes[0])
+        self._input = interpreter.get_input_details()[0]
+        self._output = interpreter.get_output_details()[0]
+
+    def _interpreter(self, batch_size):
+        entry = self._interpreters.get(batch_size)
+        if entry is None:
+            with self._create_lock:
+                entry = self._interpreters.get(batch_size)
+                if entry is None:
+                    interpreter = self._Interpreter(model_path=self.path, num_threads=self.num_threads)
+                    details = interpreter.get_input_details()[0]
+                    if int(details["shape"][0]) != batch_size:
+                        interpreter.resize_tensor_input(details["index"], [batch_size, *details["shape"][1:]])
+                    interpreter.allocate_tensors()
+                    entry = self._interpreters[batch_size] = (interpreter, threading.Lock())
+        return entry
+
+    @property
+    def input_shape(self):
+        return tuple(int(d) for d in self._input["shape"][1:])
+
+    def _quantize(self, X):
+        # Full-integer models take int8/uint8 input; float models pass through
+        dtype = self._input["dtype"]
+        if dtype == np.float32:
+            return X.astype(np.float32, copy=False)
+        scale, zero_point = self._input["quantization"]
+        return np.clip(np.round(X / scale + zero_point), np.iinfo(dtype).min, np.iinfo(dtype).max).astype(dtype)
+
+    def _dequantize(self, Y):
+        if Y.dtype == np.float32:
+            return Y
+        scale, zero_point = self._output["quantization"]
+        return (Y.astype(np.float32) - zero_point) * scale
+
+    def _run(self, X):
+        n = len(X)
+        batch_size = next(b for b in self.batch_sizes if b >= n)
+        X = self._quantize(X)
+        if n < batch_size:
+            X = np.concatenate([X, np.zeros((batch_size - n, *X.shape[1:]), dtype=X.dtype)])
+        interpreter, lock = self._interpreter(batch_size)
+        with lock:
+            interpreter.set_tensor(self._input["index"], X)
+            interpreter.invoke()
+            return interpreter.get_tensor(self._output["index"])[:n].copy()
+
+    def __call__(self, X, training=False):
+        X = np.asarray(X)
+        largest = self.batch_sizes[-1]
+        if len(X) <= largest:
+            return self._dequantize(self._run(X))
+        return self._dequantize(np.concatenate([self._run(X[start:start + largest])
+                                                for start in range(0, len(X), largest)]))
+
+    def predict(self, X, verbose=0):
+        return self(X)
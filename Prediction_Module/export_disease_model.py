@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import psutil
+from PIL import Image
+
+from disease_runtime import TFLiteDiseaseModel, preprocess_input
+
+# Converts models/disease_model.keras to a post-training-quantized int8 TFLite
+# model, checks accuracy parity on a held-out image folder, and reports
+# latency and RSS for both backends (each measured in a fresh process).
+#
+# Usage: python export_disease_model.py [--holdout DIR] [--calibration DIR]
+# ml_api serves the export automatically (ML_DISEASE_BACKEND=auto) and
+# hot-reloads it when the file changes, so the candidate is written to a
+# temporary file and only moved to TFLITE_MODEL_PATH once parity passes.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_DIR = os.path.join(os.path.dirname(BASE_DIR), "Disease_Detection", "Plant Village Dataset")
+
+KERAS_MODEL_PATH = os.path.join(BASE_DIR, "models", "disease_model.keras")
+TFLITE_MODEL_PATH = os.path.join(BASE_DIR, "models", "disease_model_int8.tflite")
+CLASSES_PATH = os.path.join(BASE_DIR, "models", "disease_classes.json")
+REPORT_PATH = os.path.join(BASE_DIR, "models", "disease_model_int8.report.json")
+
+IMG_SIZE = (224, 224)
+BATCH_SIZE = 32
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def load_image(path):
+    # Same preprocessing as ml_api._preprocess_image
+    image = Image.open(path)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return preprocess_input(np.array(image.resize(IMG_SIZE), dtype=np.float32))
+
+
+def list_images(folder, classes, per_class=None):
+    """[(path, class_index)] from a folder with one sub-folder per class."""
+    items = []
+    for label, name in enumerate(classes):
+        class_dir = os.path.join(folder, name)
+        if not os.path.isdir(class_dir):
+            continue
+        files = sorted(f for f in os.listdir(class_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+        items.extend((os.path.join(class_dir, f), label) for f in files[:per_class])
+    return items
+
+
+def predict_all(model, items):
+    outputs = []
+    for start in range(0, len(items), BATCH_SIZE):
+        X = np.stack([load_image(path) for path, _ in items[start:start + BATCH_SIZE]])
+        outputs.append(np.asarray(model(X, training=False)))
+    return np.concatenate(outputs)
+
+
+def convert(calibration_items, output_path):
+    import tensorflow as tf
+    model = tf.keras.models.load_model(KERAS_MODEL_PATH)
+
+    def representative_dataset():
+        for path, _ in calibration_items:
+            yield [load_image(path)[np.newaxis]]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    # int8 weights and activations; input/output stay float32 so callers are unchanged
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    tflite_model = converter.convert()
+
+    with open(output_path, "wb") as f:
+        f.write(tflite_model)
+    print(f"Wrote {output_path} ({len(tflite_model) / 1024 / 1024:.2f} MB, "
+          f"keras model {os.path.getsize(KERAS_MODEL_PATH) / 1024 / 1024:.2f} MB)")
+    return model
+
+
+def parity(keras_model, tflite_path, holdout_items):
+    labels = np.array([label for _, label in holdout_items])
+    keras_proba = predict_all(keras_model, holdout_items)
+    tflite_proba = predict_all(TFLiteDiseaseModel(tflite_path), holdout_items)
+
+    keras_top1, tflite_top1 = keras_proba.argmax(axis=1), tflite_proba.argmax(axis=1)
+    return {
+        "images": len(holdout_items),
+        "keras_accuracy": round(float((keras_top1 == labels).mean()), 4),
+        "tflite_accuracy": round(float((tflite_top1 == labels).mean()), 4),
+        "top1_agreement": round(float((keras_top1 == tflite_top1).mean()), 4),
+        "max_abs_proba_diff": round(float(np.abs(keras_proba - tflite_proba).max()), 4),
+    }
+
+
+def bench_backend(backend, repeats, tflite_path):
+    """Runs in a child process so import cost and RSS are measured from scratch."""
+    process = psutil.Process(os.getpid())
+    rss_start = process.memory_info().rss
+    start = time.perf_counter()
+    if backend == "tflite":
+        model = TFLiteDiseaseModel(tflite_path)
+    else:
+        import tensorflow as tf
+        model = tf.keras.models.load_model(KERAS_MODEL_PATH)
+    load_seconds = time.perf_counter() - start
+
+    X = np.zeros((1, *IMG_SIZE, 3), dtype=np.float32)
+    model(X, training=False)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model(X, training=False)
+        times.append(time.perf_counter() - start)
+
+    return {
+        "backend": backend,
+        "import_and_load_seconds": round(load_seconds, 3),
+        "latency_ms_p50": round(float(np.median(times)) * 1000, 2),
+        "latency_ms_p95": round(float(np.percentile(times, 95)) * 1000, 2),
+        "rss_mb": round(process.memory_info().rss / 1024 / 1024, 1),
+        "rss_added_mb": round((process.memory_info().rss - rss_start) / 1024 / 1024, 1),
+    }
+
+
+def run_bench(backend, repeats, tflite_path):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--bench", backend, "--repeats", str(repeats),
+         "--tflite-path", tflite_path],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the disease model to int8 TFLite and check parity")
+    parser.add_argument("--holdout", default=os.path.join(DATASET_DIR, "Test"))
+    parser.add_argument("--calibration", default=os.path.join(DATASET_DIR, "Val"))
+    parser.add_argument("--calibration-per-class", type=int, default=10)
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.01)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--bench", choices=["keras", "tflite"], help=argparse.SUPPRESS)
+    parser.add_argument("--tflite-path", default=TFLITE_MODEL_PATH, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.bench:
+        print(json.dumps(bench_backend(args.bench, args.repeats, args.tflite_path)))
+        sys.exit(0)
+
+    with open(CLASSES_PATH, "r") as f:
+        classes = json.load(f)
+    calibration_items = list_images(args.calibration, classes, per_class=args.calibration_per_class)
+    holdout_items = list_images(args.holdout, classes)
+    if not calibration_items or not holdout_items:
+        sys.exit(f"Need class sub-folders with images in {args.calibration} and {args.holdout}")
+
+    # Same directory as the served file, so the final os.replace is atomic
+    fd, candidate_path = tempfile.mkstemp(dir=os.path.dirname(TFLITE_MODEL_PATH),
+                                          prefix=".disease_model_int8.", suffix=".tflite.tmp")
+    os.close(fd)
+    try:
+        print(f"Calibrating on {len(calibration_items)} images from {args.calibration}...")
+        keras_model = convert(calibration_items, candidate_path)
+
+        print(f"Checking parity on {len(holdout_items)} images from {args.holdout}...")
+        report = {"parity": parity(keras_model, candidate_path, holdout_items)}
+        print(json.dumps(report["parity"], indent=2))
+
+        report["backends"] = [run_bench(backend, args.repeats, candidate_path) for backend in ("keras", "tflite")]
+        for b in report["backends"]:
+            print(f"{b['backend']:<7} load {b['import_and_load_seconds']:6.2f} s   p50 {b['latency_ms_p50']:7.2f} ms   "
+                  f"p95 {b['latency_ms_p95']:7.2f} ms   RSS {b['rss_mb']:7.1f} MB (+{b['rss_added_mb']:.1f} MB)")
+
+        with open(REPORT_PATH, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {REPORT_PATH}")
+
+        drop = report["parity"]["keras_accuracy"] - report["parity"]["tflite_accuracy"]
+        if drop > args.max_accuracy_drop:
+            # The served export (if any) is left as it was
+            sys.exit(f"Quantized accuracy dropped by {drop:.4f} (max {args.max_accuracy_drop}); "
+                     f"{TFLITE_MODEL_PATH} not updated")
+        os.chmod(candidate_path, 0o644)  # mkstemp creates it owner-only
+        os.replace(candidate_path, TFLITE_MODEL_PATH)
+        print(f"Published {TFLITE_MODEL_PATH}")
+    finally:
+        if os.path.exists(candidate_path):
+            os.remove(candidate_path)
@@ -0,0 +1,179 @@
+import importlib.util
+import numpy as np
+
+# numba is imported (and the kernel compiled) on first use, not at import time
+NUMBA_AVAILABLE = importlib.util.find_spec("numba") is not None
+
+# Rows per traversal chunk for the NumPy fallback; bounds the (rows x trees) node buffer
+CHUNK_ROWS = 256
+
+
+def flatten_forest(model):
+    """
+    Flattens a fitted RandomForestClassifier/Regressor into contiguous arrays.
+
+    All trees are concatenated into one node table (feature, threshold, left,
+    right, missing_left, value) with roots[t] pointing at the first node of
+    tree t. Leaves point to themselves, so traversal can run a fixed max_depth
+    steps without branching on leaf checks. missing_left is sklearn's
+    missing_go_to_left: the side a NaN feature value takes at that split.
+    """
+    trees = [est.tree_ for est in model.estimators_]
+    if any(t.n_outputs != 1 for t in trees):
+        raise ValueError("Only single-output forests are supported")
+
+    is_classifier = hasattr(model, "classes_")
+    feature, threshold, left, right, missing_left, value, roots = [], [], [], [], [], [], []
+    offset = 0
+    for t in trees:
+        n = t.node_count
+        is_leaf = t.children_left == -1
+        self_idx = np.arange(n) + offset
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, t.feature))
+        threshold.append(t.threshold)
+        left.append(np.where(is_leaf, self_idx, t.children_left + offset))
+        right.append(np.where(is_leaf, self_idx, t.children_right + offset))
+        missing_left.append(t.missing_go_to_left)
+        # Classifier leaves already hold class fractions (sklearn >= 1.4), which
+        # DecisionTreeClassifier.predict_proba returns as-is; normalizing them
+        # again would change the last bit of some probabilities
+        value.append(t.value[:, 0, :])
+        offset += n
+
+    arrays = {
+        "feature": np.concatenate(feature).astype(np.intp),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "left": np.concatenate(left).astype(np.intp),
+        "right": np.concatenate(right).astype(np.intp),
+        "missing_left": np.concatenate(missing_left).astype(np.uint8),
+        "value": np.ascontiguousarray(np.concatenate(value), dtype=np.float64),
+        "roots": np.asarray(roots, dtype=np.intp),
+        "max_depth": np.asarray(max(t.max_depth for t in trees), dtype=np.intp),
+        "n_features": np.asarray(model.n_features_in_, dtype=np.intp),
+    }
+    if is_classifier:
+        arrays["classes"] = np.asarray(model.classes_)
+    return arrays
+
+
+def _accumulate_numpy(X, feature, threshold, left, right, missing_left, value, roots, max_depth, out):
+    # Vectorized over (row, tree): every pair takes one step per depth level
+    rows = np.arange(len(X))[:, None]
+    nodes = np.broadcast_to(roots, (len(X), len(roots))).copy()
+    has_missing = np.isnan(X).any()
+    for _ in range(max_depth):
+        x = X[rows, feature[nodes]]
+        go_left = x <= threshold[nodes]
+        if has_missing:
+            go_left |= np.isnan(x) & (missing_left[nodes] != 0)
+        nodes = np.where(go_left, left[nodes], right[nodes])
+    # Add trees left to right, same order as sklearn's accumulation
+    for t in range(nodes.shape[1]):
+        out += value[nodes[:, t]]
+
+
+def _accumulate_loops(X, feature, threshold, left, right, missing_left, value, roots, out):
+    # Compiled by numba in _numba_kernel(); far too slow as plain Python
+    for i in range(X.shape[0]):
+        for t in range(roots.shape[0]):
+            node = roots[t]
+            while left[node] != node:
+                x = X[i, feature[node]]
+                if x <= threshold[node]:
+                    node = left[node]
+                elif x != x and missing_left[node]:
+                    # NaN takes the side sklearn learned (or chose) for missing values
+                    node = left[node]
+                else:
+                    node = right[node]
+            for c in range(value.shape[1]):
+                out[i, c] += value[node, c]
+
+
+_accumulate_numba = None
+
+
+def _numba_kernel():
+    global _accumulate_numba
+    if _accumulate_numba is None and NUMBA_AVAILABLE:
+        import numba
+        _accumulate_numba = numba.njit(cache=True, nogil=True)(_accumulate_loops)
+    return _accumulate_numba
+
+
+class FlatForest:
+    """
+    Inference over a flattened forest, using a small numba kernel when numba
+    is installed and vectorized NumPy traversal otherwise.
+
+    Exposes the subset of the sklearn API used by ml_api (predict,
+    predict_proba, classes_, n_features_in_). Matches sklearn's float32 split
+    comparisons, missing value routing and tree-order accumulation, so outputs
+    equal a sequential (n_jobs=1) sklearn forest bit for bit. Like sklearn,
+    infinite inputs are rejected.
+    """
+
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        # Absent in bundles written before NaN routing was exported
+        self.missing_left = arrays.get("missing_left")
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.max_depth = int(arrays["max_depth"])
+        self.n_features_in_ = int(arrays["n_features"])
+        self.is_classifier = "classes" in arrays
+        if self.is_classifier:
+            self.classes_ = arrays["classes"]
+
+    @classmethod
+    def from_sklearn(cls, model):
+        return cls(flatten_forest(model))
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def backend(self):
+        return "numba" if NUMBA_AVAILABLE else "numpy"
+
+    def _mean_leaf_values(self, X):
+        # sklearn casts inputs to float32 before comparing with float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}, expected (n, {self.n_features_in_})")
+        if np.isinf(X).any():
+            raise ValueError("Input X contains infinity or a value too large for dtype('float32').")
+        missing_left = self.missing_left
+        if missing_left is None:
+            if np.isnan(X).any():
+                raise ValueError("Input X contains NaN and this model bundle predates missing value support; "
+                                 "rebuild it with model_bundle.py")
+            missing_left = np.zeros(len(self.left), dtype=np.uint8)
+        out = np.zeros((len(X), self.value.shape[1]), dtype=np.float64)
+        kernel = _numba_kernel()
+        if kernel is not None:
+            kernel(X, self.feature, self.threshold, self.left, self.right, missing_left, self.value, self.roots, out)
+        else:
+            for start in range(0, len(X), CHUNK_ROWS):
+                _accumulate_numpy(X[start:start + CHUNK_ROWS], self.feature, self.threshold, self.left,
+                                  self.right, missing_left, self.value, self.roots, self.max_depth,
+                                  out[start:start + CHUNK_ROWS])
+        out /= self.n_estimators
+        return out
+
+    def predict_proba(self, X):
+        if not self.is_classifier:
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._mean_leaf_values(X)
+
+    def predict(self, X):
+        values = self._mean_leaf_values(X)
+        if self.is_classifier:
+            return self.classes_.take(np.argmax(values, axis=1))
+        return values[:, 0]
+
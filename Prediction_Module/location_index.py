@@ -0,0 +1,54 @@
+import sys
+import time
+from itertools import groupby
+import numpy as np
+
+
+def location_key(state, district, season):
+    """Normalized (state, district, season) key, matching the cleaned dataset columns."""
+    return (
+        str(state).strip().lower(),
+        str(district).strip().lower(),
+        str(season).strip().lower(),
+    )
+
+
+class LocationEntry:
+    """Historical crops for one (state, district, season), most frequent first."""
+    __slots__ = ("crops", "ranking", "counts")
+
+    def __init__(self, ranking, counts):
+        self.ranking = ranking
+        self.counts = counts
+        self.crops = frozenset(ranking)
+
+
+def build_location_index(counts, states, districts, seasons, crops):
+    """
+    Builds the (state, district, season) -> LocationEntry lookup so per-request
+    lookups are O(1).
+
+    counts is an (n, 5) array of [state, district, season, crop, count] category
+    codes, sorted by location and then most frequent crop first (ties by name),
+    as written by crop_dataset. The name lists map codes to the cleaned
+    (lowercased) category names. Returns (index, build_seconds).
+    """
+    start = time.perf_counter()
+    index = {}
+    # Rows of one location are contiguous; plain lists iterate much faster than array rows
+    for (state, district, season), group in groupby(np.asarray(counts).tolist(), key=lambda row: row[:3]):
+        group = list(group)
+        index[(states[state], districts[district], seasons[season])] = LocationEntry(
+            ranking=[crops[row[3]] for row in group],
+            counts=[row[4] for row in group],
+        )
+    return index, time.perf_counter() - start
+
+
+def index_size_bytes(index):
+    """Approximate deep size of the index (keys, entries and crop lists)."""
+    total = sys.getsizeof(index)
+    for key, entry in index.items():
+        total += sys.getsizeof(key) + sum(sys.getsizeof(k) for k in key)
+        total += sys.getsizeof(entry.ranking) + sys.getsizeof(entry.counts) + sys.getsizeof(entry.crops)
+    return total
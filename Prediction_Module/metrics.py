@@ -0,0 +1,202 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from starlette.responses import JSONResponse
+
+# Upper bounds (seconds) of the latency buckets, Prometheus style (+Inf is implicit)
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram.
+
+    observe() only bisects a tuple and bumps preallocated counters, so it is
+    cheap enough to call several times per request. Buckets are stored
+    non-cumulative and summed up at scrape time.
+    """
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect_left(self.bounds, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+
+    def since(self, start):
+        """Observes perf_counter() - start and returns the new perf_counter(), for chaining stages."""
+        now = time.perf_counter()
+        self.observe(now - start)
+        return now
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class EndpointMetrics:
+    """
+    Histograms of one endpoint: the whole request, JSON serialization of the
+    response, and one per named stage (endpoint.inference.since(t), ...).
+    Created once at import so handlers never build labels per call.
+    """
+
+    def __init__(self, name, stages):
+        self.name = name
+        self.stages = tuple(stages) + ("serialization",)
+        self.request = Histogram()
+        for stage in self.stages:
+            setattr(self, stage, Histogram())
+        self.responses = {}
+        self._lock = threading.Lock()
+
+    def count_response(self, status):
+        with self._lock:
+            self.responses[status] = self.responses.get(status, 0) + 1
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value):
+    if value is None:
+        return "NaN"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """
+    Per-endpoint latency histograms plus collectors for everything else
+    (caches, queues, models, process), rendered in the Prometheus text format.
+
+    A collector is a function returning [(name, type, help, [(labels, value)])]
+    that is only called at scrape time.
+    """
+
+    def __init__(self, prefix="ml"):
+        self.prefix = prefix
+        self.endpoints = {}
+        self._collectors = []
+
+    def endpoint(self, path, stages=()):
+        metrics = self.endpoints.get(path)
+        if metrics is None:
+            metrics = self.endpoints[path] = EndpointMetrics(path, stages)
+        return metrics
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def _histogram_lines(self, name, help_text, series):
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for labels, histogram in series:
+            counts, total = histogram.snapshot()
+            cumulative = 0
+            for bound, count in zip(histogram.bounds + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': _number(bound)})} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+    def render(self):
+        p = self.prefix
+        endpoints = list(self.endpoints.values())
+        lines = self._histogram_lines(
+            f"{p}_request_duration_seconds", "End-to-end request latency by endpoint.",
+            [({"endpoint": e.name}, e.request) for e in endpoints]
+        )
+        lines += self._histogram_lines(
+            f"{p}_stage_duration_seconds", "Latency of each processing stage by endpoint.",
+            [({"endpoint": e.name, "stage": s}, getattr(e, s)) for e in endpoints for s in e.stages]
+        )
+        lines += [f"# HELP {p}_responses_total Responses by endpoint and HTTP status.",
+                  f"# TYPE {p}_responses_total counter"]
+        for e in endpoints:
+            with e._lock:
+                responses = sorted(e.responses.items())
+            lines += [f"{p}_responses_total{_labels({'endpoint': e.name, 'status': s})} {n}" for s, n in responses]
+
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+# Endpoint of the request being served, set by MetricsMiddleware (same task as the route)
+current_endpoint = ContextVar("current_endpoint", default=None)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every request against its endpoint's histograms.
+    Paths without registered metrics share the "other" endpoint so label
+    cardinality stays bounded.
+    """
+
+    def __init__(self, app, registry):
+        self.app = app
+        self.registry = registry
+        self.other = registry.endpoint("other")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        endpoint = self.registry.endpoints.get(scope["path"], self.other)
+        token = current_endpoint.set(endpoint)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            endpoint.request.since(start)
+            endpoint.count_response(status)
+            current_endpoint.reset(token)
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that records rendering time as the endpoint's serialization stage."""
+
+    def render(self, content):
+        start = time.perf_counter()
+        body = super().render(content)
+        endpoint = current_endpoint.get()
+        if endpoint is not None:
+            endpoint.serialization.since(start)
+        return body
@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row predictions into one model call.
+
+    Handlers call submit(row) and wait on the returned Future. A background
+    thread takes every row already queued; a lone row is predicted at once
+    (low traffic never pays the batch window), while a row that found others
+    waiting signals concurrent traffic, so more are collected until either
+    max_batch_size rows are queued or max_wait_ms has passed. Rows that arrive
+    during a model call queue up and form the next batch. The rows are
+    stacked, predict_fn runs once and the output rows are scattered back to
+    the waiting futures. If the batched call raises, each row is retried on
+    its own, so one bad row fails only its own request.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5.0, name="batcher"):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+        # Counters (read by stats())
+        self.batches = 0
+        self.rows = 0
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-worker", daemon=True)
+                self._thread.start()
+
+    def submit(self, row):
+        """Queue one feature row; the Future resolves to its output row."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((row, future))
+        return future
+
+    def predict(self, row):
+        """Blocking helper for sync handlers."""
+        return self.submit(row).result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        # Whatever is already waiting
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if len(batch) == 1:
+            return batch
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # Window closed, but take whatever is already waiting
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Skip rows whose caller has already given up
+            live = [(r, f) for r, f in batch if f.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            try:
+                outputs = self.predict_fn(np.stack([r for r, _ in live]))
+            except Exception as e:
+                if len(live) == 1:
+                    live[0][1].set_exception(e)
+                else:
+                    self._predict_each(live)
+            else:
+                for (_, future), output in zip(live, outputs):
+                    future.set_result(output)
+            self.batches += 1
+            self.rows += len(live)
+
+    def _predict_each(self, live):
+        # The stacked call failed: find the row(s) responsible instead of failing the batch
+        for row, future in live:
+            try:
+                future.set_result(self.predict_fn(row[np.newaxis])[0])
+            except Exception as e:
+                future.set_exception(e)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch_size": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
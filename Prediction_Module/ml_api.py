@@ -1,28 +1,91 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile
+from fastapi import FastAPI, HTTPException, File, UploadFile, Header, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
 import pickle
 import numpy as np
-from pymongo import MongoClient
 from datetime import datetime
 import os
-import gc
 import psutil
-import tensorflow as tf
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
-from PIL import Image
 import io
 import json
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+import hmac
+import signal
+import zipfile
+from micro_batching import MicroBatcher
+from location_index import index_size_bytes, location_key
+from crop_dataset import load_crop_dataset
+from crop_mapping import CropCompatibility
+from forest_engine import FlatForest
+from model_bundle import bundle_exists, load_bundle
+from model_registry import ModelRegistry
+from audit_log import AuditLogger
+from prediction_cache import PredictionCache, parse_quantization
+from disease_runtime import TFLiteDiseaseModel, preprocess_input
+from metrics import MetricsRegistry, MetricsMiddleware, TimedJSONResponse
+from profiler import SamplingProfiler, tracemalloc_diff
+from bulk_stream import LineSplitter, RecordParser, detect_format
+
+_process = None
+
+def current_process():
+    # One psutil handle per pid (cpu_percent() measures since the previous call
+    # on the same handle); recreated if this module is inherited by a fork
+    global _process
+    if _process is None or _process.pid != os.getpid():
+        _process = psutil.Process(os.getpid())
+    return _process
 
 def print_memory(tag=""):
-    process = psutil.Process(os.getpid())
-    mem_info = process.memory_info()
+    mem_info = current_process().memory_info()
     print(f"[{tag}] Memory Usage: {mem_info.rss / 1024 / 1024:.2f} MB")
 
 # ---------------------------
 # FastAPI App
 # ---------------------------
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Model warm-up runs in the background so /health answers immediately
+    start_warmup()
+    registry.start_watcher(MODEL_WATCH_INTERVAL)
+    audit_log.start()
+    yield
+    audit_log.close()
+
+app = FastAPI(lifespan=lifespan, default_response_class=TimedJSONResponse)
+
+# ---------------------------
+# Metrics
+# ---------------------------
+# Per-endpoint request and stage latency histograms, exported at /metrics.
+# Handlers chain stage timings with Histogram.since(), which only bumps
+# preallocated counters, so instrumentation stays on in production.
+metrics = MetricsRegistry(prefix="ml")
+app.add_middleware(MetricsMiddleware, registry=metrics)
+
+TABULAR_STAGES = ("model_wait", "features", "inference", "ranking", "db_logging")
+DISEASE_STAGES = ("features", "model_wait", "inference", "ranking", "db_logging")
+
+crop_metrics = metrics.endpoint("/predict-crop", TABULAR_STAGES)
+batch_crop_metrics = metrics.endpoint("/batch/predict-crop", TABULAR_STAGES)
+yield_metrics = metrics.endpoint("/predict-yield", TABULAR_STAGES)
+batch_yield_metrics = metrics.endpoint("/batch/predict-yield", TABULAR_STAGES)
+fertilizer_metrics = metrics.endpoint("/predict-fertilizer", TABULAR_STAGES)
+batch_fertilizer_metrics = metrics.endpoint("/batch/predict-fertilizer", TABULAR_STAGES)
+disease_metrics = metrics.endpoint("/predict-disease", DISEASE_STAGES)
+batch_disease_metrics = metrics.endpoint("/batch/predict-disease", DISEASE_STAGES)
+stream_crop_metrics = metrics.endpoint("/stream/predict-crop", TABULAR_STAGES)
+stream_yield_metrics = metrics.endpoint("/stream/predict-yield", TABULAR_STAGES)
+stream_fertilizer_metrics = metrics.endpoint("/stream/predict-fertilizer", TABULAR_STAGES)
+for _path in ("/locations", "/seasons", "/recommend-season-commodity", "/health", "/ready", "/metrics"):
+    metrics.endpoint(_path)
 
 # ---------------------------
 # CORS
@@ -42,69 +105,223 @@ app.add_middleware(
 )
 
 # ---------------------------
-# Load Models (LAZY LOADING)
+# Load Models (MODEL REGISTRY)
 # ---------------------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Global variables to hold models (initialized as None)
-crop_model = None
-crop_le = None
-season_le = None
-yield_model = None
-fertilizer_model = None
-fertilizer_model = None
-fertilizer_le = None
-disease_model = None
-disease_classes = None
+# Inference engine for the RandomForest models:
+#   "flat"    - forest_engine.FlatForest over the models/<name>/ bundle (or the
+#               flattened pickle when no bundle exists); same outputs as sklearn
+#   "sklearn" - the pickled estimator as-is
+INFERENCE_ENGINE = os.environ.get("ML_INFERENCE_ENGINE", "flat")
+
+# Seconds between checks for changed model files on disk (0 disables the watcher)
+MODEL_WATCH_INTERVAL = float(os.environ.get("ML_MODEL_WATCH_INTERVAL", 30))
+
+# Artifact locations can be pointed elsewhere (e.g. the synthetic fixtures
+# written by bench_fixtures.py)
+MODELS_DIR = os.environ.get("ML_MODELS_DIR", os.path.join(BASE_DIR, "models"))
+
+def _model_path(relative_path):
+    return os.path.join(MODELS_DIR, relative_path)
+
+def _load_pickle(relative_path):
+    with open(_model_path(relative_path), "rb") as f:
+        return pickle.load(f)
+
+def _open_bundle(name):
+    # Memory-mapped bundle (models/<name>/manifest.json), see model_bundle.py
+    path = _model_path(name)
+    if not bundle_exists(path):
+        return None
+    bundle = load_bundle(path)
+    print(f"Opened {name} bundle v{bundle.version} ({bundle.manifest['n_estimators']} trees, mmap)")
+    return bundle
+
+def _forest_model(bundle, pickle_name):
+    if INFERENCE_ENGINE == "flat":
+        # Prefer the bundle written by the training scripts, else flatten the pickle
+        if bundle is not None:
+            return bundle.model
+        model = _load_pickle(pickle_name)
+        try:
+            return FlatForest.from_sklearn(model)
+        except Exception as e:
+            print(f"Flat engine unavailable for {pickle_name} ({e}), using sklearn")
+            return model
+    return _load_pickle(pickle_name)
+
+def _encoder(bundle, encoder_name, pickle_name):
+    if bundle is not None and encoder_name in bundle.encoders:
+        return bundle.encoders[encoder_name]
+    return _load_pickle(pickle_name)
+
+def _crop_compatibility(class_names):
+    compat = CropCompatibility(class_names)
+    location_data = get_location_data()
+    if location_data is not None:
+        compat.build_masks(location_data.index)
+    return compat
+
+def _load_crop():
+    bundle = _open_bundle("crop")
+    model = _forest_model(bundle, "crop_model.pkl")
+    crop_le = _encoder(bundle, "crop_label", "crop_label_encoder.pkl")
+    season_le = _encoder(bundle, "season", "season_label_encoder.pkl")
+    try:
+        class_names = crop_le.inverse_transform(model.classes_)
+    except Exception:
+        class_names = [str(c) for c in model.classes_]
+    return SimpleNamespace(
+        model=model,
+        crop_le=crop_le,
+        season_le=season_le,
+        # Display name of each probability column
+        class_names=np.asarray(class_names),
+        # Model class <-> historical crop masks for every indexed location
+        compat=_crop_compatibility(class_names),
+        version=bundle.version if bundle is not None else None,
+    )
+
+def _load_yield():
+    bundle = _open_bundle("yield")
+    return SimpleNamespace(
+        model=_forest_model(bundle, "yield_model.pkl"),
+        version=bundle.version if bundle is not None else None,
+    )
+
+def _load_fertilizer():
+    bundle = _open_bundle("fertilizer")
+    return SimpleNamespace(
+        model=_forest_model(bundle, "fertilizer_model.pkl"),
+        le=_encoder(bundle, "fertilizer_label", "fertilizer_label_encoder.pkl"),
+        version=bundle.version if bundle is not None else None,
+    )
+
+# ML_DISEASE_ENABLED=0 drops the disease model and endpoints entirely, for
+# deployments that only serve the tabular models
+DISEASE_ENABLED = os.environ.get("ML_DISEASE_ENABLED", "1") == "1"
+
+# Disease backend: "tflite" serves the quantized export (export_disease_model.py)
+# without importing TensorFlow, "keras" the full model; "auto" picks tflite if exported
+DISEASE_BACKEND = os.environ.get("ML_DISEASE_BACKEND", "auto")
+DISEASE_TFLITE_PATH = os.environ.get("ML_DISEASE_TFLITE_PATH", _model_path("disease_model_int8.tflite"))
+DISEASE_TFLITE_THREADS = int(os.environ.get("ML_DISEASE_TFLITE_THREADS", os.cpu_count() or 1))
+# Fixed batch sizes the TFLite interpreters are allocated for (inputs are padded up)
+DISEASE_TFLITE_BATCH_SIZES = [int(b) for b in os.environ.get("ML_DISEASE_TFLITE_BATCH_SIZES", "1,2,4,8,16,32").split(",")]
+
+def _disease_backend():
+    if DISEASE_BACKEND == "auto":
+        return "tflite" if os.path.exists(DISEASE_TFLITE_PATH) else "keras"
+    return DISEASE_BACKEND
+
+def _load_disease():
+    with open(_model_path("disease_classes.json"), "r") as f:
+        classes = json.load(f)
+    backend = _disease_backend()
+    if backend == "tflite":
+        model = TFLiteDiseaseModel(DISEASE_TFLITE_PATH, num_threads=DISEASE_TFLITE_THREADS,
+                                   batch_sizes=DISEASE_TFLITE_BATCH_SIZES)
+    else:
+        # Full TensorFlow is only imported when the Keras model is served
+        import tensorflow as tf
+        model = tf.keras.models.load_model(_model_path("disease_model.keras"))
+    print(f"Disease model backend: {backend}")
+    return SimpleNamespace(
+        model=model,
+        classes=classes,
+        backend=backend,
+        version=None,
+    )
+
+# Dummy inferences run before a loaded version is published (JIT/graph tracing)
+def _warm_forest(artifacts):
+    X = np.zeros((1, artifacts.model.n_features_in_))
+    if hasattr(artifacts.model, "classes_"):
+        artifacts.model.predict_proba(X)
+    else:
+        artifacts.model.predict(X)
 
-def get_disease_model():
-    global disease_model
-    if disease_model is None:
-        disease_model = tf.keras.models.load_model(os.path.join(BASE_DIR, "models/disease_model.keras"))
-    return disease_model
-
-def get_disease_classes():
-    global disease_classes
-    if disease_classes is None:
-        with open(os.path.join(BASE_DIR, "models/disease_classes.json"), "r") as f:
-            disease_classes = json.load(f)
-    return disease_classes
+def _disease_forward(model, X):
+    # Calling the Keras model directly skips model.predict's per-call setup
+    # (data adapter, callbacks, progress bar), which dominates for small batches
+    return np.asarray(model(X, training=False))
 
-def get_crop_model():
-    global crop_model
-    if crop_model is None:
-        crop_model = pickle.load(open(os.path.join(BASE_DIR, "models/crop_model.pkl"), "rb"))
-    return crop_model
+def _warm_disease(artifacts):
+    _disease_forward(artifacts.model, np.zeros((1, 224, 224, 3), dtype=np.float32))
 
-def get_crop_le():
-    global crop_le
-    if crop_le is None:
-        crop_le = pickle.load(open(os.path.join(BASE_DIR, "models/crop_label_encoder.pkl"), "rb"))
-    return crop_le
+registry = ModelRegistry()
+registry.register(
+    "crop", _load_crop, warm=_warm_forest,
+    sources=[_model_path("crop/manifest.json"), _model_path("crop_model.pkl"),
+             _model_path("crop_label_encoder.pkl"), _model_path("season_label_encoder.pkl")]
+)
+registry.register(
+    "yield", _load_yield, warm=_warm_forest,
+    sources=[_model_path("yield/manifest.json"), _model_path("yield_model.pkl")]
+)
+registry.register(
+    "fertilizer", _load_fertilizer, warm=_warm_forest,
+    sources=[_model_path("fertilizer/manifest.json"), _model_path("fertilizer_model.pkl"),
+             _model_path("fertilizer_label_encoder.pkl")]
+)
+if DISEASE_ENABLED:
+    registry.register(
+        "disease", _load_disease, warm=_warm_disease,
+        sources=[_model_path("disease_model.keras"), DISEASE_TFLITE_PATH, _model_path("disease_classes.json")]
+    )
+
+# Handlers take one artifact group per request, so a concurrent reload can
+# never mix a new model with an old encoder.
+def get_crop():
+    return registry.get("crop")
+
+def get_fertilizer():
+    return registry.get("fertilizer")
+
+def get_disease():
+    return registry.get("disease")
+
+def get_crop_model():
+    return registry.get("crop").model
 
 def get_season_le():
-    global season_le
-    if season_le is None:
-        season_le = pickle.load(open(os.path.join(BASE_DIR, "models/season_label_encoder.pkl"), "rb"))
-    return season_le
-    
+    return registry.get("crop").season_le
+
 def get_yield_model():
-    global yield_model
-    if yield_model is None:
-        yield_model = pickle.load(open(os.path.join(BASE_DIR, "models/yield_model.pkl"), "rb"))
-    return yield_model
+    return registry.get("yield").model
 
 def get_fertilizer_model():
-    global fertilizer_model
-    if fertilizer_model is None:
-        fertilizer_model = pickle.load(open(os.path.join(BASE_DIR, "models/fertilizer_model.pkl"), "rb"))
-    return fertilizer_model
+    return registry.get("fertilizer").model
+
+def get_disease_model():
+    return registry.get("disease").model
 
-def get_fertilizer_le():
-    global fertilizer_le
-    if fertilizer_le is None:
-        fertilizer_le = pickle.load(open(os.path.join(BASE_DIR, "models/fertilizer_label_encoder.pkl"), "rb"))
-    return fertilizer_le
+# ---------------------------
+# Micro-Batching (concurrent single predictions)
+# ---------------------------
+# Concurrent /predict-crop and /predict-disease calls are coalesced into one
+# model call per batch window. Set ML_MICRO_BATCHING=0 to call models directly.
+MICRO_BATCHING = os.environ.get("ML_MICRO_BATCHING", "1") == "1"
+MICRO_BATCH_MAX_SIZE = int(os.environ.get("ML_MICRO_BATCH_MAX_SIZE", 64))
+MICRO_BATCH_WAIT_MS = float(os.environ.get("ML_MICRO_BATCH_WAIT_MS", 5))
+
+crop_batcher = None
+disease_batcher = None
+if MICRO_BATCHING:
+    crop_batcher = MicroBatcher(
+        lambda X: get_crop_model().predict_proba(X),
+        max_batch_size=MICRO_BATCH_MAX_SIZE, max_wait_ms=MICRO_BATCH_WAIT_MS, name="crop"
+    )
+if MICRO_BATCHING and DISEASE_ENABLED:
+    # The batched call runs on disease_inference_pool (Disease Detection below),
+    # so it queues behind /batch/predict-disease instead of competing for cores
+    disease_batcher = MicroBatcher(
+        lambda X: disease_inference_pool.submit(
+            _disease_forward, get_disease_model(), X.astype(np.float32, copy=False)
+        ).result(),
+        max_batch_size=MICRO_BATCH_MAX_SIZE, max_wait_ms=MICRO_BATCH_WAIT_MS, name="disease"
+    )
 
 # ---------------------------
 # MongoDB
@@ -112,8 +329,20 @@ def get_fertilizer_le():
 # Use MONGO_URL environment variable if available (Render), else localhost
 MONGO_URI = os.getenv("MONGO_URL", "mongodb://127.0.0.1:27017/AgriVista")
 
-try:
-    client = MongoClient(MONGO_URI)
+# Fail fast instead of stalling the audit writer when Mongo is unreachable
+MONGO_MAX_POOL_SIZE = int(os.environ.get("ML_MONGO_MAX_POOL_SIZE", 10))
+MONGO_TIMEOUT_MS = int(os.environ.get("ML_MONGO_TIMEOUT_MS", 2000))
+
+def _connect_mongo():
+    # Called on the audit writer thread, so pymongo is never imported at startup
+    from pymongo import MongoClient
+    client = MongoClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_TIMEOUT_MS * 2,
+    )
     db = client["AgriVista"] # The database name is usually part of the URI in production, but let's be safe
     # If the URI includes the DB name, client.get_database() effectively returns it, 
     # but explicit access by name "AgriVista" works if the user's Atlas string is correct.
@@ -121,11 +350,23 @@ try:
     # Let's trust the "AgriVista" name for now as per local setup.
     collection = db["details"]
     print(f"Connected to MongoDB at {MONGO_URI.split('@')[-1] if '@' in MONGO_URI else 'localhost'}")
-except Exception as e:
-    print(f"Error connecting to MongoDB: {e}")
-    # Don't crash immediately, allow app to start but API calls might fail
-    client = None
-    collection = None
+    return collection
+
+# ---------------------------
+# Prediction Audit Log
+# ---------------------------
+# Endpoints only enqueue records; a background thread writes them with insert_many.
+# Batches that cannot be written are spilled to a local JSON-lines file and replayed later.
+AUDIT_QUEUE_SIZE = int(os.environ.get("ML_AUDIT_QUEUE_SIZE", 10000))
+AUDIT_FLUSH_SIZE = int(os.environ.get("ML_AUDIT_FLUSH_SIZE", 200))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("ML_AUDIT_FLUSH_INTERVAL", 1.0))
+AUDIT_SPILL_PATH = os.environ.get("ML_AUDIT_SPILL_PATH", os.path.join(BASE_DIR, "audit_spill.jsonl"))
+
+audit_log = AuditLogger(
+    connect=_connect_mongo,
+    max_queue=AUDIT_QUEUE_SIZE, flush_size=AUDIT_FLUSH_SIZE,
+    flush_interval=AUDIT_FLUSH_INTERVAL, spill_path=AUDIT_SPILL_PATH
+)
 
 # ======================================================
 # REQUEST SCHEMAS
@@ -162,6 +403,51 @@ class FertilizerRequest(BaseModel):
     crop_type: str
 
 
+# ---------------------------
+# Batch Limits
+# ---------------------------
+# Upper bound on rows accepted by the /batch/* endpoints in a single call
+MAX_BATCH_SIZE = int(os.environ.get("ML_MAX_BATCH_SIZE", 5000))
+
+def _check_batch_size(items):
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {len(items)} rows (max {MAX_BATCH_SIZE})")
+
+
+# ---------------------------
+# Prediction Cache
+# ---------------------------
+# Identical or near-identical single predictions (e.g. regional default
+# rainfall filled in by the weather controller) are answered from an LRU/TTL
+# cache. Numeric inputs are quantized per ML_PREDICTION_CACHE_QUANTIZATION
+# before keying, so requests in the same bucket share the first response
+# computed for it. Entries are dropped when the serving model or dataset
+# version changes. ML_PREDICTION_CACHE_SIZE=0 disables the cache.
+PREDICTION_CACHE_SIZE = int(os.environ.get("ML_PREDICTION_CACHE_SIZE", 10000))
+PREDICTION_CACHE_TTL = float(os.environ.get("ML_PREDICTION_CACHE_TTL", 600))
+PREDICTION_CACHE_QUANTIZATION = os.environ.get(
+    "ML_PREDICTION_CACHE_QUANTIZATION",
+    "Nitrogen=1,Phosphorus=1,Potassium=1,pH=0.1,Temperature=0.5,Humidity=1,Rainfall=1"
+)
+# "random" keeps the original randomized crop confidence boosting (crop
+# responses are then never cached); "deterministic" is the default while caching
+BOOSTING_MODE = os.environ.get("ML_BOOSTING_MODE", "deterministic" if PREDICTION_CACHE_SIZE > 0 else "random")
+CACHE_CROP_RESPONSES = BOOSTING_MODE != "random"
+
+prediction_cache = PredictionCache(
+    max_entries=PREDICTION_CACHE_SIZE,
+    ttl=PREDICTION_CACHE_TTL,
+    quantization=parse_quantization(PREDICTION_CACHE_QUANTIZATION),
+)
+
+def _cache_version(*names):
+    # None (skip the cache) until every model the response depends on is loaded
+    versions = tuple(registry.version(name) for name in names)
+    return None if None in versions else versions
+
+
 # ---------------------------
 # Crop Recommendation (ENHANCED)
 # ---------------------------
@@ -169,6 +455,8 @@ class FertilizerRequest(BaseModel):
 def predict_crop(data: CropRequest):
     try:
         return _predict_crop_internal(data)
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         error_msg = f"Error in predict_crop: {str(e)}\n{traceback.format_exc()}"
@@ -177,24 +465,33 @@ def predict_crop(data: CropRequest):
             f.write(error_msg)
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
-def _predict_crop_internal(data: CropRequest):
-    # Lazy Load
-    current_season_le = get_season_le()
-    current_crop_model = get_crop_model()
-    current_crop_le = get_crop_le()
-
-    # Encode Season
+def _encode_season(season_le, season):
     try:
-        if data.Season:
-            season_encoded = current_season_le.transform([data.Season.strip()])[0]
+        if season:
+            return season_le.transform([season.strip()])[0]
         else:
              print("Warning: Season missing in request")
-             season_encoded = 0 
+             return 0
     except Exception as e:
-        print(f"Error encoding season '{data.Season}': {e}")
-        raise HTTPException(status_code=400, detail=f"Invalid Season: {data.Season}. Supported seasons: {list(current_season_le.classes_)}")
-
-    features = np.array([[
+        print(f"Error encoding season '{season}': {e}")
+        raise HTTPException(status_code=400, detail=f"Invalid Season: {season}. Supported seasons: {season_le.classes_.tolist()}")
+
+def _encode_seasons(season_le, seasons):
+    # Vectorized version of _encode_season; missing seasons encode to 0
+    encoded = np.zeros(len(seasons))
+    present = [i for i, s in enumerate(seasons) if s]
+    if not present:
+        return encoded
+    try:
+        encoded[present] = season_le.transform([seasons[i].strip() for i in present])
+    except Exception:
+        known = set(season_le.classes_)
+        bad = next(i for i in present if seasons[i].strip() not in known)
+        raise HTTPException(status_code=400, detail=f"Invalid Season at index {bad}: {seasons[bad]}. Supported seasons: {season_le.classes_.tolist()}")
+    return encoded
+
+def _crop_feature_row(data: CropRequest, season_encoded):
+    return [
         data.Nitrogen,
         data.Phosphorus,
         data.Potassium,
@@ -203,224 +500,276 @@ def _predict_crop_internal(data: CropRequest):
         data.pH,
         data.Rainfall,
         season_encoded
-    ]])
+    ]
+
+def _check_finite(features):
+    # JSON accepts NaN/Infinity; reject them before they reach a (shared) model call
+    if not np.isfinite(features).all():
+        raise HTTPException(status_code=422, detail="Feature values must be finite numbers")
 
+def _crop_probabilities(crop, features, batcher=None):
+    """
+    (n_rows, n_classes) probabilities, columns in crop.class_names order, and
+    whether they are real probabilities (False: one-hot predict fallback).
+    """
     # Get probabilities from Random Forest Model
     try:
-        proba = current_crop_model.predict_proba(features)[0]
-        classes = current_crop_model.classes_
+        if batcher is not None and len(features) == 1:
+            # Single row: share a model call with concurrent requests
+            proba = batcher.predict(features[0])[np.newaxis, :]
+            if proba.shape[1] != len(crop.class_names):
+                # Batch ran on a model version swapped in after this request started
+                proba = crop.model.predict_proba(features)
+        else:
+            proba = crop.model.predict_proba(features)
+        return np.asarray(proba, dtype=float), True
     except Exception as e:
         # Fallback if probability not supported or error
         print(f"Prediction Error (predict_proba failed): {e}. Falling back to predict.")
-        prediction_encoded = current_crop_model.predict(features)[0]
-        # Create dummy probabilities and classes for a single prediction
-        classes = np.array([prediction_encoded])
-        proba = np.array([1.0]) # Assign 100% confidence to the single predicted class
+        predictions = np.asarray(crop.model.predict(features))
+        # Dummy probabilities: 100% confidence for the single predicted class
+        return (predictions[:, np.newaxis] == np.asarray(crop.model.classes_)[np.newaxis, :]).astype(float), False
 
-    # Decode labels to crop names
-    try:
-        class_names = current_crop_le.inverse_transform(classes)
-    except Exception as e:
-        print(f"Error decoding labels: {e}")
-        class_names = [str(c) for c in classes]
-
-    # Create a dictionary of crop -> probability
-    crop_probs = dict(zip(class_names, proba))
-
-    # --- STRICT FILTERING LOGIC (PRIMARY) ---
-    if df is not None and data.State and data.District and data.Season:
-        # Normalize inputs for matching (Case-Insensitive)
-        state_lower = data.State.strip().lower()
-        district_lower = data.District.strip().lower()
-        season_lower = data.Season.strip().lower()
-
-        # Find crops grown in this specific location & season in history
-        # Optimized: Columns are already lowercase and categorical
-        historical_crops = df[
-            (df['State_Name'] == state_lower) & 
-            (df['District_Name'] == district_lower) & 
-            (df['Season'] == season_lower)
-        ]['Crop'].unique()
-        
-        # Normalize historical crop names
-        historical_crops_lower = set([str(c).lower().strip() for c in historical_crops if c is not None])
-
-        # MAPPING DICTIONARY (Model Name -> Dataset Name)
-        CROP_NAME_MAPPING = {
-            'chickpea': ['gram', 'bengal gram'],
-            'kidneybeans': ['rajmash kholar', 'rajma', 'beans & mutter(vegetable)'],
-            'mothbeans': ['moth'],
-            'mungbean': ['moong(green gram)'],
-            'blackgram': ['urad'],
-            'lentil': ['masoor'],
-            'pigeonpeas': ['arhar/tur', 'redgram'],
-            'cotton': ['cotton(lint)', 'kapas'],
-            'jute': ['jute & mesta'],
-            'pomegranate': ['pome granet', 'pomegranate'],
-            'watermelon': ['water melon'],
-            'muskmelon': ['musk melon'],
-            'apple': ['apple'],
-            'orange': ['citrus fruit', 'orange'],
-            'papaya': ['papaya'],
-            'coconut': ['coconut'],
-            'grapes': ['grapes'],
-            'banana': ['banana'],
-            'maize': ['maize'],
-            'rice': ['rice', 'paddy'],
-            'coffee': ['coffee'],
-            'tea': ['tea']
-        }
+def _predict_crop_internal(data: CropRequest):
+    # Ranking depends on both the model and the location dataset. Versions are
+    # read before the artifacts, so a reload in between can only make this
+    # entry look older than it is, never serve an old result as current.
+    cache_key = prediction_cache.key("crop", data.dict())
+    cache_version = _cache_version("crop", "locations")
+
+    # Lazy Load (model, encoders and location masks of one version)
+    t = time.perf_counter()
+    crop = get_crop()
+    index = _location_index()
+    t = crop_metrics.model_wait.since(t)
+
+    response_data = prediction_cache.get(cache_key, cache_version) if CACHE_CROP_RESPONSES else None
+
+    if response_data is None:
+        # Encode Season
+        season_encoded = _encode_season(crop.season_le, data.Season)
+        features = np.array([_crop_feature_row(data, season_encoded)])
+        _check_finite(features)
+        t = crop_metrics.features.since(t)
+
+        proba, exact = _crop_probabilities(crop, features, batcher=crop_batcher)
+        t = crop_metrics.inference.since(t)
+        response_data = _rank_crops([data], crop.class_names, proba, _crop_compat(crop, index), index)[0]
+        if "error" in response_data:
+            return response_data
+        # Never cache a response built on the one-hot fallback
+        if CACHE_CROP_RESPONSES and exact:
+            prediction_cache.put(cache_key, cache_version, response_data)
+        t = crop_metrics.ranking.since(t)
+
+    audit_log.log({
+        "service": "Crop Recommendation",
+        "inputs": data.dict(),
+        "prediction": response_data,
+        "timestamp": datetime.now()
+    })
+    crop_metrics.db_logging.since(t)
 
-        # Create a set of "Strictly Valid" crops (Region + Season Support)
-        strict_valid_crops = set()
-        
-        crop_models_classes = current_crop_le.classes_
-        for model_crop in crop_models_classes: # Cache classes
-            model_crop_lower = str(model_crop).lower().strip()
-            # 1. Direct Match
-            if model_crop_lower in historical_crops_lower:
-                strict_valid_crops.add(model_crop)
-            # 2. Mapped Match
-            elif model_crop_lower in CROP_NAME_MAPPING:
-                potential_names = CROP_NAME_MAPPING[model_crop_lower]
-                if any(name in historical_crops_lower for name in potential_names):
-                    strict_valid_crops.add(model_crop)
-        
-        # --- HYBRID SUGGESTION LOGIC ---
-        # 1. Get Strict Matches (filtered by soil probability)
-        # We still want to respect the soil model's opinion on these strict matches.
-        strict_matches_probs = {}
-        for crop, prob in crop_probs.items():
-            if crop in strict_valid_crops:
-                strict_matches_probs[crop] = prob
-        
-        # Sort strict matches by probability
-        sorted_strict_matches = sorted(strict_matches_probs.items(), key=lambda x: x[1], reverse=True)
-        
-        # 2. Get Soil Matches (purely based on environmental suitability, ignoring region)
-        # Sort all crops by probability
-        sorted_soil_matches = sorted(crop_probs.items(), key=lambda x: x[1], reverse=True)
-        
-        # 3. Combine to get exactly 4
-        final_suggestions = []
-        final_crop_names = set()
-
-        # Add all strict matches first (up to 4)
-        for crop, prob in sorted_strict_matches:
-            if len(final_suggestions) < 4:
-                final_suggestions.append((crop, prob))
-                final_crop_names.add(crop)
-        
-        # If we have fewer than 4, fill with top soil matches
-        if len(final_suggestions) < 4:
-            for crop, prob in sorted_soil_matches:
-                if len(final_suggestions) >= 4:
-                    break
-                if crop not in final_crop_names:
-                    final_suggestions.append((crop, prob))
-                    final_crop_names.add(crop) # Add to set to prevent duplicates if logic changes
-        
-        # If still empty (extremely rare), return detailed error
-        if not final_suggestions:
-             return {"error": f"Soil conditions (NPK/Weather) are totally unsuitable for any crop grown in {data.District} ({', '.join(list(historical_crops)[:5])}...)."}
-        
-        # --- BOOSTING LOGIC (USER REQUEST: Main > 90%, Others > 80%) ---
-        import random
-        boosted_suggestions = []
-        
-        # We assume final_suggestions are already sorted by "real" probability or priority
-        for i, (crop, _) in enumerate(final_suggestions):
-            if i == 0:
-                # Main Crop: 92% - 98%
-                boosted_conf = random.uniform(0.92, 0.98)
-            elif i == 1:
-                # 2nd Option: 86% - 89%
-                boosted_conf = random.uniform(0.86, 0.89)
-            elif i == 2:
-                 # 3rd Option: 83% - 86%
-                boosted_conf = random.uniform(0.83, 0.86)
-            else:
-                 # 4th Option: 80% - 83%
-                boosted_conf = random.uniform(0.80, 0.83)
-            
-            boosted_suggestions.append((crop, boosted_conf))
-            
-        top_4_crops = boosted_suggestions
+    return response_data
 
+def _location_index():
+    location_data = get_location_data()
+    return location_data.index if location_data is not None else None
+
+# Suggestions per request, and the boosted confidence band (low, high) for each
+# rank of a location match (USER REQUEST: Main > 90%, Others > 80%)
+CROP_TOP_K = 4
+CROP_BOOST_BANDS = np.array([
+    [0.92, 0.98],  # Main Crop
+    [0.86, 0.89],  # 2nd Option
+    [0.83, 0.86],  # 3rd Option
+    [0.80, 0.83],  # 4th Option
+])
+
+def _boosted_confidence(bands, soil_proba):
+    low, high = bands[..., 0], bands[..., 1]
+    if BOOSTING_MODE == "random":
+        return np.random.uniform(low, high, size=np.shape(soil_proba))
+    # Deterministic: the soil model's own probability picks the spot in the band,
+    # so the same inputs always get the same (cacheable) response
+    return low + (high - low) * soil_proba
+
+def _top_k_columns(scores, k):
+    """Column indices of the k highest scores per row, best first; ties keep column order."""
+    n, c = scores.shape
+    rows = np.arange(n)[:, np.newaxis]
+    if k < c:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
     else:
-        # No strict filtering (missing location/season or dataset), use standard top 4
-        sorted_crops = sorted(crop_probs.items(), key=lambda x: x[1], reverse=True)
-        top_4_crops = sorted_crops[:4]
-    
-    # Structure the result
-    top_prediction = str(top_4_crops[0][0])
-    top_conf = float(top_4_crops[0][1]) * 100 
-
-    alternatives = []
-    for i in range(1, len(top_4_crops)):
-        alternatives.append({
-            "crop": str(top_4_crops[i][0]),
-            "probability": round(float(top_4_crops[i][1]) * 100, 2)
+        top = np.broadcast_to(np.arange(c), (n, c))
+    top_scores = scores[rows, top]
+    top = top[rows, np.lexsort((top, -top_scores), axis=1)]
+
+    if 0 < k < c:
+        # argpartition picks arbitrarily between columns tied at the k-th score;
+        # redo those (rare) rows with a stable sort to keep model column order
+        tied = (scores >= top_scores.min(axis=1)[:, np.newaxis]).sum(axis=1) > k
+        if tied.any():
+            top[tied] = np.argsort(-scores[tied], axis=1, kind='stable')[:, :k]
+    return top
+
+# The crop artifacts' location masks follow the dataset: after a "locations"
+# reload the first request to see the new index rebuilds them once for every
+# location, and later requests reuse them.
+crop_compat_lock = threading.Lock()
+
+def _crop_compat(crop, index):
+    compat = crop.compat
+    if index is None or compat.index is index:
+        return compat
+    with crop_compat_lock:
+        if crop.compat.index is not index:
+            crop.compat = CropCompatibility(crop.class_names).build_masks(index)
+        return crop.compat
+
+def _strict_masks(requests, class_names, compat, index):
+    """
+    (n_rows, n_classes) mask of crops grown at each request's location & season,
+    and which rows use location filtering at all (location/season given and
+    dataset loaded).
+    """
+    masks = np.zeros((len(requests), len(class_names)), dtype=bool)
+    filtered = np.zeros(len(requests), dtype=bool)
+    if index is None:
+        return masks, filtered
+
+    # Masks are resolved once per location by CropCompatibility (see _crop_compat)
+    for row, data in enumerate(requests):
+        if not (data.State and data.District and data.Season):
+            continue
+        filtered[row] = True
+        # Keys are normalized case-insensitively
+        mask = compat.masks.get(location_key(data.State, data.District, data.Season))
+        if mask is not None:
+            masks[row] = mask
+    return masks, filtered
+
+def _rank_crops(requests: list[CropRequest], class_names, proba, compat, index):
+    """Top crop suggestions for each request from its row of proba."""
+    class_names = np.asarray(class_names)
+    proba = np.asarray(proba, dtype=float).reshape(len(requests), len(class_names))
+    k = min(CROP_TOP_K, len(class_names))
+    strict_masks, filtered = _strict_masks(requests, class_names, compat, index)
+
+    # --- HYBRID SUGGESTION LOGIC ---
+    # With a location & season, crops grown there historically ("strict"
+    # matches) rank above all soil-only matches, each group sorted by soil
+    # probability (lifted by 2 since probabilities are at most 1). Without
+    # one (or the dataset), this is the standard top k.
+    scores = np.where(strict_masks, proba + 2.0, proba)
+    top = _top_k_columns(scores, k)
+    confidence = proba[np.arange(len(requests))[:, np.newaxis], top]
+
+    # --- BOOSTING LOGIC (location matches only) ---
+    if filtered.any():
+        confidence[filtered] = _boosted_confidence(CROP_BOOST_BANDS[:k], confidence[filtered])
+
+    names = class_names[top].tolist()
+    confidence = [[round(c * 100, 2) for c in row] for row in confidence.tolist()]
+
+    results = []
+    for data, row_names, row_conf, is_filtered in zip(requests, names, confidence, filtered.tolist()):
+        if k == 0:
+            # Extremely rare: no suggestion at all
+            if is_filtered:
+                location = index.get(location_key(data.State, data.District, data.Season))
+                historical_crops = location.ranking if location is not None else []
+                results.append({"error": f"Soil conditions (NPK/Weather) are totally unsuitable for any crop grown in {data.District} ({', '.join(list(historical_crops)[:5])}...)."})
+            else:
+                results.append({"error": "Crop model returned no classes."})
+            continue
+
+        # Structure the result (native Python types for JSON serialization)
+        results.append({
+            "recommended_crop": str(row_names[0]),
+            "confidence": row_conf[0],
+            "alternatives": [{"crop": str(crop), "probability": p} for crop, p in zip(row_names[1:], row_conf[1:])]
         })
-
-    # Convert numpy types to native Python types for JSON serialization
-    response_data = {
-        "recommended_crop": top_prediction,
-        "confidence": round(top_conf, 2),
-        "alternatives": alternatives
-    }
-
-    # Convert numpy types to native Python types for JSON serialization
-    response_data = {
-        "recommended_crop": top_prediction,
-        "confidence": round(top_conf, 2),
-        "alternatives": alternatives
-    }
-
+    return results
+
+
+def _score_crop_batch(data: list[CropRequest], stages, audit=True):
+    """Crop results for many requests; shared by /batch, /stream and score.py (stages: their metrics)."""
+    t = time.perf_counter()
+    crop = get_crop()
+    index = _location_index()
+    t = stages.model_wait.since(t)
+
+    seasons_encoded = _encode_seasons(crop.season_le, [d.Season for d in data])
+    features = np.array([_crop_feature_row(d, s) for d, s in zip(data, seasons_encoded)])
+    t = stages.features.since(t)
+
+    # Single vectorized model call and ranking pass for the whole batch
+    proba, _ = _crop_probabilities(crop, features)
+    t = stages.inference.since(t)
+    results = _rank_crops(data, crop.class_names, proba, _crop_compat(crop, index), index)
+    t = stages.ranking.since(t)
+
+    if audit:
+        now = datetime.now()
+        audit_log.log_many([{
+            "service": "Crop Recommendation",
+            "inputs": d.dict(),
+            "prediction": r,
+            "timestamp": now
+        } for d, r in zip(data, results) if "error" not in r])
+        stages.db_logging.since(t)
+    return results
+
+@app.post("/batch/predict-crop")
+def batch_predict_crop(data: list[CropRequest]):
+    _check_batch_size(data)
     try:
-        if collection is not None:
-            collection.insert_one({
-                "service": "Crop Recommendation",
-                "inputs": data.dict(),
-                "prediction": response_data,
-                "timestamp": datetime.now()
-            })
+        results = _score_crop_batch(data, batch_crop_metrics)
+        return {"count": len(results), "results": results}
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"DB Log Error: {e}")
-
-    return response_data
+        import traceback
+        print(f"Error in batch_predict_crop: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 
 # ---------------------------
 # Yield Prediction
 # ---------------------------
+def _yield_feature_row(data: YieldRequest):
+    return [
+        data.soil_moisture,
+        data.pH,
+        data.temperature,
+        data.rainfall,
+        data.humidity,
+        0.5, # Default NDVI index since user input is removed
+        data.total_days
+    ]
+
 @app.post("/predict-yield")
 def predict_yield(data: YieldRequest):
     try:
+        t = time.perf_counter()
         current_yield_model = get_yield_model()
-        features = np.array([[
-            data.soil_moisture,
-            data.pH,
-            data.temperature,
-            data.rainfall,
-            data.humidity,
-            0.5, # Default NDVI index since user input is removed
-            data.total_days
-        ]])
+        t = yield_metrics.model_wait.since(t)
+        features = np.array([_yield_feature_row(data)])
+        t = yield_metrics.features.since(t)
 
         prediction = current_yield_model.predict(features)
+        t = yield_metrics.inference.since(t)
         yield_value = round(float(prediction[0]), 2)
+        t = yield_metrics.ranking.since(t)
 
-        try:
-            if collection is not None:
-                collection.insert_one({
-                    "service": "Yield Prediction",
-                    "inputs": data.dict(),
-                    "prediction": yield_value,
-                    "timestamp": datetime.now()
-                })
-        except Exception as e:
-            print(f"DB Log Error: {e}")
+        audit_log.log({
+            "service": "Yield Prediction",
+            "inputs": data.dict(),
+            "prediction": yield_value,
+            "timestamp": datetime.now()
+        })
+        yield_metrics.db_logging.since(t)
 
         return {
             "estimated_yield": yield_value,
@@ -433,105 +782,376 @@ def predict_yield(data: YieldRequest):
         raise HTTPException(status_code=500, detail=f"Internal Server Error in yield prediction: {str(e)}")
 
 
+def _score_yield_batch(data: list[YieldRequest], stages, audit=True):
+    t = time.perf_counter()
+    current_yield_model = get_yield_model()
+    t = stages.model_wait.since(t)
+    features = np.array([_yield_feature_row(d) for d in data])
+    t = stages.features.since(t)
+
+    predictions = current_yield_model.predict(features)
+    t = stages.inference.since(t)
+    yield_values = [round(float(p), 2) for p in predictions]
+    t = stages.ranking.since(t)
+
+    if audit:
+        now = datetime.now()
+        audit_log.log_many([{
+            "service": "Yield Prediction",
+            "inputs": d.dict(),
+            "prediction": y,
+            "timestamp": now
+        } for d, y in zip(data, yield_values)])
+        stages.db_logging.since(t)
+    return [{"estimated_yield": y, "unit": "tons/hectare"} for y in yield_values]
+
+@app.post("/batch/predict-yield")
+def batch_predict_yield(data: list[YieldRequest]):
+    _check_batch_size(data)
+    try:
+        results = _score_yield_batch(data, batch_yield_metrics)
+        return {"count": len(results), "results": results}
+    except Exception as e:
+        import traceback
+        print(f"Error in batch_predict_yield: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error in yield prediction: {str(e)}")
+
+
 # ---------------------------
 # Fertilizer Recommendation
 # ---------------------------
-@app.post("/predict-fertilizer")
-def predict_fertilizer(data: FertilizerRequest):
+def _fertilizer_feature_row(data: FertilizerRequest):
     # Model trained only on N, P, K
-    features = np.array([[data.Nitrogen, data.Phosphorus, data.Potassium, 0, 0, 0]])
-    
-    # Lazy Load
-    fertilizer_model = get_fertilizer_model()
-    fertilizer_le = get_fertilizer_le()
+    return [data.Nitrogen, data.Phosphorus, data.Potassium, 0, 0, 0]
 
-    # Get probabilities
-    proba = fertilizer_model.predict_proba(features)[0]
-    
-    # Get top 4 indices
-    top_4_indices = proba.argsort()[-4:][::-1]
+def _rank_fertilizers(proba, fertilizer_model, fertilizer_le):
+    """Top-4 fertilizers for each row of a 2-D probability matrix."""
+    # Get top 4 indices per row
+    top_4_indices = np.argsort(proba, axis=1)[:, -4:][:, ::-1]
     
     # Get corresponding class names and probabilities
     try:
-        top_4_classes = fertilizer_le.inverse_transform(top_4_indices)
+        top_4_classes = fertilizer_le.inverse_transform(top_4_indices.ravel()).reshape(top_4_indices.shape)
     except:
         # Fallback if model was trained on strings directly and has classes_
         top_4_classes = fertilizer_model.classes_[top_4_indices]
 
-    top_4_probs = proba[top_4_indices]
-
-    top_4_probs = proba[top_4_indices]
+    top_4_probs = np.take_along_axis(proba, top_4_indices, axis=1)
 
     # --- BOOSTING LOGIC ---
     boosted_probs = np.power(top_4_probs, 0.25)
     boosted_probs = boosted_probs * 100
 
-    # Structure the result
-    top_prediction = top_4_classes[0]
-    alternatives = []
-    
-    for i in range(1, len(top_4_classes)): # Iterate available classes (up to 4)
-        alternatives.append({
-            "fertilizer": top_4_classes[i],
-            "probability": round(float(boosted_probs[i]), 2)
+    results = []
+    for classes, probs in zip(top_4_classes, boosted_probs):
+        # Structure the result
+        alternatives = []
+        for i in range(1, len(classes)): # Iterate available classes (up to 4)
+            alternatives.append({
+                "fertilizer": classes[i],
+                "probability": round(float(probs[i]), 2)
+            })
+
+        # Convert numpy types
+        results.append({
+            "recommended_fertilizer": classes[0],
+            "confidence": round(float(probs[0]), 2),
+            "alternatives": alternatives
         })
+    return results
 
-    # Convert numpy types
-    response_data = {
-        "recommended_fertilizer": top_prediction,
-        "confidence": round(float(boosted_probs[0]), 2),
-        "alternatives": alternatives
-    }
+@app.post("/predict-fertilizer")
+def predict_fertilizer(data: FertilizerRequest):
+    cache_key = prediction_cache.key("fertilizer", data.dict())
+    cache_version = _cache_version("fertilizer")
 
-    # Convert numpy types
-    response_data = {
-        "recommended_fertilizer": top_prediction,
-        "confidence": round(float(boosted_probs[0]), 2),
-        "alternatives": alternatives
-    }
+    # Lazy Load
+    t = time.perf_counter()
+    fertilizer = get_fertilizer()
+    fertilizer_model, fertilizer_le = fertilizer.model, fertilizer.le
+    t = fertilizer_metrics.model_wait.since(t)
+
+    response_data = prediction_cache.get(cache_key, cache_version)
+
+    if response_data is None:
+        features = np.array([_fertilizer_feature_row(data)])
+        t = fertilizer_metrics.features.since(t)
+
+        # Get probabilities
+        proba = fertilizer_model.predict_proba(features)
+        t = fertilizer_metrics.inference.since(t)
+        response_data = _rank_fertilizers(proba, fertilizer_model, fertilizer_le)[0]
+        prediction_cache.put(cache_key, cache_version, response_data)
+        t = fertilizer_metrics.ranking.since(t)
+
+    audit_log.log({
+        "service": "Fertilizer Suggestion",
+        "inputs": data.dict(),
+        "prediction": response_data,
+        "timestamp": datetime.now()
+    })
+    fertilizer_metrics.db_logging.since(t)
 
+    return response_data
+
+
+def _score_fertilizer_batch(data: list[FertilizerRequest], stages, audit=True):
+    t = time.perf_counter()
+    fertilizer = get_fertilizer()
+    fertilizer_model, fertilizer_le = fertilizer.model, fertilizer.le
+    t = stages.model_wait.since(t)
+    features = np.array([_fertilizer_feature_row(d) for d in data])
+    t = stages.features.since(t)
+
+    proba = fertilizer_model.predict_proba(features)
+    t = stages.inference.since(t)
+    results = _rank_fertilizers(proba, fertilizer_model, fertilizer_le)
+    t = stages.ranking.since(t)
+
+    if audit:
+        now = datetime.now()
+        audit_log.log_many([{
+            "service": "Fertilizer Suggestion",
+            "inputs": d.dict(),
+            "prediction": r,
+            "timestamp": now
+        } for d, r in zip(data, results)])
+        stages.db_logging.since(t)
+    return results
+
+@app.post("/batch/predict-fertilizer")
+def batch_predict_fertilizer(data: list[FertilizerRequest]):
+    _check_batch_size(data)
     try:
-        if collection is not None:
-            collection.insert_one({
-                "service": "Fertilizer Suggestion",
-                "inputs": data.dict(),
-                "prediction": response_data,
-                "timestamp": datetime.now()
-            })
+        results = _score_fertilizer_batch(data, batch_fertilizer_metrics)
+        return {"count": len(results), "results": results}
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"DB Log Error: {e}")
+        import traceback
+        print(f"Error in batch_predict_fertilizer: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error in fertilizer prediction: {str(e)}")
 
-    return response_data
 
+# ---------------------------
+# Streaming Bulk Scoring
+# ---------------------------
+# /stream/* take an NDJSON or CSV body of any size (e.g. soil-health-card
+# exports), parse it as it arrives, score every STREAM_CHUNK_SIZE rows with
+# the same code as /batch/* and stream one NDJSON result line per input row
+# back while the upload continues. One chunk is scored in the threadpool
+# while the next one is parsed; reading pauses when both are full, so memory
+# stays at about two chunks whatever the file size. Output lines keep the
+# input order: {"row": i, ...result} or {"row": i, "error": "..."}, then a
+# final {"summary": {...}} line with rows per second.
+STREAM_CHUNK_SIZE = int(os.environ.get("ML_STREAM_CHUNK_SIZE", 1000))
+# Longest accepted input line (one record)
+STREAM_MAX_LINE_BYTES = int(os.environ.get("ML_STREAM_MAX_LINE_BYTES", 64 * 1024))
+
+
+class NDJSONStreamResponse(StreamingResponse):
+    """
+    StreamingResponse that leaves receive() to the body generator.
+
+    Starlette's StreamingResponse listens for http.disconnect on receive()
+    while streaming, which would swallow the request body chunks the
+    generator is still reading; a disconnect surfaces in request.stream()
+    instead.
+    """
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+def _validation_message(e):
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+
+
+def _score_records(score, schema, rows, stages, **kwargs):
+    """Scores (row, record dict or error message) pairs; returns one {"row": i, ...} result per pair, in order."""
+    valid, out = [], {}
+    for row, record in rows:
+        if isinstance(record, str):
+            out[row] = {"row": row, "error": record}
+            continue
+        try:
+            valid.append((row, schema(**record)))
+        except ValidationError as e:
+            out[row] = {"row": row, "error": _validation_message(e)}
 
-    return response_data
+    if valid:
+        try:
+            results = score([d for _, d in valid], stages, **kwargs)
+            for (row, _), r in zip(valid, results):
+                out[row] = {"row": row, **r}
+        except Exception as e:
+            # One bad row must not fail the chunk: retry the rows one by one
+            print(f"Chunk of {len(valid)} rows failed ({e}), scoring rows individually")
+            for row, d in valid:
+                try:
+                    out[row] = {"row": row, **score([d], stages, **kwargs)[0]}
+                except Exception as row_error:
+                    out[row] = {"row": row, "error": str(row_error)}
+    return [out[row] for row, _ in rows]
+
+
+def _score_chunk(score, schema, rows, stages):
+    """One /stream chunk: (NDJSON text in row order, error count)."""
+    results = _score_records(score, schema, rows, stages)
+    text = "".join(json.dumps(r, default=str) + "\n" for r in results)
+    return text, sum(1 for r in results if "error" in r)
+
+
+async def _stream_records(request: Request, fmt):
+    """(row, record dict or error message) for every record in the request body, as it arrives."""
+    splitter = LineSplitter(STREAM_MAX_LINE_BYTES)
+    parser = RecordParser(fmt)
+    row = 0
+
+    def parse(lines):
+        nonlocal row
+        for line in lines:
+            try:
+                record = parser.parse(line)
+            except ValueError as e:
+                record = str(e)
+            if record is not None:
+                yield row, record
+                row += 1
+
+    async for chunk in request.stream():
+        for item in parse(splitter.feed(chunk)):
+            yield item
+    for item in parse(splitter.close()):
+        yield item
+
+
+def _stream_scoring(request: Request, fmt, score, schema, stages):
+    try:
+        fmt = detect_format(fmt, request.headers.get("content-type"))
+        RecordParser(fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def body():
+        start = time.perf_counter()
+        rows = errors = 0
+        pending = None
+        chunk = []
+
+        async def drain(task):
+            nonlocal errors
+            text, chunk_errors = await task
+            errors += chunk_errors
+            return text
+
+        try:
+            async for item in _stream_records(request, fmt):
+                chunk.append(item)
+                rows += 1
+                if len(chunk) >= STREAM_CHUNK_SIZE:
+                    if pending is not None:
+                        yield await drain(pending)
+                    pending = asyncio.ensure_future(run_in_threadpool(_score_chunk, score, schema, chunk, stages))
+                    chunk = []
+            if pending is not None:
+                yield await drain(pending)
+                pending = None
+            if chunk:
+                yield await drain(run_in_threadpool(_score_chunk, score, schema, chunk, stages))
+        except (ValueError, UnicodeDecodeError) as e:
+            # Unreadable body (bad encoding, oversized line): report and stop
+            if pending is not None:
+                yield await drain(pending)
+            yield json.dumps({"error": f"Stream aborted after {rows} rows: {e}"}) + "\n"
+
+        seconds = time.perf_counter() - start
+        summary = {"rows": rows, "errors": errors, "seconds": round(seconds, 3),
+                   "rows_per_second": round(rows / seconds, 1) if seconds > 0 else None}
+        print(f"Stream {request.url.path}: {summary}")
+        yield json.dumps({"summary": summary}) + "\n"
+
+    return NDJSONStreamResponse(body())
+
+@app.post("/stream/predict-crop")
+async def stream_predict_crop(request: Request, format: str | None = None):
+    return _stream_scoring(request, format, _score_crop_batch, CropRequest, stream_crop_metrics)
+
+@app.post("/stream/predict-yield")
+async def stream_predict_yield(request: Request, format: str | None = None):
+    return _stream_scoring(request, format, _score_yield_batch, YieldRequest, stream_yield_metrics)
+
+@app.post("/stream/predict-fertilizer")
+async def stream_predict_fertilizer(request: Request, format: str | None = None):
+    return _stream_scoring(request, format, _score_fertilizer_batch, FertilizerRequest, stream_fertilizer_metrics)
 
 
 # ---------------------------
 # Disease Detection Endpoint
 # ---------------------------
-@app.post("/predict-disease")
+# Decoding/preprocessing and inference run off the event loop, so image
+# uploads never stall /health, /locations and the other cheap endpoints.
+# At most DISEASE_MAX_INFLIGHT uploads are admitted at once; beyond that
+# the endpoint answers 429 instead of queueing without bound.
+DISEASE_PREPROCESS_WORKERS = int(os.environ.get("ML_DISEASE_PREPROCESS_WORKERS", min(4, os.cpu_count() or 1)))
+DISEASE_MAX_INFLIGHT = int(os.environ.get("ML_DISEASE_MAX_INFLIGHT", 32))
+
+disease_preprocess_pool = ThreadPoolExecutor(max_workers=DISEASE_PREPROCESS_WORKERS, thread_name_prefix="disease-preprocess")
+# Single inference thread: TF already parallelizes one call across cores.
+# Every disease model call runs here, micro-batched single uploads included.
+disease_inference_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="disease-inference")
+disease_inflight = 0
+
+def _preprocess_image(contents):
+    from PIL import Image
+    image = Image.open(io.BytesIO(contents))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    # Resize to match training input
+    image = image.resize((224, 224))
+    image_array = np.array(image, dtype=np.float32)
+
+    # Preprocess input for MobileNetV2
+    return preprocess_input(image_array)
+
+def _predict_disease_direct(image_array):
+    return _disease_forward(get_disease_model(), image_array[np.newaxis])[0]
+
+def _acquire_disease_slot():
+    global disease_inflight
+    # Only touched on the event loop thread, so no lock is needed
+    if disease_inflight >= DISEASE_MAX_INFLIGHT:
+        raise HTTPException(status_code=429, detail="Too many disease detection requests in progress, retry shortly",
+                            headers={"Retry-After": "1"})
+    disease_inflight += 1
+
+def _release_disease_slot():
+    global disease_inflight
+    disease_inflight -= 1
+
 async def predict_disease(file: UploadFile = File(...)):
+    _acquire_disease_slot()
     try:
+        t = time.perf_counter()
         contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
-        if image.mode != "RGB":
-            image = image.convert("RGB")
-        
-        # Resize to match training input
-        image = image.resize((224, 224))
-        image_array = np.array(image)
-        
-        # Preprocess input for MobileNetV2
-        image_array = preprocess_input(image_array)
-        image_array = np.expand_dims(image_array, axis=0) # add batch dimension
+        loop = asyncio.get_running_loop()
+        image_array = await loop.run_in_executor(disease_preprocess_pool, _preprocess_image, contents)
+        t = disease_metrics.features.since(t)
+
+        # Load model and classes (a lazy first load must not run on the event loop)
+        if not registry.is_loaded("disease"):
+            await loop.run_in_executor(disease_inference_pool, get_disease)
+        classes = get_disease().classes
+        t = disease_metrics.model_wait.since(t)
         
-        # Load model and classes
-        model = get_disease_model()
-        classes = get_disease_classes()
-        
-        # Predict
-        predictions = model.predict(image_array)[0]
+        # Predict (coalesced with concurrent uploads when micro-batching is on)
+        if disease_batcher is not None:
+            predictions = await asyncio.wrap_future(disease_batcher.submit(image_array))
+        else:
+            predictions = await loop.run_in_executor(disease_inference_pool, _predict_disease_direct, image_array)
+        t = disease_metrics.inference.since(t)
         top_index = np.argmax(predictions)
         top_class = classes[top_index]
         confidence = float(predictions[top_index])
@@ -540,17 +1160,15 @@ async def predict_disease(file: UploadFile = File(...)):
             "disease": top_class,
             "confidence": confidence
         }
+        t = disease_metrics.ranking.since(t)
         
-        try:
-            if collection is not None:
-                collection.insert_one({
-                    "service": "Disease Detection",
-                    "filename": file.filename,
-                    "prediction": response_data,
-                    "timestamp": datetime.now()
-                })
-        except Exception as e:
-            print(f"DB Log Error: {e}")
+        audit_log.log({
+            "service": "Disease Detection",
+            "filename": file.filename,
+            "prediction": response_data,
+            "timestamp": datetime.now()
+        })
+        disease_metrics.db_logging.since(t)
             
         return response_data
         
@@ -559,112 +1177,208 @@ async def predict_disease(file: UploadFile = File(...)):
         error_msg = f"Error in predict_disease: {str(e)}\n{traceback.format_exc()}"
         print(error_msg)
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+    finally:
+        _release_disease_slot()
+
+
+# ---------------------------
+# Batch Disease Detection
+# ---------------------------
+# Accepts several image files and/or zip archives of images. Archives are
+# decompressed and images decoded concurrently on the preprocess pool (never
+# on the event loop), stacked, and classified in chunks of
+# DISEASE_BATCH_CHUNK_SIZE per model call.
+DISEASE_BATCH_CHUNK_SIZE = int(os.environ.get("ML_DISEASE_BATCH_CHUNK_SIZE", 32))
+DISEASE_MAX_BATCH_IMAGES = int(os.environ.get("ML_DISEASE_MAX_BATCH_IMAGES", 200))
+DISEASE_MAX_IMAGE_BYTES = int(os.environ.get("ML_DISEASE_MAX_IMAGE_BYTES", 20 * 1024 * 1024))
+
+def _expand_upload(filename, contents):
+    """Returns [(name, bytes or error message)] for one upload; zip archives expand to their files."""
+    if not zipfile.is_zipfile(io.BytesIO(contents)):
+        if len(contents) > DISEASE_MAX_IMAGE_BYTES:
+            return [(filename, f"Image too large: {len(contents)} bytes (max {DISEASE_MAX_IMAGE_BYTES})")]
+        return [(filename, contents)]
+    items = []
+    with zipfile.ZipFile(io.BytesIO(contents)) as archive:
+        for info in archive.infolist():
+            base = os.path.basename(info.filename)
+            # Skip folders and macOS/hidden metadata entries
+            if info.is_dir() or not base or base.startswith(".") or info.filename.startswith("__MACOSX/"):
+                continue
+            if len(items) >= DISEASE_MAX_BATCH_IMAGES:
+                raise HTTPException(status_code=413, detail=f"Too many images in {filename} (max {DISEASE_MAX_BATCH_IMAGES})")
+            name = f"{filename}/{info.filename}"
+            if info.file_size > DISEASE_MAX_IMAGE_BYTES:
+                items.append((name, f"Image too large: {info.file_size} bytes (max {DISEASE_MAX_IMAGE_BYTES})"))
+            else:
+                items.append((name, archive.read(info)))
+    return items
+
+def _try_preprocess_image(contents):
+    if isinstance(contents, str):
+        return None, contents
+    try:
+        return _preprocess_image(contents), None
+    except Exception as e:
+        return None, f"Could not decode image: {e}"
+
+def _predict_disease_chunks(X):
+    # One model version for the whole request, even if a reload lands mid-batch
+    model = get_disease_model()
+    return np.concatenate([
+        _disease_forward(model, X[start:start + DISEASE_BATCH_CHUNK_SIZE])
+        for start in range(0, len(X), DISEASE_BATCH_CHUNK_SIZE)
+    ])
+
+def _top_k_diseases(predictions, classes, k):
+    # Highest probability first; stable so ties keep class order
+    top = np.argsort(-predictions, axis=1, kind="stable")[:, :k]
+    return [
+        [{"disease": classes[i], "confidence": float(p[i])} for i in row]
+        for p, row in zip(predictions, top)
+    ]
+
+async def batch_predict_disease(files: list[UploadFile] = File(...), top_k: int = 3):
+    if top_k < 1:
+        raise HTTPException(status_code=400, detail="top_k must be at least 1")
+    _acquire_disease_slot()
+    try:
+        t = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        expansions = []
+        for file in files:
+            contents = await file.read()
+            expansions.append(loop.run_in_executor(disease_preprocess_pool, _expand_upload, file.filename, contents))
+        items = [item for expanded in await asyncio.gather(*expansions) for item in expanded]
+        if not items:
+            raise HTTPException(status_code=400, detail="No images in upload")
+        if len(items) > DISEASE_MAX_BATCH_IMAGES:
+            raise HTTPException(status_code=413, detail=f"Batch too large: {len(items)} images (max {DISEASE_MAX_BATCH_IMAGES})")
+
+        decoded = await asyncio.gather(*[
+            loop.run_in_executor(disease_preprocess_pool, _try_preprocess_image, contents)
+            for _, contents in items
+        ])
+        t = batch_disease_metrics.features.since(t)
+
+        if not registry.is_loaded("disease"):
+            await loop.run_in_executor(disease_inference_pool, get_disease)
+        classes = get_disease().classes
+        t = batch_disease_metrics.model_wait.since(t)
+
+        ok = [i for i, (image_array, _) in enumerate(decoded) if image_array is not None]
+        top = []
+        if ok:
+            X = np.stack([decoded[i][0] for i in ok])
+            predictions = await loop.run_in_executor(disease_inference_pool, _predict_disease_chunks, X)
+            t = batch_disease_metrics.inference.since(t)
+            top = _top_k_diseases(predictions, classes, top_k)
+
+        results = [{"filename": name, "error": error} for (name, _), (_, error) in zip(items, decoded)]
+        for i, ranked in zip(ok, top):
+            results[i] = {
+                "filename": items[i][0],
+                "disease": ranked[0]["disease"],
+                "confidence": ranked[0]["confidence"],
+                "top_k": ranked
+            }
+        t = batch_disease_metrics.ranking.since(t)
+
+        now = datetime.now()
+        audit_log.log_many([{
+            "service": "Disease Detection",
+            "filename": r["filename"],
+            "prediction": {"disease": r["disease"], "confidence": r["confidence"]},
+            "timestamp": now
+        } for r in results if "error" not in r])
+        batch_disease_metrics.db_logging.since(t)
+
+        return {"count": len(results), "errors": len(results) - len(ok), "results": results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"Error in batch_predict_disease: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Error processing images: {str(e)}")
+    finally:
+        _release_disease_slot()
+
+if DISEASE_ENABLED:
+    app.post("/predict-disease")(predict_disease)
+    app.post("/batch/predict-disease")(batch_predict_disease)
 
 
 # ---------------------------
 # Season-wise Crop Recommendation
 # ---------------------------
 
-# Load dataset once at startup
-try:
-    import pandas as pd
-    DATASET_PATH = os.path.join(BASE_DIR, "datasets/Indian_crop_production_yield_dataset.csv")
-    
-    print_memory("Pre-Load")
-    
-    if os.path.exists(DATASET_PATH):
-        # OPTIMIZED LOAD: Dropped 'yield' and 'Production' as they are not used for recommendation
-        # This significantly reduces memory usage
-        use_cols = ['State_Name', 'District_Name', 'Season', 'Crop']
-        
-        # Specify dtypes to minimize string object creation overhead
-        dtype_spec = {
-            'State_Name': 'category',
-            'District_Name': 'category',
-            'Season': 'category',
-            'Crop': 'category'
-        }
-        
-        # Load with optimization
-        df = pd.read_csv(DATASET_PATH, usecols=use_cols, dtype=dtype_spec)
-        
-        # Clean categories (Strip/Lower) - Iterating categories is much faster than rows
-        for col in use_cols:
-            if hasattr(df[col], 'cat'):
-                # Get current categories
-                cats = df[col].cat.categories
-                # Create a mapping of old -> new (cleaned)
-                new_cats = [str(x).strip().lower() for x in cats]
-                # If duplicates exist (e.g. 'Rice' and 'rice' both become 'rice'), we can't just rename.
-                # We need to map the values to the new categories.
-                
-                # Check for duplicates in new_cats
-                if len(new_cats) != len(set(new_cats)):
-                    # Duplicates found! Need to collapse.
-                    # Create a dictionary map
-                    mapper = dict(zip(cats, new_cats))
-                    # Map the column (this temporarily converts to object/code, but it's safe)
-                    df[col] = df[col].map(mapper).astype('category')
-                else:
-                    # No duplicates, safe to rename
-                    df[col] = df[col].cat.rename_categories(new_cats)
-
-        # CACHE UNIQUE VALUES
-        # filter out nan/empty
-        CACHED_SEASONS = sorted([s.title() for s in df['Season'].cat.categories.tolist() if s and str(s) != 'nan'])
-        CACHED_STATES = sorted([s.title() for s in df['State_Name'].cat.categories.tolist() if s and str(s) != 'nan'])
-        
-        # PRE-COMPUTE LOCATION HIERARCHY (Optimized via GroupBy)
-        # GroupBy on Categorical columns is very fast
-        CACHED_LOCATIONS = {}
-        grouped = df.groupby('State_Name', observed=True)['District_Name'].unique()
-        
-        for state, districts in grouped.items():
-            if str(state) == 'nan': continue
-            display_state = state.title()
-            # districts is a Categorical array
-            display_districts = sorted([d.title() for d in districts.tolist() if d and str(d) != 'nan'])
-            CACHED_LOCATIONS[display_state] = display_districts
-
-        print(f"Dataset loaded successfully: {len(df)} records (Highly Optimized)")
+# The production dataset is read by the registry (warm-up or first use), not
+# at import, and reloaded when the CSV changes. It is served from the columnar
+# cache written by crop_dataset.py (rebuilt only when the CSV checksum changes),
+# so a normal start memory-maps a few .npy files instead of parsing the CSV.
+DATASET_PATH = os.environ.get("ML_DATASET_PATH", os.path.join(BASE_DIR, "datasets/Indian_crop_production_yield_dataset.csv"))
+# Where that cache lives (default: next to the CSV). Point it at a writable
+# dir when datasets/ is read-only; without a writable cache the CSV is parsed
+# in memory on every start.
+DATASET_CACHE_DIR = os.environ.get("ML_DATASET_CACHE_DIR") or None
+
+def _load_locations():
+    try:
+        print_memory("Pre-Load")
+
+        if not os.path.exists(DATASET_PATH):
+            print(f"Dataset not found at {DATASET_PATH}")
+            return None
+
+        start = time.perf_counter()
+        dataset = load_crop_dataset(DATASET_PATH, cache_dir=DATASET_CACHE_DIR)
+        source = "columnar cache" if dataset.path else "in memory"
+        print(f"Dataset loaded successfully: {dataset.n_rows} records in {(time.perf_counter() - start) * 1000:.1f} ms ({source} v{dataset.version})")
         print_memory("Post-Load")
-        
-        # Explicit garbage collection
-        gc.collect()
-        print_memory("Post-GC")
-        
-    else:
-        print(f"Dataset not found at {DATASET_PATH}")
-        df = None
-        CACHED_SEASONS = []
-        CACHED_LOCATIONS = {}
-        CACHED_STATES = []
-except Exception as e:
-    print(f"Error loading dataset: {e}")
-    df = None
-    CACHED_SEASONS = []
-    CACHED_LOCATIONS = {}
-    CACHED_STATES = []
+
+        # PRE-COMPUTE (state, district, season) -> crop ranking index
+        location_index, index_build_time = dataset.location_index()
+        print(f"Location index built: {len(location_index)} keys in {index_build_time * 1000:.1f} ms (~{index_size_bytes(location_index) / 1024 / 1024:.2f} MB)")
+        print_memory("Post-Index")
+
+        return SimpleNamespace(
+            seasons=dataset.seasons,
+            states=dataset.states,
+            locations=dataset.locations,
+            index=location_index,
+            version=dataset.version,
+        )
+    except Exception as e:
+        print(f"Error loading dataset: {e}")
+        return None
+
+registry.register("locations", _load_locations, sources=[DATASET_PATH])
+
+def get_location_data():
+    # None when the dataset is missing or failed to load
+    return registry.get("locations")
 
 
 @app.get("/locations")
 def get_locations():
-    if df is None:
+    data = get_location_data()
+    if data is None:
         return {"error": "Dataset not available", "states": [], "locations": {}}
     
     # Return cached data immediately
     return {
-        "states": CACHED_STATES,
-        "locations": CACHED_LOCATIONS
+        "states": data.states,
+        "locations": data.locations
     }
 
 @app.get("/seasons")
 def get_seasons():
-    if df is None:
+    data = get_location_data()
+    if data is None:
         return {"error": "Dataset not available", "seasons": []}
     
     # Return cached data immediately
-    return {"seasons": CACHED_SEASONS}
+    return {"seasons": data.seasons}
 
 
 class SeasonRecommendationRequest(BaseModel):
@@ -675,39 +1389,286 @@ class SeasonRecommendationRequest(BaseModel):
 
 @app.post("/recommend-season-commodity")
 def recommend_season_commodity(data: SeasonRecommendationRequest):
-    if df is None:
+    location_data = get_location_data()
+    if location_data is None:
         return {"error": "Dataset not available"}
     
-    # Filter dataset (Case-Insensitive - Optimized)
-    # Columns are already lowercase in the dataframe
-    filtered_df = df[
-        (df['State_Name'] == data.state.strip().lower()) & 
-        (df['District_Name'] == data.district.strip().lower()) & 
-        (df['Season'] == data.season.strip().lower())
-    ]
+    # Lookup precomputed crop ranking (Case-Insensitive)
+    location = location_data.index.get(location_key(data.state, data.district, data.season))
     
-    if filtered_df.empty:
+    if location is None:
         return {"recommendations": []}
 
-    # Count crops in this condition
-    crop_counts = filtered_df['Crop'].value_counts()
-    
-    # Get top 5 crops
-    top_crops = crop_counts.head(5).index.tolist()
+    # Get top 5 crops (ranking is already sorted by frequency)
+    top_crops = location.ranking[:5]
     
     # Capitalize for display
     formatted_crops = [crop.title() for crop in top_crops]
     
     return {"recommendations": formatted_crops}
 
+# ---------------------------
+# Model Warm-up & Readiness
+# ---------------------------
+# "eager": load every registered model in parallel at startup (the registry
+#          runs one dummy inference each, paying TensorFlow load/graph tracing
+#          before traffic arrives)
+# "lazy":  load on first request (lower memory on constrained hosts)
+MODEL_LOADING = os.environ.get("ML_MODEL_LOADING", "eager")
+WARMUP_WORKERS = int(os.environ.get("ML_WARMUP_WORKERS", 4))
+
+warmup_done = threading.Event()
+warmup_state = {"mode": MODEL_LOADING, "seconds": None, "models": {}, "errors": {}}
+
+def _timed_warmup(name):
+    start = time.perf_counter()
+    registry.get(name)
+    return time.perf_counter() - start
+
+def warm_up_models(names=None):
+    names = registry.names if names is None else names
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=WARMUP_WORKERS, thread_name_prefix="warmup") as pool:
+        futures = {name: pool.submit(_timed_warmup, name) for name in names}
+        for name, future in futures.items():
+            try:
+                warmup_state["models"][name] = round(future.result(), 3)
+            except Exception as e:
+                print(f"Warm-up failed for {name}: {e}")
+                warmup_state["errors"][name] = str(e)
+    warmup_state["seconds"] = round(time.perf_counter() - start, 3)
+    print(f"Warm-up finished in {warmup_state['seconds']}s: {warmup_state['models']}")
+    print_memory("Post-Warmup")
+    warmup_done.set()
+
+def start_warmup():
+    # Models preloaded by a prefork parent (see serve_prefork) are already
+    # loaded and shared; a worker only loads the rest
+    pending = [name for name in registry.names if not registry.is_loaded(name)]
+    if MODEL_LOADING == "eager" and pending:
+        warmup_done.clear()
+        threading.Thread(target=warm_up_models, args=(pending,), name="model-warmup", daemon=True).start()
+    else:
+        warmup_done.set()
+
 # ---------------------------
 # Health Check Endpoint
 # ---------------------------
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "ML API"}
+    return {"status": "healthy", "service": "ML API", "pid": os.getpid(), "audit_log": audit_log.stats(), "prediction_cache": prediction_cache.stats()}
+
+@app.get("/ready")
+def readiness_check():
+    # Unlike /health (process is up), /ready reports whether models are warm
+    if not warmup_done.is_set():
+        return JSONResponse(status_code=503, content={"status": "warming_up", **warmup_state})
+    status = "degraded" if warmup_state["errors"] else "ready"
+    return {"status": status, **warmup_state, "versions": registry.status()}
+
+# ---------------------------
+# Metrics Endpoint
+# ---------------------------
+# Everything except the latency histograms is read from the owning component
+# at scrape time, so none of it costs anything per request.
+def _model_metrics():
+    status = registry.status()
+    return [
+        ("ml_model_loaded", "gauge", "Whether the model has a loaded version.",
+         [({"model": name}, s["loaded"]) for name, s in status.items()]),
+        ("ml_model_load_seconds", "gauge", "Load + warm-up time of the serving model version.",
+         [({"model": name, "version": s["version"]}, s["load_seconds"]) for name, s in status.items() if s["loaded"]]),
+        ("ml_warmup_seconds", "gauge", "Duration of the startup warm-up (NaN until finished).",
+         [({"mode": MODEL_LOADING}, warmup_state["seconds"])]),
+    ]
+
+def _cache_metrics():
+    stats = prediction_cache.stats()
+    return [
+        ("ml_prediction_cache_events_total", "counter", "Prediction cache lookups and removals by outcome.",
+         [({"event": k}, stats[k]) for k in ("hits", "misses", "expired", "evicted", "invalidated")]),
+        ("ml_prediction_cache_hit_ratio", "gauge", "Prediction cache hits / lookups since start.",
+         [({}, stats["hit_rate"])]),
+        ("ml_prediction_cache_entries", "gauge", "Entries currently held by the prediction cache.",
+         [({}, stats["size"])]),
+    ]
+
+def _queue_metrics():
+    batchers = [b for b in (crop_batcher, disease_batcher) if b is not None]
+    batcher_stats = {b.name: b.stats() for b in batchers}
+    audit = audit_log.stats()
+    return [
+        ("ml_queue_depth", "gauge", "Items waiting in each internal queue.",
+         [({"queue": f"{name}_batcher"}, s["queued"]) for name, s in batcher_stats.items()]
+         + [({"queue": "audit_log"}, audit["queued"])]),
+        ("ml_disease_inflight", "gauge", "Disease uploads currently admitted.",
+         [({}, disease_inflight)]),
+        ("ml_micro_batches_total", "counter", "Model calls made by each micro-batcher.",
+         [({"batcher": name}, s["batches"]) for name, s in batcher_stats.items()]),
+        ("ml_micro_batch_rows_total", "counter", "Rows predicted by each micro-batcher.",
+         [({"batcher": name}, s["rows"]) for name, s in batcher_stats.items()]),
+        ("ml_audit_log_records_total", "counter", "Audit log records by outcome.",
+         [({"event": k}, v) for k, v in audit.items() if k != "queued"]),
+    ]
+
+def _process_metrics():
+    process = current_process()
+    with process.oneshot():
+        mem = process.memory_info()
+        cpu = process.cpu_times()
+        threads = process.num_threads()
+        cpu_percent = process.cpu_percent(interval=None)
+    return [
+        ("process_resident_memory_bytes", "gauge", "Resident set size.", [({}, mem.rss)]),
+        ("process_virtual_memory_bytes", "gauge", "Virtual memory size.", [({}, mem.vms)]),
+        ("process_cpu_seconds_total", "counter", "User + system CPU time.", [({}, cpu.user + cpu.system)]),
+        # Percent of one core since the previous scrape
+        ("process_cpu_percent", "gauge", "CPU utilisation since the previous scrape.", [({}, cpu_percent)]),
+        ("process_threads", "gauge", "OS threads in the process.", [({}, threads)]),
+        # Under prefork every worker reports its own series; the pid tells them apart
+        ("ml_worker_info", "gauge", "Process that served this scrape.", [({"pid": str(os.getpid())}, 1)]),
+    ]
+
+metrics.add_collector(_model_metrics)
+metrics.add_collector(_cache_metrics)
+metrics.add_collector(_queue_metrics)
+metrics.add_collector(_process_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    # Prometheus text exposition format
+    return metrics.render()
+
+# ---------------------------
+# Admin Endpoints
+# ---------------------------
+# Disabled unless ML_ADMIN_TOKEN is set; callers send it as X-Admin-Token
+ADMIN_TOKEN = os.environ.get("ML_ADMIN_TOKEN")
+
+# Set by serve_prefork(); None when serving from a single process
+PREFORK_PARENT_PID = None
+
+def require_admin(x_admin_token: str | None = Header(default=None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ML_ADMIN_TOKEN not set)")
+    if not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.post("/admin/reload-models", dependencies=[Depends(require_admin)])
+def reload_models(name: str | None = None):
+    # New versions load alongside the current ones; in-flight requests finish on the old version
+    names = [name] if name else registry.names
+    unknown = [n for n in names if n not in registry.names]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown model(s): {unknown}. Known: {registry.names}")
+
+    if PREFORK_PARENT_PID is not None and os.getpid() != PREFORK_PARENT_PID:
+        # Reloading here would only update this worker (and un-share its model
+        # pages); the parent reloads changed files and restarts every worker
+        os.kill(PREFORK_PARENT_PID, signal.SIGHUP)
+        return JSONResponse(status_code=202, content={
+            "reloaded": "rolling restart requested",
+            "parent_pid": PREFORK_PARENT_PID,
+            "versions": registry.status(),
+        })
+
+    results = {}
+    for n in names:
+        try:
+            old_version, new_version = registry.reload(n)
+            results[n] = {"old_version": old_version, "new_version": new_version}
+        except Exception as e:
+            print(f"Reload of '{n}' failed: {e}")
+            results[n] = {"error": str(e)}
+    return {"reloaded": results, "versions": registry.status()}
+
+# ---------------------------
+# Debug Profiling (admin)
+# ---------------------------
+# /debug/profile samples every thread for N seconds while the worker keeps
+# serving: mode=cpu returns collapsed stacks (flamegraph.pl, speedscope
+# import) or format=speedscope JSON; mode=memory returns the tracemalloc
+# allocation growth over the window (e.g. while replaying /predict-disease).
+# One profile runs at a time.
+PROFILE_MAX_SECONDS = float(os.environ.get("ML_PROFILE_MAX_SECONDS", 60))
+PROFILE_INTERVAL_MS = float(os.environ.get("ML_PROFILE_INTERVAL_MS", 5))
+
+profile_lock = threading.Lock()
+
+@app.get("/debug/profile", dependencies=[Depends(require_admin)])
+def debug_profile(seconds: float = 10, mode: str = "cpu", format: str = "collapsed", top: int = 25):
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}]")
+    if mode not in ("cpu", "memory") or format not in ("collapsed", "speedscope"):
+        raise HTTPException(status_code=400, detail="mode must be cpu|memory, format must be collapsed|speedscope")
+    if not profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        rss_before = current_process().memory_info().rss
+        print_memory("Profile-Start")
+        if mode == "memory":
+            result = tracemalloc_diff(seconds, top=max(1, top))
+        else:
+            profiler = SamplingProfiler(interval=PROFILE_INTERVAL_MS / 1000).run(seconds)
+        print_memory("Profile-End")
+        rss_after = current_process().memory_info().rss
+    finally:
+        profile_lock.release()
+
+    if mode == "memory":
+        return {"seconds": seconds, "rss_before_bytes": rss_before, "rss_after_bytes": rss_after, **result}
+    print(f"Profile: {profiler.sample_count} samples over {profiler.duration:.2f}s")
+    if format == "speedscope":
+        return profiler.speedscope(name=f"ml_api {datetime.now().isoformat(timespec='seconds')}")
+    return PlainTextResponse(profiler.collapsed())
+
+# ---------------------------
+# Multi-Worker Serving (prefork)
+# ---------------------------
+# ML_WORKERS > 1 serves through prefork.PreforkServer: the parent loads the
+# ML_PREFORK_PRELOAD models once, gc.freeze()s them and forks the workers,
+# which share those pages copy-on-write instead of each loading a copy (as
+# `uvicorn --workers N` would). The disease model is loaded per worker by
+# default: the TensorFlow and TFLite runtimes start thread pools on first use,
+# and threads do not survive fork. The parent (not the workers) watches the
+# model files; on a change, or on SIGHUP, it reloads them and restarts the
+# workers one at a time so they fork from the new versions;
+# /admin/reload-models in a worker forwards to the parent the same way.
+#
+# Each worker keeps its own metrics and registry state, so /metrics, /ready
+# and /health describe the worker that answered (ml_worker_info carries its
+# pid): scrape every worker or sum the series, and expect versions to differ
+# between workers while a rolling restart is in progress.
+SERVE_WORKERS = int(os.environ.get("ML_WORKERS", 1))
+PREFORK_PRELOAD = [n.strip() for n in os.environ.get("ML_PREFORK_PRELOAD", "crop,yield,fertilizer,locations").split(",") if n.strip()]
+WORKER_TIMEOUT = float(os.environ.get("ML_WORKER_TIMEOUT", 30))
+WORKER_GRACEFUL_TIMEOUT = float(os.environ.get("ML_WORKER_GRACEFUL_TIMEOUT", 30))
+WORKER_MAX_RSS_MB = float(os.environ.get("ML_WORKER_MAX_RSS_MB", 0))
+
+def preload_for_fork():
+    # Runs in the prefork parent before any worker exists
+    names = [name for name in PREFORK_PRELOAD if name in registry.names]
+    warm_up_models(names)
+
+def serve_prefork(host, port, workers):
+    global MODEL_WATCH_INTERVAL, PREFORK_PARENT_PID
+    from prefork import PreforkServer
+    # Inherited by the workers, which forward model reloads to this process
+    PREFORK_PARENT_PID = os.getpid()
+    watch_interval = MODEL_WATCH_INTERVAL
+    # Workers must not reload on their own: a per-worker copy un-shares the model pages
+    MODEL_WATCH_INTERVAL = 0
+    PreforkServer(
+        app, host=host, port=port, workers=workers,
+        # Only loaded (preloaded) models are checked for changed files
+        preload=preload_for_fork, check_updates=registry.check_for_updates, watch_interval=watch_interval,
+        timeout=WORKER_TIMEOUT, graceful_timeout=WORKER_GRACEFUL_TIMEOUT, max_rss_mb=WORKER_MAX_RSS_MB,
+    ).run()
 
 if __name__ == "__main__":
-    import uvicorn
     port = int(os.environ.get("PORT", 10000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    if SERVE_WORKERS > 1:
+        serve_prefork("0.0.0.0", port, SERVE_WORKERS)
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=port)
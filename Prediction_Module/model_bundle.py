@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import time
+import shutil
+import pickle
+import hashlib
+import tempfile
+from datetime import datetime
+import numpy as np
+
+from forest_engine import FlatForest, flatten_forest
+
+# Model bundle layout (one directory per model, e.g. models/crop/):
+#   manifest.json          format + version, feature order, array/encoder file map
+#   v-<id>/<array>.npy     flattened forest arrays, opened with mmap_mode='r'
+#   v-<id>/<encoder>.npy   label encoder classes stored as plain arrays
+# Workers that mmap the same .npy files share those pages via the OS page cache.
+# Every save writes a new v-<id>/ data directory and then replaces manifest.json,
+# the only file a reader opens by a fixed name. Data files are never renamed or
+# overwritten, so a live server may keep them mapped (Windows refuses to move or
+# delete mapped files). Directories no longer referenced are removed on a later
+# save once they can be; older bundles with the .npy files next to manifest.json
+# still load and are migrated the same way.
+BUNDLE_FORMAT = "agrivista-model-bundle"
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+DATA_DIR_PREFIX = "v-"
+
+FOREST_ARRAYS = ["feature", "threshold", "left", "right", "missing_left", "value", "roots", "classes"]
+
+
+class ArrayLabelEncoder:
+    """Read-only stand-in for a fitted sklearn LabelEncoder, backed by its classes_ array."""
+
+    def __init__(self, classes):
+        self.classes_ = classes
+
+    def transform(self, y):
+        y = np.asarray(y)
+        idx = np.searchsorted(self.classes_, y)
+        idx_clipped = np.minimum(idx, len(self.classes_) - 1)
+        unseen = self.classes_[idx_clipped] != y
+        if unseen.any():
+            raise ValueError(f"y contains previously unseen labels: {y[unseen].tolist()}")
+        return idx
+
+    def inverse_transform(self, y):
+        return self.classes_.take(np.asarray(y, dtype=np.intp))
+
+
+class ModelBundle:
+    def __init__(self, path, manifest, model, encoders):
+        self.path = path
+        self.manifest = manifest
+        self.model = model
+        self.encoders = encoders
+
+    @property
+    def name(self):
+        return self.manifest["name"]
+
+    @property
+    def version(self):
+        return self.manifest["model_version"]
+
+    @property
+    def feature_order(self):
+        return self.manifest["feature_order"]
+
+
+def _plain_array(values):
+    # Object arrays (e.g. string labels) would need pickle; store them as unicode
+    arr = np.asarray(values)
+    return arr.astype(str) if arr.dtype == object else arr
+
+
+def _replace_manifest(tmp_manifest, manifest_path, attempts=10):
+    # Windows fails the replace while a reader has manifest.json open; readers
+    # only hold it for a json.load, so retry briefly
+    for attempt in range(attempts):
+        try:
+            os.replace(tmp_manifest, manifest_path)
+            return
+        except PermissionError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.05)
+
+
+def _referenced_files(manifest):
+    files = list(manifest.get("arrays", {}).values()) + list(manifest.get("encoders", {}).values())
+    return {f.replace("\\", "/") for f in files}
+
+
+def _remove_unreferenced(path, keep):
+    """Deletes data directories and legacy .npy files that no manifest in keep refers to."""
+    referenced = set().union(*(_referenced_files(m) for m in keep))
+    referenced_dirs = {f.split("/", 1)[0] for f in referenced if "/" in f}
+    for entry in os.listdir(path):
+        full = os.path.join(path, entry)
+        if entry.startswith(DATA_DIR_PREFIX) and os.path.isdir(full):
+            if entry not in referenced_dirs:
+                # Files still mapped by a running server stay behind until a later save
+                shutil.rmtree(full, ignore_errors=True)
+        elif entry.endswith(".npy") and entry not in referenced:
+            try:
+                os.remove(full)
+            except OSError:
+                pass
+
+
+def save_bundle(path, name, model, feature_order, encoders=None, metadata=None):
+    """
+    Writes a fitted RandomForest and its label encoders as a model bundle.
+
+    encoders maps a name to a fitted LabelEncoder (or a classes array). The
+    arrays go to a fresh data directory and manifest.json is replaced last,
+    so readers never see a half-written bundle and files a running server
+    has memory-mapped are left in place.
+    """
+    arrays = flatten_forest(model)
+    os.makedirs(path, exist_ok=True)
+    data_dir = tempfile.mkdtemp(prefix=DATA_DIR_PREFIX, dir=path)
+    os.chmod(data_dir, 0o755)
+    data_name = os.path.basename(data_dir)
+
+    digest = hashlib.sha256()
+    array_files = {}
+    for key in FOREST_ARRAYS:
+        if key not in arrays:
+            continue
+        arr = np.ascontiguousarray(_plain_array(arrays[key]))
+        array_files[key] = f"{data_name}/{key}.npy"
+        np.save(os.path.join(data_dir, f"{key}.npy"), arr, allow_pickle=False)
+        digest.update(arr.tobytes())
+
+    encoder_files = {}
+    for enc_name, enc in (encoders or {}).items():
+        classes = _plain_array(getattr(enc, "classes_", enc))
+        encoder_files[enc_name] = f"{data_name}/encoder_{enc_name}.npy"
+        np.save(os.path.join(data_dir, f"encoder_{enc_name}.npy"), classes, allow_pickle=False)
+        digest.update(classes.tobytes())
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "name": name,
+        "model_version": digest.hexdigest()[:12],
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "estimator": type(model).__name__,
+        "n_estimators": len(model.estimators_),
+        "max_depth": int(arrays["max_depth"]),
+        "n_features": int(arrays["n_features"]),
+        "feature_order": list(feature_order),
+        "arrays": array_files,
+        "encoders": encoder_files,
+        "metadata": metadata or {},
+    }
+
+    try:
+        previous = read_manifest(path)
+    except (OSError, ValueError):
+        previous = None
+
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    tmp_manifest = f"{manifest_path}.tmp"
+    with open(tmp_manifest, "w") as f:
+        json.dump(manifest, f, indent=2)
+    _replace_manifest(tmp_manifest, manifest_path)
+
+    # The previous version stays on disk for a reader that opened its manifest just before the swap
+    _remove_unreferenced(path, [manifest] + ([previous] if previous else []))
+    return manifest
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_NAME), "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"{path} is not a model bundle")
+    if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle format version {manifest.get('format_version')} in {path}")
+    return manifest
+
+
+def load_bundle(path, mmap=True):
+    """Opens a bundle; tree arrays are memory-mapped read-only unless mmap=False."""
+    manifest = read_manifest(path)
+    mmap_mode = "r" if mmap else None
+
+    arrays = {
+        key: np.load(os.path.join(path, fname), mmap_mode=mmap_mode, allow_pickle=False)
+        for key, fname in manifest["arrays"].items()
+    }
+    arrays["max_depth"] = manifest["max_depth"]
+    arrays["n_features"] = manifest["n_features"]
+
+    encoders = {
+        enc_name: ArrayLabelEncoder(np.load(os.path.join(path, fname), allow_pickle=False))
+        for enc_name, fname in manifest["encoders"].items()
+    }
+    return ModelBundle(path, manifest, FlatForest(arrays), encoders)
+
+
+def bundle_exists(path):
+    return os.path.exists(os.path.join(path, MANIFEST_NAME))
+
+
+# Pickle artifacts -> bundles, for models trained before the bundle format
+PICKLE_BUNDLES = {
+    "crop": {
+        "model": "crop_model.pkl",
+        "encoders": {"crop_label": "crop_label_encoder.pkl", "season": "season_label_encoder.pkl"},
+        "feature_order": ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall', 'Season_Encoded'],
+    },
+    "yield": {
+        "model": "yield_model.pkl",
+        "encoders": {},
+        "feature_order": ['soil_moisture', 'ph', 'temperature', 'rainfall', 'humidity', 'NDVI_index', 'total_days'],
+    },
+    "fertilizer": {
+        "model": "fertilizer_model.pkl",
+        "encoders": {"fertilizer_label": "fertilizer_label_encoder.pkl"},
+        "feature_order": ['N', 'P', 'K', 'temperature', 'ph', 'rainfall'],
+    },
+}
+
+
+def _load_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+if __name__ == "__main__":
+    models_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+    for name, spec in PICKLE_BUNDLES.items():
+        model_path = os.path.join(models_dir, spec["model"])
+        if not os.path.exists(model_path):
+            print(f"Skipping {name}: {model_path} not found")
+            continue
+        model = _load_pickle(model_path)
+        encoders = {
+            enc_name: _load_pickle(os.path.join(models_dir, fname))
+            for enc_name, fname in spec["encoders"].items()
+            if os.path.exists(os.path.join(models_dir, fname))
+        }
+        feature_order = list(getattr(model, "feature_names_in_", spec["feature_order"]))
+        manifest = save_bundle(os.path.join(models_dir, name), name, model, feature_order, encoders,
+                               metadata={"source": spec["model"]})
+        print(f"Bundled {name} v{manifest['model_version']} ({manifest['n_estimators']} trees) -> {os.path.join(models_dir, name)}")
@@ -0,0 +1,134 @@
+import os
+import hashlib
+import threading
+import time
+from datetime import datetime
+
+
+class ModelEntry:
+    """One loaded version of a model; never mutated after it is published."""
+    __slots__ = ("value", "version", "loaded_at", "load_seconds", "signature")
+
+    def __init__(self, value, version, load_seconds, signature):
+        self.value = value
+        self.version = version
+        self.loaded_at = datetime.now().isoformat(timespec="seconds")
+        self.load_seconds = load_seconds
+        self.signature = signature
+
+
+class ModelRegistry:
+    """
+    Loads each registered model once and swaps in new versions atomically.
+
+    get() is lock-free once a model is loaded: it reads the current entry from
+    a dict, so requests that already hold a model keep using it while a reload
+    builds (and warms) the next version off to the side. Only the first load
+    of a model, and concurrent reloads of the same model, take its lock.
+    """
+
+    def __init__(self):
+        self._specs = {}
+        self._entries = {}
+        self._locks = {}
+        self._watcher = None
+
+    def register(self, name, loader, sources=(), warm=None):
+        """
+        loader() returns the model object (anything; grouped artifacts work well).
+        sources are file paths whose mtime/size changes trigger a reload.
+        warm(value) runs a dummy inference before the version is published.
+        """
+        self._specs[name] = (loader, list(sources), warm)
+        self._locks[name] = threading.Lock()
+
+    @property
+    def names(self):
+        return list(self._specs)
+
+    def _signature(self, sources):
+        sig = []
+        for path in sources:
+            try:
+                st = os.stat(path)
+                sig.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append((path, None, None))
+        return tuple(sig)
+
+    def _load(self, name):
+        loader, sources, warm = self._specs[name]
+        signature = self._signature(sources)
+        start = time.perf_counter()
+        value = loader()
+        if warm is not None:
+            warm(value)
+        load_seconds = time.perf_counter() - start
+        version = getattr(value, "version", None) or hashlib.sha256(repr(signature).encode()).hexdigest()[:12]
+        return ModelEntry(value, version, load_seconds, signature)
+
+    def get(self, name):
+        entry = self._entries.get(name)
+        if entry is None:
+            with self._locks[name]:
+                entry = self._entries.get(name)
+                if entry is None:
+                    entry = self._load(name)
+                    self._entries[name] = entry
+                    print(f"Loaded model '{name}' v{entry.version} in {entry.load_seconds:.2f}s")
+        return entry.value
+
+    def is_loaded(self, name):
+        return name in self._entries
+
+    def version(self, name):
+        entry = self._entries.get(name)
+        return entry.version if entry is not None else None
+
+    def reload(self, name):
+        """Loads a fresh version and publishes it; returns (old_version, new_version)."""
+        with self._locks[name]:
+            old = self._entries.get(name)
+            entry = self._load(name)
+            # Single dict assignment: readers see either the old or the new entry
+            self._entries[name] = entry
+        old_version = old.version if old is not None else None
+        print(f"Reloaded model '{name}': v{old_version} -> v{entry.version} in {entry.load_seconds:.2f}s")
+        return old_version, entry.version
+
+    def check_for_updates(self):
+        """Reloads loaded models whose source files changed on disk."""
+        reloaded = []
+        for name, entry in list(self._entries.items()):
+            _, sources, _ = self._specs[name]
+            if self._signature(sources) != entry.signature:
+                try:
+                    self.reload(name)
+                    reloaded.append(name)
+                except Exception as e:
+                    # Keep serving the current version if the new files are broken
+                    print(f"Reload of '{name}' failed, keeping v{entry.version}: {e}")
+        return reloaded
+
+    def start_watcher(self, interval):
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                self.check_for_updates()
+
+        self._watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def status(self):
+        return {
+            name: {
+                "loaded": name in self._entries,
+                "version": self._entries[name].version if name in self._entries else None,
+                "loaded_at": self._entries[name].loaded_at if name in self._entries else None,
+                "load_seconds": round(self._entries[name].load_seconds, 3) if name in self._entries else None,
+            }
+            for name in self._specs
+        }
@@ -0,0 +1,111 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+def parse_quantization(spec):
+    """'Nitrogen=1,pH=0.1' -> {'Nitrogen': 1.0, 'pH': 0.1}."""
+    steps = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        field, _, step = part.partition("=")
+        steps[field.strip()] = float(step)
+    return steps
+
+
+class PredictionCache:
+    """
+    Bounded LRU + TTL cache for endpoint responses.
+
+    Keys are built from a request's fields: numeric fields listed in
+    quantization are rounded to a multiple of their step (so 90.2 and 89.9
+    share a key with step 1); other numbers and strings are used as given.
+    Each namespace (endpoint) remembers the model version its entries were
+    computed with; the first lookup with a different version drops that
+    namespace's entries. Nothing is cached under version None (not loaded yet).
+    """
+
+    def __init__(self, max_entries=10000, ttl=600.0, quantization=None):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = float(ttl)
+        self.quantization = dict(quantization or {})
+
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidated": 0}
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _quantize(self, field, value):
+        step = self.quantization.get(field)
+        if step and isinstance(value, (int, float)) and math.isfinite(value):
+            # round() on the step count, so -0.0 and 0.0 (and float noise) collapse
+            return round(round(value / step) * step, 10)
+        return value
+
+    def key(self, namespace, fields):
+        """Hashable key for a dict of request fields."""
+        return (namespace,) + tuple((f, self._quantize(f, v)) for f, v in sorted(fields.items()))
+
+    def _check_version(self, namespace, version):
+        # Caller holds self._lock
+        if self._versions.get(namespace, version) != version:
+            stale = [k for k in self._entries if k[0] == namespace]
+            for k in stale:
+                del self._entries[k]
+            self.counters["invalidated"] += len(stale)
+        self._versions[namespace] = version
+
+    def get(self, key, version):
+        """Cached response for key under model version, or None."""
+        if not self.enabled or version is None:
+            return None
+        with self._lock:
+            self._check_version(key[0], version)
+            item = self._entries.get(key)
+            if item is None:
+                self.counters["misses"] += 1
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return value
+
+    def put(self, key, version, value):
+        if not self.enabled or version is None:
+            return
+        with self._lock:
+            self._check_version(key[0], version)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evicted"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else None,
+                **self.counters,
+            }
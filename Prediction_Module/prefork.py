@@ -0,0 +1,245 @@
+import os
+import gc
+import time
+import signal
+import socket
+import asyncio
+import multiprocessing
+
+import psutil
+
+# Pre-fork multi-worker serving.
+#
+# The parent process binds the listening socket and runs preload() (model
+# bundles, encoders, location index) once, then collects garbage and calls
+# gc.freeze() so every object allocated so far moves to the permanent
+# generation: later collections in the workers never touch those objects, so
+# their pages are not dirtied and stay shared copy-on-write. Workers are
+# forked from that state and each runs its own uvicorn server and event loop
+# on the shared socket (the kernel spreads accepted connections between them).
+#
+# Supervision (parent loop):
+#   - each worker's event loop stamps a shared heartbeat slot every
+#     heartbeat_interval seconds; a worker whose stamp is older than
+#     timeout (stuck loop) is killed and replaced
+#   - workers that exit or crash are replaced
+#   - workers above max_rss_mb (0 = no limit) are restarted gracefully
+#   - every watch_interval seconds the parent calls check_updates() (reload
+#     changed model files, returning what changed); if anything changed, or
+#     on SIGHUP, the workers are replaced by a rolling restart, one at a
+#     time, each drained with SIGTERM (uvicorn stops accepting and finishes
+#     in-flight requests) so they fork from the new models
+#   - SIGTERM/SIGINT: drain all workers, SIGKILL after graceful_timeout
+
+
+class PreforkServer:
+    def __init__(self, app, host="0.0.0.0", port=10000, workers=2, preload=None, check_updates=None,
+                 watch_interval=0.0, heartbeat_interval=1.0, timeout=30.0, graceful_timeout=30.0, max_rss_mb=0, log_level="info"):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = max(1, int(workers))
+        self.preload = preload
+        self.check_updates = check_updates
+        self.watch_interval = float(watch_interval)
+        self.heartbeat_interval = float(heartbeat_interval)
+        self.timeout = float(timeout)
+        self.graceful_timeout = float(graceful_timeout)
+        self.max_rss_mb = float(max_rss_mb)
+        self.log_level = log_level
+
+        self.sock = None
+        # Shared (anonymous mmap) heartbeat stamps, one per slot; CLOCK_MONOTONIC is system-wide
+        self.heartbeats = multiprocessing.RawArray("d", self.workers)
+        self.pids = {}          # slot -> pid
+        self.spawned_at = {}    # slot -> monotonic time of the fork
+        self.stopping_at = {}   # pid -> monotonic time SIGTERM was sent
+
+        self._stop = False
+        self._reload_requested = False
+        self._next_check = 0.0
+        self._rolling = []      # slots still to restart in the current rolling restart
+
+    # ---------------------------
+    # Parent
+    # ---------------------------
+    def _bind(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def _freeze(self):
+        gc.collect()
+        gc.freeze()
+        print(f"[prefork] gc.freeze(): {gc.get_freeze_count()} objects in the permanent generation")
+
+    def _spawn(self, slot):
+        # Stamped before the fork, so any later beat comes from the new worker
+        self.spawned_at[slot] = self.heartbeats[slot] = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = self._worker_main(slot)
+            finally:
+                os._exit(code)
+        self.pids[slot] = pid
+        print(f"[prefork] worker {slot} started (pid {pid})")
+
+    def _kill(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass  # already exited, reaped on the next pass
+
+    def _terminate(self, pid, reason):
+        if pid in self.stopping_at:
+            return
+        print(f"[prefork] stopping worker pid {pid}: {reason}")
+        self.stopping_at[pid] = time.monotonic()
+        self._kill(pid, signal.SIGTERM)
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.stopping_at.pop(pid, None)
+            for slot, worker_pid in list(self.pids.items()):
+                if worker_pid == pid:
+                    del self.pids[slot]
+                    if not self._stop:
+                        print(f"[prefork] worker {slot} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}")
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for slot, pid in list(self.pids.items()):
+            if pid in self.stopping_at:
+                # Drain deadline passed: force it
+                if now - self.stopping_at[pid] > self.graceful_timeout:
+                    print(f"[prefork] worker {slot} (pid {pid}) did not drain in {self.graceful_timeout:g}s, killing")
+                    self._kill(pid, signal.SIGKILL)
+                continue
+            if now - self.heartbeats[slot] > self.timeout:
+                print(f"[prefork] worker {slot} (pid {pid}) missed heartbeats for {now - self.heartbeats[slot]:.1f}s, killing")
+                self.stopping_at[pid] = now
+                self._kill(pid, signal.SIGKILL)
+            elif self.max_rss_mb > 0:
+                try:
+                    rss_mb = psutil.Process(pid).memory_info().rss / 1024 / 1024
+                except psutil.Error:
+                    continue
+                if rss_mb > self.max_rss_mb:
+                    self._terminate(pid, f"RSS {rss_mb:.0f} MB above {self.max_rss_mb:g} MB")
+
+    def _is_ready(self, slot):
+        # Beat since its fork: the new worker's event loop is running
+        return slot in self.pids and self.heartbeats[slot] > self.spawned_at[slot]
+
+    def _advance_rolling_restart(self):
+        if not self._rolling:
+            return
+        # One worker at a time: wait until the previous replacement is serving
+        if any(pid in self.stopping_at for pid in self.pids.values()):
+            return
+        if not all(self._is_ready(slot) for slot in self.pids):
+            return
+        slot = self._rolling.pop(0)
+        if slot in self.pids:
+            self._terminate(self.pids[slot], "rolling restart")
+
+    def _check_for_updates(self):
+        forced = self._reload_requested
+        due = self.watch_interval > 0 and time.monotonic() >= self._next_check
+        if not (forced or due) or self._rolling:
+            return
+        self._reload_requested = False
+        self._next_check = time.monotonic() + self.watch_interval
+        changed = None
+        if self.check_updates is not None:
+            try:
+                changed = self.check_updates()
+            except Exception as e:
+                print(f"[prefork] model update check failed: {e}")
+        if changed:
+            self._freeze()
+        if changed or forced:
+            self._rolling = sorted(self.pids)
+            print(f"[prefork] rolling restart of {len(self._rolling)} workers (changed: {changed or 'none'})")
+
+    def _handle_signal(self, signum, frame):
+        if signum == signal.SIGHUP:
+            self._reload_requested = True
+        else:
+            self._stop = True
+
+    def _shutdown(self):
+        for pid in list(self.pids.values()):
+            self._terminate(pid, "shutdown")
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.pids and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in self.pids.values():
+            self._kill(pid, signal.SIGKILL)
+        self._reap()
+        print("[prefork] all workers stopped")
+
+    def run(self):
+        self.sock = self._bind()
+        print(f"[prefork] listening on {self.host}:{self.port} with {self.workers} workers (parent pid {os.getpid()})")
+        if self.preload is not None:
+            self.preload()
+        self._freeze()
+        self._next_check = time.monotonic() + self.watch_interval
+
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, self._handle_signal)
+
+        for slot in range(self.workers):
+            self._spawn(slot)
+
+        while not self._stop:
+            time.sleep(0.2)
+            self._reap()
+            if self._stop:
+                break
+            self._check_for_updates()
+            for slot in range(self.workers):
+                if slot not in self.pids:
+                    self._spawn(slot)
+            self._check_workers()
+            self._advance_rolling_restart()
+        self._shutdown()
+
+    # ---------------------------
+    # Worker
+    # ---------------------------
+    async def _heartbeat(self, slot):
+        while True:
+            self.heartbeats[slot] = time.monotonic()
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def _serve(self, slot):
+        import uvicorn
+        config = uvicorn.Config(self.app, log_level=self.log_level, access_log=False)
+        server = uvicorn.Server(config)
+        heartbeat = asyncio.ensure_future(self._heartbeat(slot))
+        try:
+            await server.serve(sockets=[self.sock])
+        finally:
+            heartbeat.cancel()
+
+    def _worker_main(self, slot):
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+        # Objects created from here on are the worker's own and collected normally
+        asyncio.run(self._serve(slot))
+        return 0
@@ -0,0 +1,133 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler over every thread of the process.
+
+    A background thread wakes every interval seconds, reads the current stack
+    of each other thread from sys._current_frames() and counts identical
+    stacks. Nothing is installed in the profiled threads (no sys.setprofile),
+    so request handlers run at full speed; the cost is one stack walk per
+    thread per sample on the sampler thread.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = max(0.001, float(interval))
+        self.samples = Counter()
+        self.sample_count = 0
+        self.duration = 0.0
+
+    def _sample(self, names, own_id):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            stack.reverse()
+            self.samples[(names.get(thread_id, str(thread_id)),) + tuple(stack)] += 1
+
+    def run(self, seconds):
+        """Samples for the given number of seconds (blocking) and returns self."""
+        own_id = threading.get_ident()
+        start = time.perf_counter()
+        deadline = start + seconds
+        while True:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            self._sample(names, own_id)
+            self.sample_count += 1
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            time.sleep(min(self.interval, deadline - now))
+        self.duration = time.perf_counter() - start
+        return self
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed format: 'thread;outer;...;inner count' per line."""
+        lines = []
+        for (thread, *stack), count in self.samples.most_common():
+            lines.append(";".join([thread] + [_frame_label(code) for code in stack]) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name="profile"):
+        """speedscope file format: one 'sampled' profile per thread, sharing a frame table."""
+        frames, frame_index = [], {}
+        by_thread = {}
+        for (thread, *stack), count in self.samples.items():
+            indices = []
+            for code in stack:
+                i = frame_index.get(code)
+                if i is None:
+                    i = frame_index[code] = len(frames)
+                    frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+                indices.append(i)
+            samples, weights = by_thread.setdefault(thread, ([], []))
+            samples.append(indices)
+            weights.append(count * self.interval)
+
+        profiles = [{
+            "type": "sampled",
+            "name": thread,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        } for thread, (samples, weights) in sorted(by_thread.items())]
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "AgriVista ml_api",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+
+def tracemalloc_diff(seconds, top=25, key_type="lineno", frames=1):
+    """
+    Allocation growth over a window: snapshot, wait, snapshot, compare.
+
+    Starts tracemalloc if it is not already tracing (and stops it again
+    afterwards), so only allocations made during the window are attributed.
+    Returns the top entries by size growth.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(frames)
+    try:
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        traced, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    # The profiler's own snapshots are not the leak we are looking for
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), key_type)
+    return {
+        "traced_bytes": traced,
+        "peak_traced_bytes": peak,
+        "growth_bytes": sum(s.size_diff for s in stats),
+        "top": [{
+            "location": [f"{frame.filename}:{frame.lineno}" for frame in s.traceback],
+            "size_diff_bytes": s.size_diff,
+            "size_bytes": s.size,
+            "count_diff": s.count_diff,
+            "count": s.count,
+        } for s in stats[:top]],
+    }
@@ -0,0 +1,200 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import contextlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Offline bulk scoring of archived surveys, outside the HTTP service.
+# Reads CSV or Parquet input in chunks, scores each chunk in a process pool
+# (every worker imports ml_api and loads the models once) with the same
+# code as /batch/* and /stream/* -- including the location/season strict
+# filtering and boosting for crops -- and writes results in input order as
+# they complete, so memory stays at a few chunks per worker. Output lines
+# match the /stream/* endpoints: {"row": i, ...API result} or
+# {"row": i, "error": "..."}; CSV output JSON-encodes nested fields.
+# Models and dataset come from the ml_api env vars (ML_MODELS_DIR,
+# ML_DATASET_PATH, ML_INFERENCE_ENGINE, ...); nothing is written to MongoDB.
+# Usage: python -m Prediction_Module.score crop surveys.csv -o results.ndjson
+#                                          [--workers 4] [--chunk-size 5000] [--input-format parquet]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+# kind -> (scoring function, request schema, registry entries loaded per worker, CSV result columns)
+KINDS = {
+    "crop": ("_score_crop_batch", "CropRequest", ("crop", "locations"),
+             ["recommended_crop", "confidence", "alternatives"]),
+    "yield": ("_score_yield_batch", "YieldRequest", ("yield",),
+              ["estimated_yield", "unit"]),
+    "fertilizer": ("_score_fertilizer_batch", "FertilizerRequest", ("fertilizer",),
+                   ["recommended_fertilizer", "confidence", "alternatives"]),
+}
+
+
+# ---------------------------
+# Input
+# ---------------------------
+def read_chunks(path, fmt, chunk_size):
+    """Lists of record dicts, chunk_size rows at a time."""
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet input needs pyarrow: pip install pyarrow")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+        return
+
+    import pandas as pd
+    # Cells stay strings and are validated like the API's CSV uploads; empty cells -> None
+    for df in pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False, skipinitialspace=True):
+        yield [{k: (v if v.strip() else None) for k, v in record.items()} for record in df.to_dict("records")]
+
+
+# ---------------------------
+# Output
+# ---------------------------
+class NDJSONWriter:
+    def __init__(self, f, kind):
+        self.f = f
+
+    def write(self, results):
+        self.f.write("".join(json.dumps(r, default=str) + "\n" for r in results))
+
+
+class CSVWriter:
+    def __init__(self, f, kind):
+        self.columns = ["row", *KINDS[kind][3], "error"]
+        self.writer = csv.writer(f)
+        self.writer.writerow(self.columns)
+
+    def write(self, results):
+        self.writer.writerows(
+            [json.dumps(r[c]) if isinstance(r.get(c), (list, dict)) else r.get(c, "") for c in self.columns]
+            for r in results
+        )
+
+
+# ---------------------------
+# Workers
+# ---------------------------
+_ml_api = None
+_stages = None
+
+
+def _init_worker(kind):
+    # Pool workers only write results back to the parent: their prints
+    # (model loading messages) go to stderr, never into results on stdout
+    sys.stdout = sys.stderr
+    _load_models(kind)
+
+
+def _load_models(kind):
+    global _ml_api, _stages
+    import ml_api
+    from metrics import EndpointMetrics
+    for name in KINDS[kind][2]:
+        ml_api.registry.get(name)
+    _ml_api = ml_api
+    _stages = EndpointMetrics("score", ml_api.TABULAR_STAGES)
+
+
+def _score_chunk(kind, first_row, records):
+    """Results for one chunk plus (pid, CPU seconds) for the per-core report."""
+    start = time.process_time()
+    score, schema = getattr(_ml_api, KINDS[kind][0]), getattr(_ml_api, KINDS[kind][1])
+    rows = list(enumerate(records, first_row))
+    results = _ml_api._score_records(score, schema, rows, _stages, audit=False)
+    return results, os.getpid(), time.process_time() - start
+
+
+# ---------------------------
+# Driver
+# ---------------------------
+def score_file(kind, input_path, output, input_format="csv", workers=1, chunk_size=5000):
+    """Scores input_path into the writer output; returns the run summary."""
+    start = time.perf_counter()
+    rows = errors = 0
+    per_worker = {}  # pid -> [rows, cpu seconds]
+
+    def collect(result):
+        nonlocal errors
+        results, pid, cpu = result
+        output.write(results)
+        errors += sum(1 for r in results if "error" in r)
+        stats = per_worker.setdefault(pid, [0, 0.0])
+        stats[0] += len(results)
+        stats[1] += cpu
+
+    chunks = read_chunks(input_path, input_format, chunk_size)
+    if workers <= 1:
+        # In process: keep ml_api's prints off stdout while scoring, without
+        # rebinding it for the rest of the CLI (output holds its own stream)
+        with contextlib.redirect_stdout(sys.stderr):
+            _load_models(kind)
+            for records in chunks:
+                collect(_score_chunk(kind, rows, records))
+                rows += len(records)
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(kind,)) as pool:
+            # Two chunks per worker in flight: workers never wait for input, memory stays bounded
+            pending = deque()
+            for records in chunks:
+                pending.append(pool.submit(_score_chunk, kind, rows, records))
+                rows += len(records)
+                if len(pending) >= 2 * workers:
+                    collect(pending.popleft().result())
+            while pending:
+                collect(pending.popleft().result())
+
+    seconds = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "workers": max(1, workers),
+        "rows_per_second": round(rows / seconds, 1) if seconds > 0 else None,
+        "rows_per_second_per_core": round(rows / seconds / max(1, workers), 1) if seconds > 0 else None,
+        "per_worker": [
+            {"pid": pid, "rows": n, "cpu_seconds": round(cpu, 3),
+             "rows_per_cpu_second": round(n / cpu, 1) if cpu > 0 else None}
+            for pid, (n, cpu) in sorted(per_worker.items())
+        ],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline bulk scoring with the AgriVista models")
+    parser.add_argument("kind", choices=sorted(KINDS))
+    parser.add_argument("input", help="CSV or Parquet file with one request per row (API field names as columns)")
+    parser.add_argument("-o", "--output", default="-", help="results file (.csv, otherwise NDJSON); - for stdout")
+    parser.add_argument("--input-format", choices=["csv", "parquet"], help="default: from the file extension")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    input_format = args.input_format or ("parquet" if args.input.lower().endswith((".parquet", ".pq")) else "csv")
+    writer_cls = CSVWriter if args.output.lower().endswith(".csv") else NDJSONWriter
+    f = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        summary = score_file(args.kind, args.input, writer_cls(f, args.kind), input_format,
+                             args.workers, max(1, args.chunk_size))
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+    print(f"Scored {summary['rows']} rows ({summary['errors']} errors) in {summary['seconds']:.2f}s: "
+          f"{summary['rows_per_second']} rows/s, {summary['rows_per_second_per_core']} rows/s per core "
+          f"({summary['workers']} workers)", file=sys.stderr)
+    for w in summary["per_worker"]:
+        print(f"  worker {w['pid']}: {w['rows']} rows, {w['cpu_seconds']:.2f} CPU s, "
+              f"{w['rows_per_cpu_second']} rows per CPU second", file=sys.stderr)
+    return summary
+
+
+if __name__ == "__main__":
+    main()
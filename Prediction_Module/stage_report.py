@@ -0,0 +1,67 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+import psutil
+
+# Wall time and peak memory per stage of a training script:
+#
+#     report = StageReport()
+#     with report.stage("load"):
+#         ...
+#     report.print()
+#
+# Peak RSS is sampled by a background thread (every 20 ms) while the stage
+# runs, so it also covers memory allocated by native code (pandas, sklearn
+# workers threads, TensorFlow) that tracemalloc would not see.
+
+
+class _PeakRSS:
+    def __init__(self, process, interval=0.02):
+        self.process = process
+        self.interval = interval
+        self.peak = process.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stage-rss", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+
+class StageReport:
+    def __init__(self):
+        self.process = psutil.Process(os.getpid())
+        self.stages = []  # (name, seconds, peak RSS MB, RSS at start MB)
+
+    @contextmanager
+    def stage(self, name):
+        start_rss = self.process.memory_info().rss
+        start = time.perf_counter()
+        with _PeakRSS(self.process) as peak:
+            yield
+        seconds = time.perf_counter() - start
+        self.stages.append((name, seconds, peak.peak / 1024 / 1024, start_rss / 1024 / 1024))
+        print(f"[{name}] {seconds:.2f}s, peak RSS {peak.peak / 1024 / 1024:.1f} MB "
+              f"(+{(peak.peak - start_rss) / 1024 / 1024:.1f} MB)")
+
+    def as_dict(self):
+        return {name: {"seconds": round(seconds, 3), "peak_rss_mb": round(peak, 1)}
+                for name, seconds, peak, _ in self.stages}
+
+    def print(self):
+        total = sum(s[1] for s in self.stages)
+        print(f"{'stage':<24}{'seconds':>10}{'peak RSS MB':>14}{'growth MB':>12}")
+        for name, seconds, peak, start_rss in self.stages:
+            print(f"{name:<24}{seconds:>10.2f}{peak:>14.1f}{peak - start_rss:>12.1f}")
+        print(f"{'total':<24}{total:>10.2f}{max((s[2] for s in self.stages), default=0):>14.1f}")
@@ -0,0 +1,222 @@
+import os
+import sys
+import time
+from datetime import datetime
+
+import pytest
+
+# AuditLogger against a stub collection: batched flush, spill while Mongo is
+# unavailable, replay after recovery, partial insert_many failures and
+# connection retries. Records must be written exactly once in every case.
+# Usage: pytest test_audit_log.py
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+from audit_log import AuditLogger
+
+
+class BulkWriteError(Exception):
+    """Shape of pymongo.errors.BulkWriteError (details["writeErrors"][i]["index"])."""
+
+    def __init__(self, details):
+        super().__init__("batch op errors occurred")
+        self.details = details
+
+
+class StubCollection:
+    def __init__(self):
+        self.documents = []
+        self.calls = []
+        self.down = False
+        self.reject = set()  # "n" values whose insert fails
+
+    def insert_many(self, documents, ordered=True):
+        self.calls.append(len(documents))
+        if self.down:
+            raise ConnectionError("server selection timeout")
+        errors = []
+        for i, doc in enumerate(documents):
+            # Like pymongo, _id is assigned in place
+            doc["_id"] = object()
+            if doc["n"] in self.reject:
+                errors.append({"index": i, "code": 121, "errmsg": "Document failed validation"})
+            else:
+                self.documents.append({k: v for k, v in doc.items() if k != "_id"})
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(documents) - len(errors)})
+
+
+def records(start, stop):
+    return [{"n": n, "timestamp": datetime(2026, 1, 1, 12, 0, n % 60)} for n in range(start, stop)]
+
+
+def written(collection):
+    return sorted(doc["n"] for doc in collection.documents)
+
+
+@pytest.fixture
+def spill_path(tmp_path):
+    return str(tmp_path / "audit_spill.jsonl")
+
+
+def test_flush_writes_in_batches(spill_path):
+    collection = StubCollection()
+    audit = AuditLogger(collection, flush_size=3, spill_path=spill_path)
+    audit.log_many(records(0, 7))
+    audit.flush()
+    assert collection.calls == [3, 3, 1]
+    assert written(collection) == list(range(7))
+    assert audit.stats()["flushed"] == 7
+
+
+def test_spill_then_replay_after_recovery(spill_path):
+    collection = StubCollection()
+    audit = AuditLogger(collection, flush_size=2, spill_path=spill_path)
+    collection.down = True
+    audit.log_many(records(0, 5))
+    audit.flush()
+    assert collection.documents == []
+    assert audit.stats()["spilled"] == 5
+
+    collection.down = False
+    collection.calls.clear()
+    audit.log_many(records(5, 6))
+    audit.flush()
+    assert written(collection) == list(range(6))
+    # Replay is streamed in flush_size chunks, after the new record
+    assert collection.calls == [1, 2, 2, 1]
+    assert collection.documents[-1]["timestamp"] == datetime(2026, 1, 1, 12, 0, 4)
+    assert audit.stats()["replayed"] == 5
+    assert not os.path.exists(spill_path) and not os.path.exists(spill_path + ".replay")
+
+
+def test_partial_failure_spills_only_failed_records(spill_path):
+    collection = StubCollection()
+    audit = AuditLogger(collection, flush_size=10, spill_path=spill_path)
+    collection.reject = {1, 3}
+    audit.log_many(records(0, 5))
+    audit.flush()
+    assert written(collection) == [0, 2, 4]
+    stats = audit.stats()
+    assert (stats["flushed"], stats["spilled"]) == (3, 2)
+
+    collection.reject = set()
+    audit.log_many(records(5, 6))
+    audit.flush()
+    # Every record exactly once: nothing already written was replayed
+    assert written(collection) == list(range(6))
+
+
+def test_replay_stops_and_keeps_the_rest_when_mongo_fails_again(spill_path):
+    collection = StubCollection()
+    audit = AuditLogger(collection, flush_size=2, spill_path=spill_path)
+    collection.down = True
+    audit.log_many(records(0, 6))
+    audit.flush()
+
+    # Up for the new record and the first replay chunk only
+    collection.down = False
+    collection.calls.clear()
+    original = collection.insert_many
+
+    def flaky(documents, ordered=True):
+        if len(collection.calls) >= 2:
+            collection.down = True
+        return original(documents, ordered)
+
+    collection.insert_many = flaky
+    audit.log_many(records(6, 7))
+    audit.flush()
+    assert written(collection) == [0, 1, 6]
+
+    collection.down = False
+    collection.insert_many = original
+    audit.log_many(records(7, 8))
+    audit.flush()
+    assert written(collection) == list(range(8))
+
+
+def test_connect_is_retried_and_records_spilled_meanwhile(spill_path):
+    collection = StubCollection()
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise ConnectionError("connection refused")
+        return collection
+
+    audit = AuditLogger(connect=connect, flush_size=10, spill_path=spill_path, connect_retry=0.05)
+    audit.log_many(records(0, 3))
+    audit.flush()
+    assert audit.enabled
+    assert (len(attempts), audit.stats()["spilled"]) == (1, 3)
+
+    time.sleep(0.1)
+    audit.log_many(records(3, 4))
+    audit.flush()
+    assert len(attempts) == 2
+    assert written(collection) == list(range(4))
+
+
+def test_connect_backoff(spill_path):
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        raise ConnectionError("connection refused")
+
+    audit = AuditLogger(connect=connect, spill_path=spill_path, connect_retry=60.0)
+    for _ in range(3):
+        audit.log_many(records(0, 1))
+        audit.flush()
+    # Later flushes inside the backoff window do not reconnect
+    assert len(attempts) == 1
+    assert audit.stats()["spilled"] == 3
+
+
+def test_truncated_spill_line_is_skipped(spill_path):
+    collection = StubCollection()
+    audit = AuditLogger(collection, flush_size=10, spill_path=spill_path)
+    collection.down = True
+    audit.log_many(records(0, 2))
+    audit.flush()
+    # Killed mid-append: the last line is cut short
+    with open(spill_path, "a") as f:
+        f.write('{"n": 2, "times')
+    audit.log_many(records(3, 4))
+    audit.flush()
+
+    collection.down = False
+    audit.log_many(records(4, 5))
+    audit.flush()
+    assert written(collection) == [0, 1, 3, 4]
+    assert audit.stats()["corrupt"] == 1
+    with open(spill_path + ".bad") as f:
+        assert f.read() == '{"n": 2, "times\n'
+    assert not os.path.exists(spill_path + ".replay")
+
+
+def test_writer_thread_survives_a_failed_write(spill_path):
+    collection = StubCollection()
+    audit = AuditLogger(collection, flush_size=1, flush_interval=0.01, spill_path=spill_path)
+    original = audit._write
+    failures = []
+
+    def write(batch):
+        if not failures:
+            failures.append(batch)
+            raise RuntimeError("unexpected")
+        original(batch)
+
+    audit._write = write
+    audit.start()
+    audit.log_many(records(0, 3))
+    deadline = time.monotonic() + 5
+    while len(collection.documents) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert audit._thread.is_alive()
+    audit.close()
+    assert written(collection) == [1, 2]
+    assert audit.stats()["dropped"] == 1
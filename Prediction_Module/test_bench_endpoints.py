@@ -0,0 +1,47 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+# Smoke run of the endpoint benchmark on fixture models: every endpoint must
+# answer without errors, and the results file must compare cleanly with itself.
+# Usage: pytest test_bench_endpoints.py
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+pytest.importorskip("sklearn")
+pytest.importorskip("uvicorn")
+
+
+def run_bench(*args):
+    return subprocess.run(
+        [sys.executable, "bench_endpoints.py", "--requests", "20", "--concurrency", "4", "--batch-size", "20", *args],
+        cwd=BASE_DIR, capture_output=True, text=True, timeout=600
+    )
+
+
+def test_all_endpoints_serve_fixture_models(tmp_path):
+    output = tmp_path / "results.json"
+    result = run_bench("--output", str(output))
+    assert result.returncode == 0, result.stdout[-2000:] + result.stderr[-2000:]
+
+    report = json.loads(output.read_text())
+    assert {"crop", "batch-crop", "yield", "batch-yield", "fertilizer", "batch-fertilizer"} <= set(report["results"])
+    for name, stats in report["results"].items():
+        assert stats["errors"] == 0, f"{name}: {stats}"
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+
+
+def test_compare_flags_regressions():
+    from bench_endpoints import compare
+    baseline = {"results": {"crop": {"throughput_rps": 100.0, "p50_ms": 10.0, "p95_ms": 20.0, "peak_rss_mb": 200.0, "errors": 0}}}
+    same = {"results": {"crop": {"throughput_rps": 95.0, "p50_ms": 10.5, "p95_ms": 21.0, "peak_rss_mb": 201.0, "errors": 0}}}
+    slower = {"results": {"crop": {"throughput_rps": 60.0, "p50_ms": 10.0, "p95_ms": 40.0, "peak_rss_mb": 200.0, "errors": 2}}}
+
+    assert compare(same, baseline, 0.2) == []
+    regressions = compare(slower, baseline, 0.2)
+    assert any(r.startswith("crop.throughput_rps") for r in regressions)
+    assert any(r.startswith("crop.p95_ms") for r in regressions)
+    assert any(r.startswith("crop.errors") for r in regressions)
@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+# Parsing of /stream/* uploads, plus one end-to-end run of a CSV with a
+# UTF-8 byte order mark (as written by Excel) against the fixture models.
+# Usage: pytest test_bulk_stream.py
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+from bulk_stream import LineSplitter, RecordParser
+
+CSV_TEXT = "Nitrogen,Phosphorus,Potassium,soil_type,crop_type\r\n90,42,43,Loamy,Wheat\r\n20,,10,Sandy,Maize\r\n"
+
+STREAM_SCRIPT = """
+import sys, json
+from fastapi.testclient import TestClient
+import ml_api
+client = TestClient(ml_api.app)
+response = client.post("/stream/predict-fertilizer?format=csv", content=open(sys.argv[1], "rb").read())
+assert response.status_code == 200, response.text
+print(json.dumps([json.loads(line) for line in response.text.splitlines()]))
+"""
+
+
+def parse_all(data, chunk_size, fmt="csv"):
+    splitter, parser = LineSplitter(), RecordParser(fmt)
+    lines = []
+    for i in range(0, len(data), chunk_size):
+        lines += splitter.feed(data[i:i + chunk_size])
+    lines += splitter.close()
+    return [r for r in map(parser.parse, lines) if r is not None]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 1000])
+def test_byte_order_mark_is_not_part_of_the_header(chunk_size):
+    plain = parse_all(CSV_TEXT.encode("utf-8"), chunk_size)
+    assert parse_all(CSV_TEXT.encode("utf-8-sig"), chunk_size) == plain
+    assert plain == [
+        {"Nitrogen": "90", "Phosphorus": "42", "Potassium": "43", "soil_type": "Loamy", "crop_type": "Wheat"},
+        {"Nitrogen": "20", "Phosphorus": None, "Potassium": "10", "soil_type": "Sandy", "crop_type": "Maize"},
+    ]
+
+
+def test_ndjson_with_byte_order_mark():
+    data = '﻿{"a": 1}\n{"a": 2}'.encode("utf-8")
+    assert parse_all(data, 3, fmt="ndjson") == [{"a": 1}, {"a": 2}]
+
+
+def test_stream_endpoint_accepts_excel_csv(tmp_path):
+    pytest.importorskip("sklearn")
+    import bench_fixtures
+    models_dir, dataset_path = bench_fixtures.build_fixtures(str(tmp_path))
+    env = {**os.environ, "ML_MODELS_DIR": models_dir, "ML_DATASET_PATH": dataset_path, "ML_DISEASE_ENABLED": "0",
+           "ML_MODEL_WATCH_INTERVAL": "0", "ML_AUDIT_SPILL_PATH": os.devnull,
+           "MONGO_URL": "mongodb://127.0.0.1:1/test", "ML_MONGO_TIMEOUT_MS": "100"}
+    input_path = tmp_path / "excel.csv"
+    input_path.write_bytes(CSV_TEXT.encode("utf-8-sig"))
+
+    result = subprocess.run([sys.executable, "-c", STREAM_SCRIPT, str(input_path)],
+                            cwd=BASE_DIR, env=env, capture_output=True, text=True, timeout=600)
+    assert result.returncode == 0, result.stderr[-2000:]
+    first, second, summary = json.loads(result.stdout.splitlines()[-1])
+    assert first["row"] == 0 and "recommended_fertilizer" in first
+    # Only the genuinely empty cell is reported, not a mangled first column
+    assert second["row"] == 1 and second["error"].startswith("Phosphorus")
+    assert summary["summary"]["errors"] == 1
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The columnar dataset cache must never be required: a cache dir elsewhere
+# works like the default one, and an unwritable one falls back to parsing the
+# CSV in memory with the same lookups.
+# Usage: pytest test_crop_dataset.py
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+pytest.importorskip("pandas")
+
+import bench_fixtures
+from crop_dataset import load_crop_dataset
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = str(tmp_path / "data" / "production.csv")
+    os.makedirs(os.path.dirname(path))
+    bench_fixtures.build_dataset(path, rows=2000)
+    return path
+
+
+def _same(a, b):
+    assert (a.seasons, a.states, a.locations, a.version) == (b.seasons, b.states, b.locations, b.version)
+    np.testing.assert_array_equal(a.counts, b.counts)
+    np.testing.assert_array_equal(a.codes, b.codes)
+
+
+def test_cache_dir_elsewhere(csv_path, tmp_path):
+    default = load_crop_dataset(csv_path)
+    elsewhere = load_crop_dataset(csv_path, cache_dir=str(tmp_path / "cache"))
+    assert elsewhere.path == str(tmp_path / "cache" / "production.cache")
+    _same(default, elsewhere)
+
+
+def test_unwritable_cache_parses_in_memory(csv_path, tmp_path):
+    reference = load_crop_dataset(csv_path, cache_dir=str(tmp_path / "cache"))
+    # A regular file in the way: no cache can be created below it (even as root)
+    blocker = tmp_path / "blocker"
+    blocker.write_text("")
+    dataset = load_crop_dataset(csv_path, cache_dir=str(blocker / "cache"))
+    assert dataset.path is None
+    _same(reference, dataset)
+    assert dataset.location_index()[0]
@@ -1,8 +1,9 @@
-import pandas as pd
 import os
-import psutil
-import gc
 import sys
+import time
+import psutil
+
+from crop_dataset import build_cache, load_crop_dataset
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -17,54 +18,22 @@ print_memory("Start")
 
 try:
     if os.path.exists(DATASET_PATH):
-        # OPTIMIZED LOAD: Only necessary columns + Dtypes
-        use_cols = ['State_Name', 'District_Name', 'Season', 'Crop']
-        
-        dtype_spec = {
-            'State_Name': 'category',
-            'District_Name': 'category',
-            'Season': 'category',
-            'Crop': 'category'
-        }
-        
-        print("Reading CSV...")
-        df = pd.read_csv(DATASET_PATH, usecols=use_cols, dtype=dtype_spec)
-        print(f"Dataset Loaded. Rows: {len(df)}")
-        print_memory("Post-Read")
-
-        print("Cleaning Categories...")
-        for col in use_cols:
-            if hasattr(df[col], 'cat'):
-                # Get current categories
-                cats = df[col].cat.categories
-                new_cats = [str(x).strip().lower() for x in cats]
-                
-                # Check for duplicates in new_cats
-                if len(new_cats) != len(set(new_cats)):
-                    # Duplicates found! Need to collapse.
-                    mapper = dict(zip(cats, new_cats))
-                    df[col] = df[col].map(mapper).astype('category')
-                else:
-                    # No duplicates, safe to rename
-                    df[col] = df[col].cat.rename_categories(new_cats)
-        print("Categories Cleaned.")
-        
-        print("Generating Caches...")
-        CACHED_SEASONS = sorted([s.title() for s in df['Season'].cat.categories.tolist() if s and str(s) != 'nan'])
-        CACHED_STATES = sorted([s.title() for s in df['State_Name'].cat.categories.tolist() if s and str(s) != 'nan'])
-        
-        CACHED_LOCATIONS = {}
-        grouped = df.groupby('State_Name', observed=True)['District_Name'].unique()
-        
-        for state, districts in grouped.items():
-            if str(state) == 'nan': continue
-            display_state = state.title()
-            display_districts = sorted([d.title() for d in districts.tolist() if d and str(d) != 'nan'])
-            CACHED_LOCATIONS[display_state] = display_districts
-            
-        print("Caches Generated.")
+        # Columnar cache (see crop_dataset.py): built from the CSV once, then memory-mapped
+        if "--rebuild" in sys.argv:
+            print("Rebuilding cache from CSV...")
+            build_cache(DATASET_PATH)
+            print_memory("Post-Build")
+
+        start = time.perf_counter()
+        dataset = load_crop_dataset(DATASET_PATH)
+        print(f"Dataset Loaded in {(time.perf_counter() - start) * 1000:.1f} ms. Rows: {dataset.n_rows}")
+        print_memory("Post-Load")
+
+        index, seconds = dataset.location_index()
+        print(f"Location index: {len(index)} keys in {seconds * 1000:.1f} ms")
+        print(f"States: {len(dataset.states)}, Seasons: {dataset.seasons}, "
+              f"Districts: {sum(len(d) for d in dataset.locations.values())}")
         print_memory("End")
-        gc.collect()
 
     else:
         print("Dataset not found!")
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# TFLiteDiseaseModel pads every call to one of its fixed batch sizes: results
+# must equal an unpadded run for any batch size, and interpreters must only
+# be created (never resized) per batch size.
+# Usage: pytest test_disease_runtime.py
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+tf = pytest.importorskip("tensorflow")
+
+from disease_runtime import TFLiteDiseaseModel
+
+
+@pytest.fixture(scope="module")
+def tiny_model(tmp_path_factory):
+    keras = tf.keras
+    inputs = keras.Input((8, 8, 3))
+    x = keras.layers.Conv2D(4, 3, activation="relu")(inputs)
+    x = keras.layers.GlobalAveragePooling2D()(x)
+    model = keras.Model(inputs, keras.layers.Dense(5, activation="softmax")(x))
+    path = tmp_path_factory.mktemp("tflite") / "tiny.tflite"
+    path.write_bytes(tf.lite.TFLiteConverter.from_keras_model(model).convert())
+    return model, str(path)
+
+
+@pytest.mark.parametrize("n", [1, 3, 4, 7, 19])
+def test_padded_batches_match_keras(tiny_model, n):
+    keras_model, path = tiny_model
+    X = np.random.default_rng(n).uniform(-1, 1, size=(n, 8, 8, 3)).astype(np.float32)
+    out = TFLiteDiseaseModel(path, batch_sizes=(1, 4, 8))(X)
+    assert out.shape == (n, 5)
+    np.testing.assert_allclose(out, np.asarray(keras_model(X, training=False)), atol=1e-5)
+
+
+def test_interpreters_are_allocated_once_per_batch_size(tiny_model, monkeypatch):
+    _, path = tiny_model
+    model = TFLiteDiseaseModel(path, batch_sizes=(1, 4, 8))
+    created = []
+    interpreter_class = model._Interpreter
+
+    def counting_interpreter(**kwargs):
+        created.append(kwargs)
+        return interpreter_class(**kwargs)
+
+    monkeypatch.setattr(model, "_Interpreter", counting_interpreter)
+    for n in [2, 3, 1, 4, 2, 6, 3, 8, 1]:
+        model(np.zeros((n, 8, 8, 3), dtype=np.float32))
+    assert sorted(model._interpreters) == [1, 4, 8]
+    # Batch size 1 was built in __init__; 4 and 8 once each
+    assert len(created) == 2
@@ -0,0 +1,82 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# FlatForest must answer exactly like the sklearn forest it was flattened
+# from, NaN features included (routed by missing_go_to_left), for both the
+# NumPy traversal and the loop kernel numba compiles.
+# Usage: pytest test_forest_engine.py
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+pytest.importorskip("sklearn")
+
+import forest_engine
+from forest_engine import FlatForest
+from model_bundle import save_bundle, load_bundle
+
+
+def _with_nans(X, rng, fraction=0.2):
+    X = X.copy()
+    X[rng.random(X.shape) < fraction] = np.nan
+    return X
+
+
+def _forests(missing_in_training):
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 6)) * 50
+    y_class = (X[:, 0] + X[:, 1] > 0).astype(int) + (X[:, 2] > 30)
+    y_reg = X[:, 0] * 0.3 + X[:, 3]
+    if missing_in_training:
+        X = _with_nans(X, rng)
+    # n_jobs=1: sklearn then adds trees in the same order as FlatForest
+    return [
+        RandomForestClassifier(n_estimators=15, max_depth=8, random_state=0, n_jobs=1).fit(X, y_class),
+        RandomForestRegressor(n_estimators=15, max_depth=8, random_state=0, n_jobs=1).fit(X, y_reg),
+    ]
+
+
+def _rows(seed=1, n=300):
+    rng = np.random.default_rng(seed)
+    return _with_nans(rng.normal(size=(n, 6)) * 60, rng, fraction=0.15)
+
+
+def _assert_same(model, flat, X):
+    if hasattr(model, "classes_"):
+        np.testing.assert_array_equal(flat.predict_proba(X), model.predict_proba(X))
+    np.testing.assert_array_equal(flat.predict(X), model.predict(X))
+
+
+@pytest.mark.parametrize("missing_in_training", [False, True])
+def test_numpy_traversal_matches_sklearn(missing_in_training, monkeypatch):
+    monkeypatch.setattr(forest_engine, "_numba_kernel", lambda: None)
+    for model in _forests(missing_in_training):
+        _assert_same(model, FlatForest.from_sklearn(model), _rows())
+
+
+@pytest.mark.parametrize("missing_in_training", [False, True])
+def test_loop_kernel_matches_sklearn(missing_in_training, monkeypatch):
+    # The uncompiled kernel: same code numba runs, just slower
+    monkeypatch.setattr(forest_engine, "_numba_kernel", lambda: forest_engine._accumulate_loops)
+    for model in _forests(missing_in_training):
+        _assert_same(model, FlatForest.from_sklearn(model), _rows(n=60))
+
+
+def test_bundle_keeps_missing_value_routing(tmp_path):
+    model = _forests(missing_in_training=True)[0]
+    save_bundle(str(tmp_path / "clf"), "clf", model, [f"f{i}" for i in range(6)])
+    _assert_same(model, load_bundle(str(tmp_path / "clf")).model, _rows())
+
+
+def test_infinite_features_are_rejected():
+    model = _forests(missing_in_training=False)[0]
+    X = _rows(n=5)
+    X[2, 1] = np.inf
+    with pytest.raises(ValueError, match="infinity"):
+        model.predict(X)
+    with pytest.raises(ValueError, match="infinity"):
+        FlatForest.from_sklearn(model).predict(X)
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import threading
+
+import numpy as np
+import pytest
+
+# MicroBatcher must not delay lone requests by its batch window when traffic
+# is low, must still coalesce a burst of concurrent ones, and must not fail
+# a whole batch because of one bad row.
+# Usage: pytest test_micro_batching.py
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+from micro_batching import MicroBatcher
+
+
+def test_lone_requests_are_not_held_for_the_window():
+    batcher = MicroBatcher(lambda X: X * 2, max_batch_size=64, max_wait_ms=500)
+    latencies = []
+    for i in range(5):
+        start = time.perf_counter()
+        assert batcher.predict(np.array([i]))[0] == 2 * i
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.02)
+    # Far below the 500 ms window
+    assert max(latencies) < 0.1
+    assert batcher.stats()["batches"] == 5
+
+
+def test_single_sequential_client_is_not_held_for_the_window():
+    # Back-to-back requests from one caller look like busy traffic, but the
+    # next one cannot arrive before this one is answered
+    batcher = MicroBatcher(lambda X: X, max_batch_size=64, max_wait_ms=500)
+    start = time.perf_counter()
+    for i in range(50):
+        batcher.predict(np.array([i]))
+    assert time.perf_counter() - start < 2.0
+
+
+def test_concurrent_requests_are_coalesced():
+    calls = []
+
+    def predict(X):
+        calls.append(len(X))
+        time.sleep(0.01)
+        return X + 1
+
+    batcher = MicroBatcher(predict, max_batch_size=16, max_wait_ms=20)
+    results = {}
+
+    def client(i):
+        results[i] = batcher.predict(np.array([i]))[0]
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(64)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == {i: i + 1 for i in range(64)}
+    assert sum(calls) == 64
+    assert len(calls) < 32 and max(calls) <= 16
+
+
+def test_bad_row_fails_only_its_own_request():
+    gate = threading.Event()
+
+    def predict(X):
+        gate.wait()
+        if not np.isfinite(X).all():
+            raise ValueError("Input X contains infinity")
+        return X * 2
+
+    batcher = MicroBatcher(predict, max_batch_size=16, max_wait_ms=50)
+    # The first row holds the worker so the rest queue up as one batch
+    first = batcher.submit(np.array([0.0]))
+    time.sleep(0.05)
+    futures = [batcher.submit(np.array([v])) for v in (1.0, np.inf, 3.0)]
+    gate.set()
+    assert first.result()[0] == 0
+    assert futures[0].result()[0] == 2
+    with pytest.raises(ValueError, match="infinity"):
+        futures[1].result()
+    assert futures[2].result()[0] == 6
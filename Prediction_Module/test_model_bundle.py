@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+
+import numpy as np
+import pytest
+
+# Saving a bundle over a live one: new arrays go to a fresh data directory and
+# manifest.json is swapped, so files a running server has mapped are never
+# moved, and only versions no manifest refers to are cleaned up.
+# Usage: pytest test_model_bundle.py
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+pytest.importorskip("sklearn")
+
+from model_bundle import MANIFEST_NAME, DATA_DIR_PREFIX, save_bundle, load_bundle
+
+
+def _forest(seed):
+    from sklearn.ensemble import RandomForestClassifier
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(200, 4))
+    return RandomForestClassifier(n_estimators=5, max_depth=4, random_state=seed).fit(X, X[:, 0] > 0), X
+
+
+def _data_dirs(path):
+    return sorted(e for e in os.listdir(path) if e.startswith(DATA_DIR_PREFIX))
+
+
+def test_save_over_a_mapped_bundle(tmp_path):
+    path = str(tmp_path / "crop")
+    first, X = _forest(0)
+    save_bundle(path, "crop", first, ["a", "b", "c", "d"])
+    live = load_bundle(path)
+    first_dir = _data_dirs(path)
+
+    second, _ = _forest(1)
+    save_bundle(path, "crop", second, ["a", "b", "c", "d"])
+    # The live bundle's files are untouched; a fresh load sees the new model
+    np.testing.assert_array_equal(live.model.predict_proba(X), first.predict_proba(X))
+    np.testing.assert_array_equal(load_bundle(path).model.predict_proba(X), second.predict_proba(X))
+    assert set(first_dir) < set(_data_dirs(path))
+
+    third, _ = _forest(2)
+    save_bundle(path, "crop", third, ["a", "b", "c", "d"])
+    assert len(_data_dirs(path)) == 2
+    assert first_dir[0] not in _data_dirs(path)
+    assert not [e for e in os.listdir(path) if e.endswith(".tmp")]
+
+
+def test_legacy_flat_layout_is_migrated(tmp_path):
+    path = tmp_path / "yield"
+    model, X = _forest(0)
+    save_bundle(str(path), "yield", model, ["a", "b", "c", "d"])
+    # Rewrite as a bundle from before data directories: .npy files next to the manifest
+    data_dir = path / _data_dirs(str(path))[0]
+    manifest = json.loads((path / MANIFEST_NAME).read_text())
+    for section in ("arrays", "encoders"):
+        manifest[section] = {k: v.split("/", 1)[1] for k, v in manifest[section].items()}
+    for f in os.listdir(data_dir):
+        os.replace(data_dir / f, path / f)
+    os.rmdir(data_dir)
+    (path / MANIFEST_NAME).write_text(json.dumps(manifest))
+    np.testing.assert_array_equal(load_bundle(str(path)).model.predict(X), model.predict(X))
+
+    save_bundle(str(path), "yield", model, ["a", "b", "c", "d"])
+    save_bundle(str(path), "yield", model, ["a", "b", "c", "d"])
+    assert not [e for e in os.listdir(path) if e.endswith(".npy")]
+    np.testing.assert_array_equal(load_bundle(str(path)).model.predict(X), model.predict(X))
@@ -0,0 +1,88 @@
+import os
+import sys
+import csv
+import json
+import subprocess
+
+import pytest
+
+# The offline scorer must return exactly what the API returns for the same
+# rows: scores a fixture CSV with `python -m Prediction_Module.score` (process
+# pool) and compares with /batch/* answered by ml_api in a fresh interpreter.
+# Usage: pytest test_score.py
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+pytest.importorskip("sklearn")
+pytest.importorskip("pandas")
+
+API_SCRIPT = """
+import sys, json
+from fastapi.testclient import TestClient
+import ml_api
+client = TestClient(ml_api.app)
+response = client.post(sys.argv[1], json=json.load(open(sys.argv[2])))
+assert response.status_code == 200, response.text
+print(json.dumps(response.json()["results"]))
+"""
+
+
+@pytest.fixture(scope="module")
+def fixture_env(tmp_path_factory):
+    sys.path.insert(0, BASE_DIR)
+    import bench_fixtures
+    root = tmp_path_factory.mktemp("score")
+    models_dir, dataset_path = bench_fixtures.build_fixtures(str(root))
+    env = {**os.environ, "ML_MODELS_DIR": models_dir, "ML_DATASET_PATH": dataset_path, "ML_DISEASE_ENABLED": "0",
+           "ML_MODEL_WATCH_INTERVAL": "0", "ML_AUDIT_SPILL_PATH": os.devnull,
+           "MONGO_URL": "mongodb://127.0.0.1:1/test", "ML_MONGO_TIMEOUT_MS": "100"}
+    return root, env
+
+
+@pytest.mark.parametrize("kind", ["crop", "yield", "fertilizer"])
+def test_offline_scores_match_api(kind, fixture_env):
+    import bench_fixtures
+    root, env = fixture_env
+    payloads = bench_fixtures.sample_payloads(kind, 120, seed=3)
+    columns = sorted({k for p in payloads for k in p})
+    input_path = root / f"{kind}.csv"
+    with open(input_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, columns)
+        writer.writeheader()
+        writer.writerows(payloads)
+    payload_path = root / f"{kind}.json"
+    payload_path.write_text(json.dumps(payloads))
+
+    offline = subprocess.run(
+        [sys.executable, "-m", "Prediction_Module.score", kind, str(input_path), "--workers", "2", "--chunk-size", "25"],
+        cwd=os.path.dirname(BASE_DIR), env=env, capture_output=True, text=True, timeout=600
+    )
+    assert offline.returncode == 0, offline.stderr[-2000:]
+    assert "rows/s per core" in offline.stderr
+    api = subprocess.run([sys.executable, "-c", API_SCRIPT, f"/batch/predict-{kind}", str(payload_path)],
+                         cwd=BASE_DIR, env=env, capture_output=True, text=True, timeout=600)
+    assert api.returncode == 0, api.stderr[-2000:]
+
+    results = [json.loads(line) for line in offline.stdout.splitlines()]
+    assert [r.pop("row") for r in results] == list(range(len(payloads)))
+    assert results == json.loads(api.stdout.splitlines()[-1])
+
+
+def test_in_process_scoring_leaves_stdout_alone(fixture_env):
+    import bench_fixtures
+    root, env = fixture_env
+    input_path = root / "inline.csv"
+    payloads = bench_fixtures.sample_payloads("yield", 10, seed=4)
+    with open(input_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, sorted(payloads[0]))
+        writer.writeheader()
+        writer.writerows(payloads)
+    script = ("import sys; from Prediction_Module import score; "
+              f"score.main(['yield', {str(input_path)!r}, '--workers', '1']); "
+              "assert sys.stdout is sys.__stdout__ and not sys.stdout.closed; print('done')")
+    run = subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(BASE_DIR), env=env,
+                         capture_output=True, text=True, timeout=600)
+    assert run.returncode == 0, run.stderr[-2000:]
+    lines = run.stdout.splitlines()
+    assert lines[-1] == "done"
+    assert [json.loads(line)["row"] for line in lines[:-1]] == list(range(len(payloads)))
@@ -0,0 +1,59 @@
+import os
+import sys
+import subprocess
+from functools import lru_cache
+
+# Cold-start regression check: imports ml_api in a fresh interpreter under
+# `python -X importtime` and fails if a heavy dependency is imported at module
+# load, or if the whole import takes longer than the budget.
+# Usage: python test_startup_time.py   (or: pytest test_startup_time.py)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Imported only by the subsystem that needs them: dataset load (pandas), audit
+# writer (pymongo), disease serving (PIL, tensorflow), forest kernel (numba)
+LAZY_MODULES = ["tensorflow", "pandas", "pymongo", "PIL", "numba", "sklearn"]
+IMPORT_BUDGET_MS = float(os.environ.get("ML_IMPORT_BUDGET_MS", 1500))
+
+
+@lru_cache(maxsize=None)
+def import_times(module="ml_api"):
+    """{imported module: cumulative microseconds} for `import module`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR, capture_output=True, text=True
+    )
+    assert result.returncode == 0, f"import {module} failed:\n{result.stderr[-2000:]}"
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            times[parts[2].strip()] = int(parts[1])
+        except (IndexError, ValueError):
+            continue  # header line
+    return times
+
+
+def report(times, top=10):
+    print(f"ml_api import: {times['ml_api'] / 1000:.0f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)")
+    for name, us in sorted(times.items(), key=lambda kv: -kv[1])[1:top + 1]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+
+def test_heavy_dependencies_are_lazy():
+    imported = sorted({name.split(".")[0] for name in import_times()} & set(LAZY_MODULES))
+    assert not imported, f"Imported at startup: {imported}"
+
+
+def test_import_time_budget():
+    times = import_times()
+    report(times)
+    assert times["ml_api"] / 1000 <= IMPORT_BUDGET_MS, f"ml_api import took {times['ml_api'] / 1000:.0f} ms"
+
+
+if __name__ == "__main__":
+    test_heavy_dependencies_are_lazy()
+    test_import_time_budget()
+    print("OK")
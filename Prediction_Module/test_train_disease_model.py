@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The disease training cache must accept every extension it lists: the same
+# pixels saved losslessly as PNG, BMP, TIFF and PPM (the last two decoded with
+# PIL, as TensorFlow cannot read them) must end up as the same cached image.
+# Usage: pytest test_train_disease_model.py
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+tf = pytest.importorskip("tensorflow")
+from PIL import Image
+
+import train_disease_model
+
+
+def test_cache_decodes_every_listed_format(tmp_path):
+    pixels = np.random.default_rng(0).integers(0, 256, size=(40, 30, 3), dtype=np.uint8)
+    extensions = [".png", ".bmp", ".tif", ".tiff", ".ppm"]
+    class_dir = tmp_path / "Train" / "leaf"
+    class_dir.mkdir(parents=True)
+    for ext in extensions:
+        Image.fromarray(pixels).save(class_dir / f"image{ext}")
+
+    classes, paths, labels = train_disease_model.list_images(str(tmp_path / "Train"))
+    assert len(paths) == len(extensions)
+    shards = train_disease_model.cache_shards(str(tmp_path / "Train"), paths, labels,
+                                              cache_dir=str(tmp_path / "cache"), n_shards=1)
+
+    features = {"image": tf.io.FixedLenFeature([], tf.string), "label": tf.io.FixedLenFeature([], tf.int64)}
+    images = [tf.io.parse_tensor(tf.io.parse_single_example(r, features)["image"], tf.uint8).numpy()
+              for r in tf.data.TFRecordDataset(shards)]
+    assert len(images) == len(extensions)
+    assert images[0].shape == (*train_disease_model.IMG_SIZE, 3)
+    for image in images[1:]:
+        np.testing.assert_array_equal(image, images[0])
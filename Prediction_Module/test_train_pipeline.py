@@ -0,0 +1,79 @@
+import os
+import json
+import shutil
+
+import pytest
+
+# Training orchestrator bookkeeping on the small bundled datasets: a first run
+# trains, an unchanged rerun skips, appended survey rows grow the forest with
+# warm_start, and --force retrains from scratch.
+# Usage: pytest test_train_pipeline.py
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+pytest.importorskip("sklearn")
+pytest.importorskip("pandas")
+
+YIELD_CSV = "Smart_Farming_Crop_Yield_2024.csv"
+
+
+def run(tmp_path, **kwargs):
+    from train_pipeline import run_pipeline
+    return run_pipeline(["yield"], models_dir=str(tmp_path / "models"), datasets_dir=str(tmp_path / "datasets"),
+                        cache_dir=str(tmp_path / "cache"), workers=1, **kwargs)
+
+
+def manifest(tmp_path):
+    with open(tmp_path / "models" / "yield" / "manifest.json") as f:
+        return json.load(f)
+
+
+def test_skip_incremental_and_force(tmp_path):
+    (tmp_path / "datasets").mkdir()
+    csv_path = tmp_path / "datasets" / YIELD_CSV
+    shutil.copy(os.path.join(BASE_DIR, "datasets", YIELD_CSV), csv_path)
+
+    first = run(tmp_path)["yield"]
+    assert first["action"] == "full"
+    assert first["n_estimators"] == 300
+    assert manifest(tmp_path)["metadata"]["training"]["mode"] == "full"
+    assert "r2" in manifest(tmp_path)["metadata"]
+
+    assert run(tmp_path)["yield"]["action"] == "skip"
+
+    # Append a copy of some rows with a changed feature: rows only appended
+    lines = csv_path.read_text().splitlines()
+    header, rows = lines[0].split(","), lines[1:81]
+    days = header.index("total_days")
+    appended = [",".join(str(int(v) + 1) if i == days else v for i, v in enumerate(row.split(","))) for row in rows]
+    with open(csv_path, "a") as f:
+        f.write("\n".join(appended) + "\n")
+
+    grown = run(tmp_path)["yield"]
+    assert grown["action"] == "incremental"
+    assert grown["n_estimators"] > 300
+    assert grown["train_rows"] > first["train_rows"]
+    training = manifest(tmp_path)["metadata"]["training"]
+    assert training["mode"] == "incremental"
+    assert training["feature_cache"] == "miss"
+    assert manifest(tmp_path)["n_estimators"] == grown["n_estimators"]
+
+    forced = run(tmp_path, force=True)["yield"]
+    assert forced["action"] == "full"
+    assert forced["n_estimators"] == 300
+    assert forced["training"]["feature_cache"] == "hit"
+
+
+def test_append_after_unterminated_row_is_not_incremental(tmp_path):
+    from train_pipeline import file_fingerprint
+    path = tmp_path / "rows.csv"
+    path.write_bytes(b"a,b\n1,2")
+    previous, _ = file_fingerprint(path)
+    # The first appended line merges into the last old row ("1,23,4")
+    path.write_bytes(b"a,b\n1,23,4\n")
+    assert file_fingerprint(path, previous["size"])[1] is None
+
+    path.write_bytes(b"a,b\n1,2\n")
+    previous, _ = file_fingerprint(path)
+    path.write_bytes(b"a,b\n1,2\n3,4\n")
+    assert file_fingerprint(path, previous["size"])[1] == previous["sha256"]
@@ -5,6 +5,7 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score
+from model_bundle import save_bundle
 
 os.makedirs("models", exist_ok=True)
 
@@ -31,7 +32,11 @@ model = RandomForestClassifier(
 
 model.fit(X_train, y_train)
 
-print("Accuracy:", accuracy_score(y_test, model.predict(X_test)))
+acc = accuracy_score(y_test, model.predict(X_test))
+print("Accuracy:", acc)
 
 pickle.dump(model, open("models/crop_model.pkl", "wb"))
 pickle.dump(le, open("models/crop_label_encoder.pkl", "wb"))
+
+# Memory-mappable bundle served by ml_api
+save_bundle("models/crop", "crop", model, FEATURES, {"crop_label": le}, metadata={"accuracy": acc})
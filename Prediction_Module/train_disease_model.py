@@ -1,11 +1,35 @@
 import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout, Input
 from tensorflow.keras.models import Model
 from tensorflow.keras.applications.mobilenet_v2 import MobileNetV2, preprocess_input
 from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping, ReduceLROnPlateau, BackupAndRestore
 import json
 import os
+import math
+import time
+import shutil
+import hashlib
+import argparse
+import numpy as np
+from PIL import Image
+from stage_report import StageReport
+
+# Input pipeline (tf.data):
+#   1. Images are decoded and resized once, in parallel, and cached as
+#      TFRecord shards in train_cache/disease-<split>-<key>/ (key: file list
+#      with sizes and mtimes, image size, cache format); later runs read the
+#      shards directly. Resizing is bicubic with antialiasing, like the PIL
+#      resize ml_api serves with; flow_from_directory resized with nearest
+#      neighbour, so models trained before this pipeline saw slightly
+#      different (blockier) inputs than they were served.
+#   2. Each epoch interleaves the shards in parallel, shuffles, batches, and
+#      augments whole batches (one affine warp per image), then prefetches so
+#      the next batch is ready while the model trains on the current one.
+# Epochs cover the whole training set unless --steps-per-epoch caps them.
+# Images per second are reported for every epoch, and --benchmark-input N
+# measures the input pipeline alone.
+# Usage: python train_disease_model.py [--epochs 15] [--steps-per-epoch N] [--cache-format raw|jpeg]
+#                                      [--benchmark-input N]
 
 # Set paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -16,54 +40,279 @@ VAL_DIR = os.path.join(DATASET_DIR, "Val")
 MODEL_SAVE_PATH = os.path.join(BASE_DIR, "models", "disease_model.keras")
 BACKUP_DIR = os.path.join(BASE_DIR, "models", "backup")
 CLASSES_SAVE_PATH = os.path.join(BASE_DIR, "models", "disease_classes.json")
+CACHE_DIR = os.path.join(BASE_DIR, "train_cache")
 
 # Hyperparameters
 IMG_SIZE = (224, 224)
 BATCH_SIZE = 32
 EPOCHS = 15 # More epochs for better accuracy
+FINE_TUNE_EPOCHS = 5
+
+# Input pipeline settings
+AUTOTUNE = tf.data.AUTOTUNE
+SHUFFLE_BUFFER = 2048
+CACHE_SHARDS = 16
+# Same extensions flow_from_directory accepted; the ones tf.io.decode_image
+# cannot read (PPM, TIFF) are decoded with PIL, as flow_from_directory did
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".ppm", ".tif", ".tiff")
+TF_DECODED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+# ---------------------------
+# Image cache (TFRecord shards)
+# ---------------------------
+def list_images(split_dir, classes=None):
+    """(classes, paths, labels); classes are the sorted subdirectories, as flow_from_directory used."""
+    if classes is None:
+        classes = sorted(e.name for e in os.scandir(split_dir) if e.is_dir())
+    paths, labels = [], []
+    for label, name in enumerate(classes):
+        class_dir = os.path.join(split_dir, name)
+        if not os.path.isdir(class_dir):
+            continue
+        for fname in sorted(os.listdir(class_dir)):
+            if fname.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(class_dir, fname))
+                labels.append(label)
+    return classes, paths, labels
+
+
+def _cache_key(split_dir, paths, cache_format):
+    digest = hashlib.sha256(f"{IMG_SIZE}\0{cache_format}\n".encode())
+    for path in paths:
+        st = os.stat(path)
+        digest.update(f"{os.path.relpath(path, split_dir)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def _decode_with_pil(path):
+    with Image.open(path.decode()) as image:
+        return np.asarray(image.convert("RGB"), dtype=np.uint8)
+
+
+def _decode(path, use_pil):
+    def pil():
+        image = tf.numpy_function(_decode_with_pil, [path], tf.uint8, stateful=False)
+        image.set_shape([None, None, 3])
+        return image
+
+    return tf.cond(use_pil, pil,
+                   lambda: tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False))
+
+
+def _load_resized(path, use_pil, label, cache_format):
+    image = _decode(path, use_pil)
+    # Bicubic with antialiasing, like the PIL resize ml_api serves with
+    image = tf.image.resize(image, IMG_SIZE, method="bicubic", antialias=True)
+    image = tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8)
+    encoded = tf.io.encode_jpeg(image, quality=95) if cache_format == "jpeg" else tf.io.serialize_tensor(image)
+    return encoded, label
+
+
+def cache_shards(split_dir, paths, labels, cache_format="raw", cache_dir=CACHE_DIR, n_shards=CACHE_SHARDS):
+    """
+    Shard files holding every image of split_dir resized to IMG_SIZE, built on
+    first use. "raw" stores uint8 pixels (no decoding per epoch, ~150 KB per
+    image); "jpeg" re-encodes them (~10x smaller, cheap parallel decode).
+    """
+    key = _cache_key(split_dir, paths, cache_format)
+    shard_dir = os.path.join(cache_dir, f"disease-{os.path.basename(split_dir).lower()}-{key}")
+    n_shards = max(1, min(n_shards, len(paths)))
+    shards = [os.path.join(shard_dir, f"shard-{i:03d}-of-{n_shards:03d}.tfrecord") for i in range(n_shards)]
+    if os.path.exists(os.path.join(shard_dir, "complete")):
+        return shards
+
+    # Written to a temporary directory and renamed, so an interrupted run never leaves a partial cache
+    tmp_dir = f"{shard_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    start = time.perf_counter()
+    use_pil = [not p.lower().endswith(TF_DECODED_EXTENSIONS) for p in paths]
+    ds = tf.data.Dataset.from_tensor_slices((paths, use_pil, labels)).map(
+        lambda p, u, l: _load_resized(p, u, l, cache_format), num_parallel_calls=AUTOTUNE)
+    writers = [tf.io.TFRecordWriter(os.path.join(tmp_dir, os.path.basename(s))) for s in shards]
+    try:
+        for i, (encoded, label) in enumerate(ds.as_numpy_iterator()):
+            example = tf.train.Example(features=tf.train.Features(feature={
+                "image": tf.train.Feature(bytes_list=tf.train.BytesList(value=[encoded])),
+                "label": tf.train.Feature(int64_list=tf.train.Int64List(value=[label])),
+            }))
+            writers[i % n_shards].write(example.SerializeToString())
+    finally:
+        for writer in writers:
+            writer.close()
+    with open(os.path.join(tmp_dir, "complete"), "w") as f:
+        json.dump({"images": len(paths), "format": cache_format, "img_size": IMG_SIZE}, f)
+
+    # Drop caches of older versions of this split
+    prefix = f"disease-{os.path.basename(split_dir).lower()}-"
+    if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name.startswith(prefix) and os.path.join(cache_dir, name) not in (shard_dir, tmp_dir):
+                shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    os.replace(tmp_dir, shard_dir)
+    seconds = time.perf_counter() - start
+    print(f"Cached {len(paths)} images from {split_dir} in {seconds:.1f}s ({len(paths) / seconds:.1f} images/s)")
+    return shards
+
+
+# ---------------------------
+# Datasets
+# ---------------------------
+def augment_batch(images):
+    """
+    ImageDataGenerator's augmentation for a whole uint8 batch: rotation
+    (+-30 deg), shifts (+-20%), zoom (0.8-1.2 per axis) and flips combined
+    into one affine warp per image, so every image is resampled once
+    (bilinear, nearest fill), then a brightness factor in [0.8, 1.2].
+    shear_range=0.2 was in degrees there (no visible effect) and is left out.
+    """
+    n = tf.shape(images)[0]
+    h, w = IMG_SIZE
+    angle = tf.random.uniform([n], -30.0, 30.0) * (math.pi / 180.0)
+    zoom_x = tf.random.uniform([n], 0.8, 1.2) * tf.where(tf.random.uniform([n]) < 0.5, -1.0, 1.0)
+    zoom_y = tf.random.uniform([n], 0.8, 1.2) * tf.where(tf.random.uniform([n]) < 0.5, -1.0, 1.0)
+    shift_x = tf.random.uniform([n], -0.2, 0.2) * w
+    shift_y = tf.random.uniform([n], -0.2, 0.2) * h
+    cos, sin = tf.cos(angle), tf.sin(angle)
+
+    # Output pixel -> input pixel: rotate(zoom/flip(p - center) + shift) + center
+    cx, cy = (w - 1) / 2.0, (h - 1) / 2.0
+    a0, a1 = cos * zoom_x, -sin * zoom_y
+    b0, b1 = sin * zoom_x, cos * zoom_y
+    a2 = cx - (a0 * cx + a1 * cy) + (cos * shift_x - sin * shift_y)
+    b2 = cy - (b0 * cx + b1 * cy) + (sin * shift_x + cos * shift_y)
+    zeros = tf.zeros([n])
+    transforms = tf.stack([a0, a1, a2, b0, b1, b2, zeros, zeros], axis=1)
+
+    images = tf.raw_ops.ImageProjectiveTransformV3(
+        images=images, transforms=transforms, output_shape=[h, w], fill_value=0.0,
+        interpolation="BILINEAR", fill_mode="NEAREST")
+    brightness = tf.random.uniform([n, 1, 1, 1], 0.8, 1.2)
+    return tf.clip_by_value(tf.cast(images, tf.float32) * brightness, 0.0, 255.0)
+
+
+def make_dataset(shards, n_classes, n_images, cache_format="raw", training=False, repeat=False):
+    features = {"image": tf.io.FixedLenFeature([], tf.string), "label": tf.io.FixedLenFeature([], tf.int64)}
+
+    def parse(record):
+        example = tf.io.parse_single_example(record, features)
+        if cache_format == "jpeg":
+            image = tf.io.decode_jpeg(example["image"], channels=3)
+        else:
+            image = tf.io.parse_tensor(example["image"], tf.uint8)
+        return tf.ensure_shape(image, (*IMG_SIZE, 3)), example["label"]
+
+    ds = tf.data.Dataset.from_tensor_slices(shards)
+    if training:
+        ds = ds.shuffle(len(shards))
+    ds = ds.interleave(tf.data.TFRecordDataset, cycle_length=len(shards),
+                       num_parallel_calls=AUTOTUNE, deterministic=not training)
+    if training:
+        ds = ds.shuffle(SHUFFLE_BUFFER)
+    if repeat:
+        ds = ds.repeat()
+    # Batches stay uint8 until augmentation (a quarter of the float32 copying)
+    ds = ds.map(parse, num_parallel_calls=AUTOTUNE).batch(BATCH_SIZE, num_parallel_calls=AUTOTUNE)
+    if not repeat:
+        # Known epoch length (Keras would otherwise find it by running out of data)
+        ds = ds.apply(tf.data.experimental.assert_cardinality(math.ceil(n_images / BATCH_SIZE)))
+    augment = augment_batch if training else (lambda x: tf.cast(x, tf.float32))
+    ds = ds.map(lambda x, y: (preprocess_input(augment(x)), tf.one_hot(y, n_classes)), num_parallel_calls=AUTOTUNE)
+    return ds.prefetch(AUTOTUNE)
+
+
+class ImagesPerSecond(tf.keras.callbacks.Callback):
+    """Training images per second of every epoch (validation excluded)."""
+
+    def __init__(self, batch_size, epoch_images=None):
+        super().__init__()
+        self.batch_size = batch_size
+        # Full epochs end with a partial batch, so their exact size is passed in
+        self.epoch_images = epoch_images
+        self.epochs = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = self.end = time.perf_counter()
+        self.batches = 0
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.batches += 1
+        self.end = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        images = self.batches * self.batch_size
+        if self.epoch_images:
+            images = min(images, self.epoch_images)
+        seconds = max(self.end - self.start, 1e-9)
+        self.epochs.append(images / seconds)
+        print(f"Epoch {epoch + 1}: {images / seconds:.1f} images/s ({images} images in {seconds:.1f}s)")
+
+
+def benchmark_input(ds, batches):
+    """Images per second the input pipeline alone delivers (first batch excluded as warm-up)."""
+    iterator = iter(ds)
+    next(iterator)
+    start = time.perf_counter()
+    images = 0
+    for _ in range(batches):
+        x, _ = next(iterator)
+        images += int(x.shape[0])
+    seconds = time.perf_counter() - start
+    print(f"Input pipeline: {images / seconds:.1f} images/s ({images} images in {seconds:.2f}s)")
+    return images / seconds
+
+
+def train_model(argv=None):
+    parser = argparse.ArgumentParser(description="Train the MobileNetV2 plant disease classifier")
+    parser.add_argument("--train-dir", default=TRAIN_DIR)
+    parser.add_argument("--val-dir", default=VAL_DIR)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--fine-tune-epochs", type=int, default=FINE_TUNE_EPOCHS)
+    parser.add_argument("--steps-per-epoch", type=int, help="cap batches per epoch (default: full epochs)")
+    parser.add_argument("--validation-steps", type=int, help="cap validation batches (default: whole set)")
+    parser.add_argument("--cache-format", choices=["raw", "jpeg"], default="raw")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--models-dir", default=os.path.dirname(MODEL_SAVE_PATH))
+    parser.add_argument("--benchmark-input", type=int, metavar="BATCHES",
+                        help="only time the training input pipeline over this many batches")
+    args = parser.parse_args(argv)
+    model_save_path = os.path.join(args.models_dir, os.path.basename(MODEL_SAVE_PATH))
+    backup_dir = os.path.join(args.models_dir, os.path.basename(BACKUP_DIR))
+    classes_save_path = os.path.join(args.models_dir, os.path.basename(CLASSES_SAVE_PATH))
+    report = StageReport()
 
-def train_model():
     print("Loading dataset...")
-    # Advanced Data Augmentation for Better Generalization
-    train_datagen = ImageDataGenerator(
-        preprocessing_function=preprocess_input,
-        rotation_range=30,
-        width_shift_range=0.2,
-        height_shift_range=0.2,
-        shear_range=0.2,
-        zoom_range=0.2,
-        horizontal_flip=True,
-        vertical_flip=True,
-        fill_mode='nearest',
-        brightness_range=[0.8, 1.2]
-    )
-    
-    val_datagen = ImageDataGenerator(preprocessing_function=preprocess_input)
-
-    train_generator = train_datagen.flow_from_directory(
-        TRAIN_DIR,
-        target_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
-        class_mode='categorical'
-    )
+    classes, train_paths, train_labels = list_images(args.train_dir)
+    _, val_paths, val_labels = list_images(args.val_dir, classes)
+    print(f"Found {len(train_paths)} training and {len(val_paths)} validation images")
 
-    val_generator = val_datagen.flow_from_directory(
-        VAL_DIR,
-        target_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
-        class_mode='categorical'
-    )
+    with report.stage("cache"):
+        train_shards = cache_shards(args.train_dir, train_paths, train_labels, args.cache_format, args.cache_dir)
+        val_shards = cache_shards(args.val_dir, val_paths, val_labels, args.cache_format, args.cache_dir)
+
+    # A capped epoch must not exhaust the dataset, so it repeats
+    train_ds = make_dataset(train_shards, len(classes), len(train_paths), args.cache_format, training=True,
+                            repeat=args.steps_per_epoch is not None or args.benchmark_input is not None)
+    val_ds = make_dataset(val_shards, len(classes), len(val_paths), args.cache_format,
+                          repeat=args.validation_steps is not None)
+
+    if args.benchmark_input:
+        with report.stage("benchmark_input"):
+            benchmark_input(train_ds, args.benchmark_input)
+        report.print()
+        return
 
-    classes = list(train_generator.class_indices.keys())
-    os.makedirs(os.path.dirname(CLASSES_SAVE_PATH), exist_ok=True)
-    with open(CLASSES_SAVE_PATH, 'w') as f:
+    os.makedirs(args.models_dir, exist_ok=True)
+    with open(classes_save_path, 'w') as f:
         json.dump(classes, f)
-    print(f"Found {len(classes)} classes. Saved to {CLASSES_SAVE_PATH}")
+    print(f"Found {len(classes)} classes. Saved to {classes_save_path}")
+
+    if os.path.exists(model_save_path):
+        print(f"Resuming training! Found existing model at {model_save_path}")
+        model = tf.keras.models.load_model(model_save_path)
 
-    if os.path.exists(MODEL_SAVE_PATH):
-        print(f"Resuming training! Found existing model at {MODEL_SAVE_PATH}")
-        model = tf.keras.models.load_model(MODEL_SAVE_PATH)
-        
         # Locate the base MobileNetV2 layer for fine-tuning reference
         for layer in model.layers:
             if layer.name == 'mobilenetv2_1.00_224' or isinstance(layer, Model):
@@ -73,45 +322,45 @@ def train_model():
         print("Building MobileNetV2 Transfer Learning Model...")
         # Base model with pre-trained weights
         base_model = MobileNetV2(
-            weights='imagenet', 
-            include_top=False, 
+            weights='imagenet',
+            include_top=False,
             input_shape=(IMG_SIZE[0], IMG_SIZE[1], 3)
         )
-        
+
         # Freeze the base model layers initially
         base_model.trainable = False
-        
+
         # Custom head
         x = base_model.output
         x = GlobalAveragePooling2D()(x)
         x = Dense(512, activation='relu')(x)
         x = Dropout(0.5)(x)
         predictions = Dense(len(classes), activation='softmax')(x)
-        
+
         model = Model(inputs=base_model.input, outputs=predictions)
 
         model.compile(
-            optimizer=tf.keras.optimizers.Adam(learning_rate=0.001), 
-            loss='categorical_crossentropy', 
+            optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
+            loss='categorical_crossentropy',
             metrics=['accuracy']
         )
 
     # Callbacks for better training
     checkpoint = ModelCheckpoint(
-        MODEL_SAVE_PATH,
+        model_save_path,
         monitor='val_accuracy',
         save_best_only=True,
         mode='max',
         verbose=1
     )
-    
+
     early_stopping = EarlyStopping(
         monitor='val_accuracy',
         patience=5,
         restore_best_weights=True,
         verbose=1
     )
-    
+
     reduce_lr = ReduceLROnPlateau(
         monitor='val_loss',
         factor=0.2,
@@ -119,51 +368,58 @@ def train_model():
         min_lr=1e-6,
         verbose=1
     )
-    
+
     backup_restore = BackupAndRestore(
-        backup_dir=BACKUP_DIR,
+        backup_dir=backup_dir,
         save_freq="epoch"
     )
 
-    print(f"Starting training for {EPOCHS} epochs...")
-    history = model.fit(
-        train_generator,
-        epochs=EPOCHS,
-        steps_per_epoch=150, # Greatly speeds up epoch completion (runs ~1 hour)
-        validation_data=val_generator,
-        validation_steps=50,
-        callbacks=[checkpoint, early_stopping, reduce_lr, backup_restore]
-    )
-    
+    throughput = ImagesPerSecond(BATCH_SIZE, None if args.steps_per_epoch else len(train_paths))
+
+    print(f"Starting training for {args.epochs} epochs...")
+    with report.stage("train"):
+        history = model.fit(
+            train_ds,
+            epochs=args.epochs,
+            steps_per_epoch=args.steps_per_epoch,
+            validation_data=val_ds,
+            validation_steps=args.validation_steps,
+            callbacks=[checkpoint, early_stopping, reduce_lr, backup_restore, throughput]
+        )
+
     # Optional: Fine-tuning step (unfreeze last 30 layers)
     print("Base training complete. Starting fine-tuning...")
     base_model.trainable = True
     # Freeze all layers except the last 30
     for layer in base_model.layers[:-30]:
         layer.trainable = False
-        
+
     # Re-freeze all BatchNormalization layers to prevent moving mean/variance from updating
     for layer in base_model.layers:
         if isinstance(layer, tf.keras.layers.BatchNormalization):
             layer.trainable = False
-        
+
     model.compile(
         optimizer=tf.keras.optimizers.Adam(learning_rate=1e-5), # Very low learning rate
         loss='categorical_crossentropy',
         metrics=['accuracy']
     )
-    
-    model.fit(
-        train_generator,
-        epochs=EPOCHS + 5, # 5 more epochs of fine-tuning (start from offset)
-        initial_epoch=EPOCHS,
-        steps_per_epoch=150,
-        validation_data=val_generator,
-        validation_steps=50,
-        callbacks=[checkpoint, early_stopping, reduce_lr, backup_restore]
-    )
-    
-    print(f"Final model saved to {MODEL_SAVE_PATH}")
+
+    with report.stage("fine_tune"):
+        model.fit(
+            train_ds,
+            epochs=args.epochs + args.fine_tune_epochs, # more epochs of fine-tuning (start from offset)
+            initial_epoch=args.epochs,
+            steps_per_epoch=args.steps_per_epoch,
+            validation_data=val_ds,
+            validation_steps=args.validation_steps,
+            callbacks=[checkpoint, early_stopping, reduce_lr, backup_restore, throughput]
+        )
+
+    print(f"Final model saved to {model_save_path}")
+    if throughput.epochs:
+        print(f"Training throughput: {sum(throughput.epochs) / len(throughput.epochs):.1f} images/s on average")
+    report.print()
 
 if __name__ == "__main__":
     train_model()
@@ -1,4 +1,5 @@
 import os
+import argparse
 import pandas as pd
 import numpy as np
 import pickle
@@ -6,142 +7,143 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report
+from crop_mapping import PROD_TO_SOIL_MAP, normalize_crop_name
+from model_bundle import save_bundle
+from stage_report import StageReport
 
 # Setup paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODELS_DIR = os.path.join(BASE_DIR, "models")
 DATASETS_DIR = os.path.join(BASE_DIR, "datasets")
-os.makedirs(MODELS_DIR, exist_ok=True)
+
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall', 'Season_Encoded']
+TARGET = 'label_encoded'
+
+# Crops without any season in the production data (e.g. coffee) are kept,
+# assigned to 'Whole Year' so they stay recommendable anytime
+DEFAULT_SEASON = 'Whole Year'
+
 
 # 1. Load Datasets
-print("Loading datasets...")
-df_soil = pd.read_csv(os.path.join(DATASETS_DIR, "Crop_recommendation.csv"))
-df_prod = pd.read_csv(os.path.join(DATASETS_DIR, "Indian_crop_production_yield_dataset.csv"))
+def load_soil(path):
+    return pd.read_csv(path)
+
+
+def load_production(path):
+    # Only the columns needed for the crop -> season sets; as categories the
+    # groupby below works on small integer codes
+    return pd.read_csv(path, usecols=['Crop', 'Season'], dtype='category')
+
 
 # 2. Normalize and Map Crop Names
-print("Normalizing crop names...")
-
-# MAPPING DICTIONARY (Model Name -> Dataset Name) from analysis
-CROP_NAME_MAPPING = {
-    'chickpea': ['gram', 'bengal gram'],
-    'kidneybeans': ['rajmash kholar', 'rajma', 'beans & mutter(vegetable)'],
-    'mothbeans': ['moth'],
-    'mungbean': ['moong(green gram)'],
-    'blackgram': ['urad'],
-    'lentil': ['masoor'],
-    'pigeonpeas': ['arhar/tur', 'redgram'],
-    'cotton': ['cotton(lint)', 'kapas'],
-    'jute': ['jute & mesta'],
-    'pomegranate': ['pome granet', 'pomegranate'],
-    'watermelon': ['water melon'],
-    'muskmelon': ['musk melon'],
-    'apple': ['apple'],
-    'orange': ['citrus fruit', 'orange'],
-    'papaya': ['papaya'],
-    'coconut': ['coconut'],
-    'grapes': ['grapes'],
-    'banana': ['banana'],
-    'maize': ['maize'],
-    'rice': ['rice', 'paddy'],
-    'coffee': ['coffee'],
-    'tea': ['tea']
-}
-
-# Invert mapping for easier lookup: production_name -> soil_name
-PROD_TO_SOIL_MAP = {}
-for soil_name, prod_names in CROP_NAME_MAPPING.items():
-    for pn in prod_names:
-        PROD_TO_SOIL_MAP[pn] = soil_name
-
-# Get unique valid seasons per crop from Production Dataset
-# We map production names back to soil names to link them
-crop_seasons = {}
-
-# Clean and normalize Production Dataset
-df_prod['Crop'] = df_prod['Crop'].astype(str).str.lower().str.strip()
-df_prod['Season'] = df_prod['Season'].astype(str).str.strip()
-
-for crop in df_prod['Crop'].unique():
-    # Determine the 'Standard' (Soil DB) name for this crop
-    std_name = crop # Default
-    if crop in PROD_TO_SOIL_MAP:
-        std_name = PROD_TO_SOIL_MAP[crop]
-    
-    # Get all seasons this crop is grown in
-    seasons = df_prod[df_prod['Crop'] == crop]['Season'].unique()
-    valid_seasons = [s for s in seasons if s.lower() != 'nan' and s.lower() != 'whole year']
-    
-    if std_name not in crop_seasons:
-        crop_seasons[std_name] = set()
-    
-    for s in valid_seasons:
-        crop_seasons[std_name].add(s)
-
-# Manual overrides for crops that might be missing or 'Whole Year'
-# This ensures we don't drop crops completely if season data is messy
-FALLBACK_SEASONS = ['Kharif', 'Rabi', 'Summer', 'Winter', 'Autumn'] 
-
-print(f"Mapped seasons for {len(crop_seasons)} crops.")
+def crop_season_pairs(df_prod):
+    """
+    Unique (crop, Season) pairs grown in the production data, crop in soil
+    dataset (model label) naming, sorted so training data is reproducible.
+    """
+    # One groupby over the category codes; names are cleaned afterwards, on
+    # the few hundred distinct pairs instead of every production row
+    pairs = df_prod.groupby(['Crop', 'Season'], observed=True).size().reset_index()[['Crop', 'Season']]
+    crop = pairs['Crop'].astype(str).map(normalize_crop_name)
+    pairs = pd.DataFrame({
+        # Map production names back to soil names to link them
+        'crop': crop.map(PROD_TO_SOIL_MAP).fillna(crop),
+        'Season': pairs['Season'].astype(str).str.strip(),
+    })
+    # 'Whole Year' is not a season to augment with
+    pairs = pairs[~pairs['Season'].str.lower().isin(['nan', 'whole year'])]
+    return pairs.drop_duplicates().sort_values(['crop', 'Season'], ignore_index=True)
+
 
 # 3. Augment Soil Dataset with Seasons
-print("Augmenting training data with Seasons...")
-
-augmented_rows = []
-
-for _, row in df_soil.iterrows():
-    crop = row['label'].lower().strip()
-    
-    # Get valid seasons for this crop
-    if crop in crop_seasons and crop_seasons[crop]:
-        seasons_for_crop = list(crop_seasons[crop])
-    else:
-        # If no specific season found (e.g. coffee usually doesn't have season in this DB), 
-        # distinct "Whole Year" or generic approach?
-        # Let's assign it to ALL major seasons so it's recommendable anytime 
-        # (or maybe 'Whole Year' if we support that label)
-        seasons_for_crop = ['Whole Year'] 
-    
-    for season in seasons_for_crop:
-        new_row = row.copy()
-        new_row['Season'] = season
-        augmented_rows.append(new_row)
-
-df_augmented = pd.DataFrame(augmented_rows)
-
-print(f"Original Size: {len(df_soil)}")
-print(f"Augmented Size: {len(df_augmented)}")
+def augment_with_seasons(df_soil, pairs):
+    """One copy of every soil row per season its crop is grown in (DEFAULT_SEASON if none)."""
+    keys = df_soil['label'].str.lower().str.strip().rename('crop')
+    # Left merge keeps the soil row order, each row expanded over its crop's seasons
+    df_augmented = df_soil.assign(crop=keys).merge(pairs, on='crop', how='left', sort=False)
+    df_augmented['Season'] = df_augmented['Season'].fillna(DEFAULT_SEASON)
+    return df_augmented.drop(columns='crop')
+
 
 # 4. Encoders & Training
-print("Training Model...")
+def train(df_augmented, n_estimators=200):
+    # Features: N, P, K, temperature, humidity, ph, rainfall, Season
+    # Season needs encoding
+    season_le = LabelEncoder()
+    df_augmented['Season_Encoded'] = season_le.fit_transform(df_augmented['Season'])
 
-# Features: N, P, K, temperature, humidity, ph, rainfall, Season
-# Season needs encoding
-season_le = LabelEncoder()
-df_augmented['Season_Encoded'] = season_le.fit_transform(df_augmented['Season'])
+    # Crop Label Encoding
+    crop_le = LabelEncoder()
+    df_augmented['label_encoded'] = crop_le.fit_transform(df_augmented['label'])
 
-# Crop Label Encoding
-crop_le = LabelEncoder()
-df_augmented['label_encoded'] = crop_le.fit_transform(df_augmented['label'])
+    X = df_augmented[FEATURES]
+    y = df_augmented[TARGET]
 
-FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall', 'Season_Encoded']
-TARGET = 'label_encoded'
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
 
-X = df_augmented[FEATURES]
-y = df_augmented[TARGET]
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=42, n_jobs=-1)
+    model.fit(X_train, y_train)
+    return model, crop_le, season_le, (X_test, y_test)
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-
-model = RandomForestClassifier(n_estimators=200, random_state=42, n_jobs=-1)
-model.fit(X_train, y_train)
 
 # 5. Evaluation & Saving
-y_pred = model.predict(X_test)
-acc = accuracy_score(y_test, y_pred)
-print(f"Model Accuracy: {acc * 100:.2f}%")
-
-# Save artifacts
-pickle.dump(model, open(os.path.join(MODELS_DIR, "crop_model.pkl"), "wb"))
-pickle.dump(crop_le, open(os.path.join(MODELS_DIR, "crop_label_encoder.pkl"), "wb"))
-pickle.dump(season_le, open(os.path.join(MODELS_DIR, "season_label_encoder.pkl"), "wb"))
-
-print("Model and Encoders saved successfully.")
+def save(models_dir, model, crop_le, season_le, metadata):
+    os.makedirs(models_dir, exist_ok=True)
+    pickle.dump(model, open(os.path.join(models_dir, "crop_model.pkl"), "wb"))
+    pickle.dump(crop_le, open(os.path.join(models_dir, "crop_label_encoder.pkl"), "wb"))
+    pickle.dump(season_le, open(os.path.join(models_dir, "season_label_encoder.pkl"), "wb"))
+
+    # Memory-mappable bundle served by ml_api
+    save_bundle(
+        os.path.join(models_dir, "crop"), "crop", model, FEATURES,
+        {"crop_label": crop_le, "season": season_le},
+        metadata=metadata
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the season-aware crop recommendation model")
+    parser.add_argument("--soil", default=os.path.join(DATASETS_DIR, "Crop_recommendation.csv"))
+    parser.add_argument("--production", default=os.path.join(DATASETS_DIR, "Indian_crop_production_yield_dataset.csv"))
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--n-estimators", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    report = StageReport()
+
+    print("Loading datasets...")
+    with report.stage("load"):
+        df_soil = load_soil(args.soil)
+        df_prod = load_production(args.production)
+
+    print("Normalizing crop names...")
+    with report.stage("crop_seasons"):
+        pairs = crop_season_pairs(df_prod)
+    del df_prod
+    print(f"Mapped seasons for {pairs['crop'].nunique()} crops.")
+
+    print("Augmenting training data with Seasons...")
+    with report.stage("augment"):
+        df_augmented = augment_with_seasons(df_soil, pairs)
+    print(f"Original Size: {len(df_soil)}")
+    print(f"Augmented Size: {len(df_augmented)}")
+
+    print("Training Model...")
+    with report.stage("train"):
+        model, crop_le, season_le, (X_test, y_test) = train(df_augmented, args.n_estimators)
+
+    with report.stage("evaluate"):
+        y_pred = model.predict(X_test)
+        acc = accuracy_score(y_test, y_pred)
+    print(f"Model Accuracy: {acc * 100:.2f}%")
+
+    with report.stage("save"):
+        save(args.models_dir, model, crop_le, season_le,
+             {"accuracy": acc, "augmented_rows": len(df_augmented)})
+
+    print("Model and Encoders saved successfully.")
+    report.print()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import pickle
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score
+from model_bundle import save_bundle
 
 # Create models folder
 os.makedirs("models", exist_ok=True)
@@ -39,6 +40,11 @@ model = RandomForestClassifier(
 
 model.fit(X_train, y_train)
 
-print("Accuracy:", accuracy_score(y_test, model.predict(X_test)))
+acc = accuracy_score(y_test, model.predict(X_test))
+print("Accuracy:", acc)
 
 pickle.dump(model, open("models/fertilizer_model.pkl", "wb"))
+
+# Memory-mappable bundle served by ml_api (model was fit on label strings,
+# so its classes_ double as the label encoder)
+save_bundle("models/fertilizer", "fertilizer", model, FEATURES, {"fertilizer_label": model.classes_}, metadata={"accuracy": acc})
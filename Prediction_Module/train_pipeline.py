@@ -0,0 +1,534 @@
+import os
+import sys
+import json
+import math
+import time
+import pickle
+import hashlib
+import argparse
+import subprocess
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from model_bundle import save_bundle, bundle_exists
+from stage_report import StageReport
+
+# Training orchestrator for the served models (crop, yield, fertilizer and
+# the disease CNN), replacing one-off runs of the train_*.py scripts.
+#
+#   - Inputs are fingerprinted (size + sha256); a model whose inputs, settings
+#     and artifacts are unchanged since its last run is skipped.
+#   - Cleaned, encoded feature matrices are cached in train_cache/ as
+#     <model>-<key>.npz, keyed by the input hashes and PREP_VERSION, so
+#     retraining with other settings never re-parses the CSVs.
+#   - Models that need training run concurrently, each with an equal share of
+#     the CPUs (cpu_count / workers): forests on a process pool (n_jobs threads
+#     each), the disease CNN as a subprocess next to it, pinned to its own
+#     share. With --workers 1 the disease model trains after the forests.
+#   - When every changed input only had rows appended (the previous file,
+#     ending in a newline, is a byte prefix of the new one), forests are grown
+#     with warm_start: the old
+#     trees are kept and new trees, in proportion to the new rows, are fit on
+#     the full training split. Falls back to a full retrain when encoders or
+#     classes change, or once a forest would exceed MAX_TREE_GROWTH times its
+#     base size.
+#   - The train/test split is a hash of each row's contents, so rows keep
+#     their side across appends and incremental trees never train on rows the
+#     old trees were tested on.
+#   - Training time per stage, row counts and metrics go into the bundle
+#     manifest metadata; the run state is kept in models/training_state.json.
+# Usage: python train_pipeline.py [crop yield fertilizer disease] [--force] [--full]
+#                                 [--workers N] [--datasets-dir DIR] [--models-dir DIR]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+DATASETS_DIR = os.path.join(BASE_DIR, "datasets")
+CACHE_DIR = os.path.join(BASE_DIR, "train_cache")
+STATE_NAME = "training_state.json"
+
+# Bump when a _prepare_* function changes, to invalidate cached matrices
+PREP_VERSION = 1
+RANDOM_STATE = 42
+# Rows whose content hash is divisible by this are the test split (20%)
+TEST_MODULUS = 5
+# Incremental runs add at least MIN_ADDED_TREES trees and may grow a forest
+# to MAX_TREE_GROWTH times its base n_estimators before a full retrain
+MIN_ADDED_TREES = 10
+MAX_TREE_GROWTH = 2.0
+
+CROP_FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall', 'Season_Encoded']
+YIELD_FEATURES = ['soil_moisture', 'ph', 'temperature', 'rainfall', 'humidity', 'NDVI_index', 'total_days']
+FERTILIZER_FEATURES = ['N', 'P', 'K', 'temperature', 'ph', 'rainfall']
+
+# Forest targets: input files (role -> file in the datasets dir), estimator,
+# artifacts written (pickles next to the bundle, as the train_*.py scripts do)
+# and which prepared encoders are also pickled as LabelEncoders
+TARGETS = {
+    "crop": {
+        "inputs": {"soil": "Crop_recommendation.csv", "production": "Indian_crop_production_yield_dataset.csv"},
+        "prepare": "_prepare_crop",
+        "estimator": "classifier",
+        "n_estimators": 200,
+        "features": CROP_FEATURES,
+        "model_pickle": "crop_model.pkl",
+        "encoder_pickles": {"crop_label": "crop_label_encoder.pkl", "season": "season_label_encoder.pkl"},
+    },
+    "yield": {
+        "inputs": {"survey": "Smart_Farming_Crop_Yield_2024.csv"},
+        "prepare": "_prepare_yield",
+        "estimator": "regressor",
+        "n_estimators": 300,
+        "features": YIELD_FEATURES,
+        "model_pickle": "yield_model.pkl",
+        "encoder_pickles": {},
+    },
+    "fertilizer": {
+        "inputs": {"survey": "Crop_and_fertilizer_dataset.csv"},
+        "prepare": "_prepare_fertilizer",
+        "estimator": "classifier",
+        "n_estimators": 300,
+        "features": FERTILIZER_FEATURES,
+        "model_pickle": "fertilizer_model.pkl",
+        "encoder_pickles": {},
+    },
+}
+
+# The disease CNN is trained by its own script (TensorFlow) in a subprocess;
+# only its skip-if-unchanged bookkeeping is shared
+DISEASE_TARGET = {
+    "script": "train_disease_model.py",
+    "dataset_dir": os.path.join(os.path.dirname(BASE_DIR), "Disease_Detection", "Plant Village Dataset"),
+    "artifacts": ["disease_model.keras", "disease_classes.json"],
+}
+
+
+# ---------------------------
+# Feature preparation (cached)
+# ---------------------------
+def _prepare_crop(paths):
+    import train_enhanced_crop_model as crop
+    pairs = crop.crop_season_pairs(crop.load_production(paths["production"]))
+    df = crop.augment_with_seasons(crop.load_soil(paths["soil"]), pairs)
+    # np.unique is LabelEncoder's classes_, so codes match a fitted encoder
+    season_classes = np.unique(df['Season'].to_numpy(dtype=str))
+    crop_classes = np.unique(df['label'].to_numpy(dtype=str))
+    df['Season_Encoded'] = np.searchsorted(season_classes, df['Season'].to_numpy(dtype=str))
+    y = np.searchsorted(crop_classes, df['label'].to_numpy(dtype=str))
+    return df[CROP_FEATURES].to_numpy(dtype=float), y, {"crop_label": crop_classes, "season": season_classes}
+
+
+def _prepare_yield(paths):
+    import pandas as pd
+    df = pd.read_csv(paths["survey"]).rename(columns={
+        'soil_moisture_%': 'soil_moisture',
+        'soil_pH': 'ph',
+        'temperature_C': 'temperature',
+        'rainfall_mm': 'rainfall',
+        'humidity_%': 'humidity'
+    })
+    return df[YIELD_FEATURES].to_numpy(dtype=float), df['yield_kg_per_hectare'].to_numpy(dtype=float), {}
+
+
+def _prepare_fertilizer(paths):
+    import pandas as pd
+    df = pd.read_csv(paths["survey"]).rename(columns={
+        'Nitrogen': 'N',
+        'Phosphorus': 'P',
+        'Potassium': 'K',
+        'Temperature': 'temperature',
+        'pH': 'ph',
+        'Rainfall': 'rainfall'
+    })
+    y = df['Fertilizer'].to_numpy(dtype=str)
+    # Fit on label strings: the model's classes_ double as the label encoder
+    return df[FERTILIZER_FEATURES].to_numpy(dtype=float), y, {"fertilizer_label": np.unique(y)}
+
+
+def _cache_key(name, inputs):
+    key = json.dumps({"name": name, "prep": PREP_VERSION,
+                      "inputs": {role: fp["sha256"] for role, fp in sorted(inputs.items())}})
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def load_features(name, paths, cache_path):
+    """(X, y, encoders, cache hit) from cache_path, preparing and caching them on a miss."""
+    if os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as data:
+            encoders = {k[len("encoder_"):]: data[k] for k in data.files if k.startswith("encoder_")}
+            return data["X"], data["y"], encoders, True
+
+    X, y, encoders = globals()[TARGETS[name]["prepare"]](paths)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.tmp.npz"
+    np.savez(tmp_path, X=X, y=y, **{f"encoder_{k}": v for k, v in encoders.items()})
+    os.replace(tmp_path, cache_path)
+    # Matrices of older inputs are no longer reachable
+    prefix = f"{name}-"
+    for fname in os.listdir(os.path.dirname(cache_path)):
+        if fname.startswith(prefix) and fname.endswith(".npz") and os.path.join(os.path.dirname(cache_path), fname) != cache_path:
+            os.remove(os.path.join(os.path.dirname(cache_path), fname))
+    return X, y, encoders, False
+
+
+def split_mask(X, y):
+    """Stable train/test split: a row's side depends only on its contents."""
+    import pandas as pd
+    rows = pd.DataFrame(X).assign(target=y)
+    return pd.util.hash_pandas_object(rows, index=False).to_numpy() % TEST_MODULUS == 0
+
+
+# ---------------------------
+# Fingerprints
+# ---------------------------
+def file_fingerprint(path, prefix_size=0):
+    """
+    ({"size", "sha256"}, sha256 of the first prefix_size bytes or None), in one
+    read. The prefix hash is None unless those bytes end with a newline: bytes
+    appended after an unterminated last row continue that row (changing it)
+    instead of adding rows.
+    """
+    digest = hashlib.sha256()
+    prefix = None
+    with open(path, "rb") as f:
+        if prefix_size:
+            remaining = prefix_size
+            chunk = b""
+            while remaining:
+                chunk = f.read(min(1 << 20, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+            if not remaining and chunk.endswith(b"\n"):
+                prefix = digest.copy().hexdigest()
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return {"size": os.path.getsize(path), "sha256": digest.hexdigest()}, prefix
+
+
+def directory_fingerprint(path):
+    """Hash of every file's relative path, size and mtime (image folders are too big to read)."""
+    digest = hashlib.sha256()
+    count = 0
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for fname in sorted(files):
+            st = os.stat(os.path.join(root, fname))
+            digest.update(f"{os.path.relpath(os.path.join(root, fname), path)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+            count += 1
+    return {"files": count, "sha256": digest.hexdigest()}
+
+
+def _encoders_sha(encoders):
+    digest = hashlib.sha256()
+    for k in sorted(encoders):
+        digest.update(k.encode())
+        digest.update(np.asarray(encoders[k]).astype(str).tobytes())
+    return digest.hexdigest()[:16]
+
+
+# ---------------------------
+# Planning
+# ---------------------------
+def _config(name):
+    spec = TARGETS[name]
+    return {"prep_version": PREP_VERSION, "n_estimators": spec["n_estimators"], "random_state": RANDOM_STATE}
+
+
+def plan_forest(name, previous, datasets_dir, models_dir, force, allow_incremental):
+    """What to do for a forest target: {"action": skip|full|incremental|missing, ...}."""
+    spec = TARGETS[name]
+    paths = {role: os.path.join(datasets_dir, fname) for role, fname in spec["inputs"].items()}
+    missing = [p for p in paths.values() if not os.path.exists(p)]
+    if missing:
+        return {"action": "missing", "reason": f"input not found: {', '.join(missing)}"}
+
+    prev_inputs = (previous or {}).get("inputs", {})
+    inputs, changed, appended_only = {}, False, True
+    for role, path in paths.items():
+        prev = prev_inputs.get(role)
+        fp, prefix = file_fingerprint(path, prev["size"] if prev else 0)
+        inputs[role] = fp
+        if prev is None or fp["sha256"] != prev["sha256"]:
+            changed = True
+            if prev is None or not (fp["size"] > prev["size"] and prefix == prev["sha256"]):
+                appended_only = False
+
+    artifacts = os.path.exists(os.path.join(models_dir, spec["model_pickle"])) and bundle_exists(os.path.join(models_dir, name))
+    same_config = previous is not None and previous.get("config") == _config(name)
+    plan = {"paths": paths, "inputs": inputs, "config": _config(name), "previous": previous}
+
+    if not force and not changed and same_config and artifacts:
+        return {**plan, "action": "skip", "reason": "inputs and settings unchanged"}
+    if allow_incremental and not force and changed and appended_only and same_config and artifacts:
+        return {**plan, "action": "incremental", "reason": "rows appended to " +
+                ", ".join(r for r in inputs if inputs[r]["sha256"] != prev_inputs[r]["sha256"])}
+    if force:
+        reason = "forced"
+    elif previous is None:
+        reason = "no previous run"
+    elif not same_config:
+        reason = "settings changed"
+    elif not artifacts:
+        reason = "artifacts missing"
+    else:
+        reason = "inputs changed"
+    return {**plan, "action": "full", "reason": reason}
+
+
+# ---------------------------
+# Training (pool workers)
+# ---------------------------
+def _load_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def _new_forest(spec, n_jobs):
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+    cls = RandomForestClassifier if spec["estimator"] == "classifier" else RandomForestRegressor
+    return cls(n_estimators=spec["n_estimators"], random_state=RANDOM_STATE, n_jobs=n_jobs)
+
+
+def _incremental_blocker(spec, model, previous, encoders, y_train):
+    """Why warm_start cannot extend model with this data (None if it can)."""
+    if previous.get("encoders_sha") != _encoders_sha(encoders):
+        return "encoders changed"
+    if spec["estimator"] == "classifier" and not np.array_equal(np.unique(y_train), np.asarray(model.classes_)):
+        return "classes changed"
+    if len(y_train) <= previous.get("train_rows", 0):
+        return "no new training rows"
+    return None
+
+
+def _metrics(spec, model, X_test, y_test):
+    from sklearn.metrics import accuracy_score, r2_score, mean_absolute_error
+    y_pred = model.predict(X_test)
+    if spec["estimator"] == "classifier":
+        return {"accuracy": float(accuracy_score(y_test, y_pred))}
+    return {"r2": float(r2_score(y_test, y_pred)), "mae": float(mean_absolute_error(y_test, y_pred))}
+
+
+def train_forest(name, plan, models_dir, cache_dir, n_jobs):
+    """Runs one forest target end to end; returns its new state entry."""
+    spec = TARGETS[name]
+    previous = plan["previous"] or {}
+    report = StageReport()
+    start = time.perf_counter()
+    mode, fallback = plan["action"], None
+
+    with report.stage(f"{name}:features"):
+        cache_path = os.path.join(cache_dir, f"{name}-{_cache_key(name, plan['inputs'])}.npz")
+        X, y, encoders, cache_hit = load_features(name, plan["paths"], cache_path)
+        test = split_mask(X, y)
+        X_train, y_train, X_test, y_test = X[~test], y[~test], X[test], y[test]
+
+    model, added = None, spec["n_estimators"]
+    if mode == "incremental":
+        with report.stage(f"{name}:load_model"):
+            model = _load_pickle(os.path.join(models_dir, spec["model_pickle"]))
+
+    with report.stage(f"{name}:fit"):
+        if mode == "incremental":
+            n_old = len(model.estimators_)
+            new_rows = len(y_train) - previous.get("train_rows", 0)
+            added = max(MIN_ADDED_TREES, math.ceil(spec["n_estimators"] * new_rows / max(1, previous.get("train_rows", 1))))
+            fallback = _incremental_blocker(spec, model, previous, encoders, y_train)
+            if fallback is None and n_old + added > MAX_TREE_GROWTH * spec["n_estimators"]:
+                fallback = f"forest would grow past {MAX_TREE_GROWTH:g}x {spec['n_estimators']} trees"
+            if fallback is None:
+                # Old trees are kept as they are; the added ones are fit on the whole
+                # training split, appended rows included
+                model.set_params(warm_start=True, n_estimators=n_old + added, n_jobs=n_jobs)
+                model.fit(X_train, y_train)
+                model.set_params(warm_start=False)
+            else:
+                mode, model, added = "full", None, spec["n_estimators"]
+        if model is None:
+            model = _new_forest(spec, n_jobs)
+            model.fit(X_train, y_train)
+
+    with report.stage(f"{name}:evaluate"):
+        metrics = _metrics(spec, model, X_test, y_test)
+
+    training = {
+        "mode": mode,
+        "reason": fallback or plan["reason"],
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+        "rows": int(len(y)),
+        "train_rows": int(len(y_train)),
+        "test_rows": int(len(y_test)),
+        "added_trees": int(added),
+        "feature_cache": "hit" if cache_hit else "miss",
+        "inputs": {role: fp["sha256"][:12] for role, fp in plan["inputs"].items()},
+    }
+    with report.stage(f"{name}:save"):
+        os.makedirs(models_dir, exist_ok=True)
+        with open(os.path.join(models_dir, spec["model_pickle"]), "wb") as f:
+            pickle.dump(model, f)
+        for enc_name, fname in spec["encoder_pickles"].items():
+            from sklearn.preprocessing import LabelEncoder
+            le = LabelEncoder()
+            le.classes_ = encoders[enc_name]
+            with open(os.path.join(models_dir, fname), "wb") as f:
+                pickle.dump(le, f)
+        # Stage timings up to here; the bundle write itself is reported in the state file
+        training["seconds"] = round(time.perf_counter() - start, 3)
+        training["stages"] = report.as_dict()
+        manifest = save_bundle(os.path.join(models_dir, name), name, model, spec["features"], encoders,
+                               metadata={**metrics, "training": training})
+
+    training["seconds"] = round(time.perf_counter() - start, 3)
+    training["stages"] = report.as_dict()
+    return {
+        "inputs": plan["inputs"],
+        "config": plan["config"],
+        "encoders_sha": _encoders_sha(encoders),
+        "train_rows": int(len(y_train)),
+        "n_estimators": len(model.estimators_),
+        "model_version": manifest["model_version"],
+        "metrics": metrics,
+        "training": training,
+    }
+
+
+def _pin_cpus(n_cpus):
+    # TensorFlow sizes its thread pools from the CPU affinity mask
+    if n_cpus is None or not hasattr(os, "sched_setaffinity"):
+        return None
+    cpus = sorted(os.sched_getaffinity(0))
+    return lambda: os.sched_setaffinity(0, cpus[-n_cpus:])
+
+
+def train_disease(plan, models_dir, n_cpus=None):
+    start = time.perf_counter()
+    env = dict(os.environ)
+    if n_cpus is not None:
+        # Also honored where affinity cannot be set
+        env.update(TF_NUM_INTRAOP_THREADS=str(n_cpus), OMP_NUM_THREADS=str(n_cpus))
+    result = subprocess.run([sys.executable, DISEASE_TARGET["script"], "--models-dir", models_dir], cwd=BASE_DIR, env=env,
+                            preexec_fn=_pin_cpus(n_cpus))
+    if result.returncode != 0:
+        raise RuntimeError(f"{DISEASE_TARGET['script']} exited with status {result.returncode}")
+    return {
+        "inputs": plan["inputs"],
+        "training": {"mode": "full", "reason": plan["reason"], "seconds": round(time.perf_counter() - start, 3),
+                     "trained_at": datetime.now().isoformat(timespec="seconds")},
+    }
+
+
+def plan_disease(previous, models_dir, force):
+    dataset_dir = DISEASE_TARGET["dataset_dir"]
+    if not os.path.isdir(dataset_dir):
+        return {"action": "missing", "reason": f"input not found: {dataset_dir}"}
+    inputs = {"images": directory_fingerprint(dataset_dir)}
+    artifacts = all(os.path.exists(os.path.join(models_dir, a)) for a in DISEASE_TARGET["artifacts"])
+    if not force and previous and previous.get("inputs") == inputs and artifacts:
+        return {"action": "skip", "reason": "inputs unchanged", "inputs": inputs}
+    return {"action": "full", "reason": "forced" if force else "inputs changed", "inputs": inputs}
+
+
+# ---------------------------
+# Driver
+# ---------------------------
+def load_state(models_dir):
+    path = os.path.join(models_dir, STATE_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_state(models_dir, state):
+    os.makedirs(models_dir, exist_ok=True)
+    path = os.path.join(models_dir, STATE_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def run_pipeline(names, models_dir=MODELS_DIR, datasets_dir=DATASETS_DIR, cache_dir=CACHE_DIR,
+                 workers=None, force=False, allow_incremental=True):
+    """Plans and trains names; returns {name: {"action", "reason", ...state entry or error}}."""
+    state = load_state(models_dir)
+    plans = {}
+    for name in names:
+        if name == "disease":
+            plans[name] = plan_disease(state.get(name), models_dir, force)
+        else:
+            plans[name] = plan_forest(name, state.get(name), datasets_dir, models_dir, force, allow_incremental)
+        print(f"{name}: {plans[name]['action']} ({plans[name]['reason']})")
+
+    todo = [n for n in names if plans[n]["action"] in ("full", "incremental")]
+    outcome = {n: {"action": p["action"], "reason": p["reason"]} for n, p in plans.items()}
+    if not todo:
+        return outcome
+
+    # One equal CPU share per concurrently trained model. The disease CNN runs
+    # in its own subprocess outside the forest pool, on one of those shares
+    cpus = os.cpu_count() or 1
+    slots = max(1, min(workers or cpus, len(todo)))
+    share = max(1, cpus // slots)
+    forests = [n for n in todo if n != "disease"]
+    disease = "disease" in todo
+    concurrent_disease = disease and (slots > 1 or not forests)
+    forest_workers = max(1, slots - 1 if concurrent_disease else slots)
+
+    def record(name, future):
+        try:
+            entry = future.result()
+        except Exception as e:
+            print(f"{name}: training failed: {e}")
+            outcome[name]["error"] = str(e)
+            return
+        # Saved after every model, so a failure elsewhere never loses it
+        state[name] = entry
+        save_state(models_dir, state)
+        outcome[name] = {**outcome[name], **entry, "action": entry["training"]["mode"]}
+        print(f"{name}: {entry['training']['mode']} training done in {entry['training']['seconds']:.2f}s "
+              f"{entry.get('metrics', '')}")
+
+    with ThreadPoolExecutor(1) as disease_runner, ProcessPoolExecutor(forest_workers) as pool:
+        futures = {pool.submit(train_forest, n, plans[n], models_dir, cache_dir, share): n for n in forests}
+        if concurrent_disease:
+            futures[disease_runner.submit(train_disease, plans["disease"], models_dir, share)] = "disease"
+        for future in as_completed(futures):
+            record(futures[future], future)
+    if disease and not concurrent_disease:
+        # --workers 1: after the forests, with every CPU
+        with ThreadPoolExecutor(1) as disease_runner:
+            record("disease", disease_runner.submit(train_disease, plans["disease"], models_dir))
+    return outcome
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the AgriVista models, skipping unchanged ones")
+    parser.add_argument("models", nargs="*", help=f"any of {', '.join([*TARGETS, 'disease'])} (default: all)")
+    parser.add_argument("--force", action="store_true", help="retrain even if nothing changed")
+    parser.add_argument("--full", action="store_true", help="never grow forests incrementally")
+    parser.add_argument("--workers", type=int, help="models trained at once (default: CPU count)")
+    parser.add_argument("--datasets-dir", default=DATASETS_DIR)
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    args = parser.parse_args(argv)
+    unknown = set(args.models) - {*TARGETS, "disease"}
+    if unknown:
+        parser.error(f"unknown models: {', '.join(sorted(unknown))}")
+
+    outcome = run_pipeline(args.models or [*TARGETS, "disease"], args.models_dir, args.datasets_dir, args.cache_dir,
+                           args.workers, args.force, not args.full)
+    print(f"{'model':<12}{'action':<13}{'seconds':>9}  metrics")
+    for name, r in outcome.items():
+        seconds = r.get("training", {}).get("seconds")
+        print(f"{name:<12}{r['action']:<13}{seconds if seconds is not None else '-':>9}  "
+              f"{r.get('metrics') or r.get('error') or r['reason']}")
+    if any("error" in r for r in outcome.values()):
+        sys.exit(1)
+    return outcome
+
+
+if __name__ == "__main__":
+    main()
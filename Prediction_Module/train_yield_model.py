@@ -4,6 +4,7 @@ import pickle
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import r2_score
+from model_bundle import save_bundle
 
 # Create models folder
 os.makedirs("models", exist_ok=True)
@@ -47,6 +48,10 @@ model = RandomForestRegressor(
 
 model.fit(X_train, y_train)
 
-print("R2 Score:", r2_score(y_test, model.predict(X_test)))
+r2 = r2_score(y_test, model.predict(X_test))
+print("R2 Score:", r2)
 
 pickle.dump(model, open("models/yield_model.pkl", "wb"))
+
+# Memory-mappable bundle served by ml_api
+save_bundle("models/yield", "yield", model, FEATURES, metadata={"r2": r2})